@@ -0,0 +1,75 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Large function config YAML/JSON handling, pure python vs nuclio.codec
+
+    python benchmarks/bench_config.py [--env 1000] [--triggers 200]
+
+the pure python side is what the package used before the codec module
+(yaml.safe_dump/safe_load and the stdlib json module)
+"""
+import json
+from argparse import ArgumentParser
+
+import yaml
+from common import best, report
+
+from nuclio import codec
+from nuclio.config import new_config, set_env_dict, update_in
+from nuclio.triggers import KafkaTrigger
+
+
+def large_config(env_count, trigger_count):
+    config = new_config()
+    set_env_dict(config, {'ENV_{}'.format(i): 'value-{}'.format(i)
+                          for i in range(env_count)})
+    for i in range(trigger_count):
+        trigger = KafkaTrigger(['broker-{}:9092'.format(i)],
+                               ['topic-{}'.format(i)], partitions=[0, 1, 2])
+        update_in(config, 'spec.triggers.kafka-{}'.format(i),
+                  trigger.to_dict())
+    update_in(config, 'spec.handler', 'main:handler')
+    # plain dicts, as loaded from a file or a dashboard response
+    return json.loads(json.dumps(config))
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--env', type=int, default=1000,
+                        help='number of env vars')
+    parser.add_argument('--triggers', type=int, default=200,
+                        help='number of triggers')
+    args = parser.parse_args()
+
+    config = large_config(args.env, args.triggers)
+    text = codec.yaml_dump(config)
+    data = json.dumps(config).encode('utf-8')
+    assert yaml.safe_load(text) == codec.yaml_load(text) == config
+
+    rows = [
+        ('yaml dump',
+         best(lambda: yaml.safe_dump(config, default_flow_style=False), 1, 5),
+         best(lambda: codec.yaml_dump(config), 1, 5)),
+        ('yaml load', best(lambda: yaml.safe_load(text), 1, 5),
+         best(lambda: codec.yaml_load(text), 1, 5)),
+        ('json loads', best(lambda: json.loads(data), 20),
+         best(lambda: codec.json_loads(data), 20)),
+    ]
+    report('config with {} env vars and {} triggers ({} YAML bytes, '
+           'orjson {})'.format(args.env, args.triggers, len(text),
+                               'installed' if codec.orjson else 'missing'),
+           rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Context attribute access in a handler loop, current vs an older revision
+
+    python benchmarks/bench_context.py [--rev dc25e0e]
+
+the default revision is the one before Context dropped __getattribute__
+"""
+from argparse import ArgumentParser
+
+from common import best, load_revision, report
+
+from nuclio import request
+
+
+def handler(context, event):
+    context.logger.debug('event %s', event)  # disabled (INFO) level
+    context.user_data.count += 1
+    return context.worker_id
+
+
+def new_context(module):
+    context = module.Context(worker_id=0)
+    context.user_data.count = 0
+    context.logger  # create the default logger before timing
+    return context
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rev', default='dc25e0e',
+                        help='git revision of the old request.py')
+    parser.add_argument('--number', type=int, default=200000,
+                        help='calls per timing run')
+    args = parser.parse_args()
+
+    contexts = new_context(load_revision(args.rev)), new_context(request)
+    rows = []
+    for name, func in [
+            ('context.worker_id', lambda ctx: ctx.worker_id),
+            ('context.logger', lambda ctx: ctx.logger),
+            ('context.user_data', lambda ctx: ctx.user_data),
+            ('handler call', lambda ctx: handler(ctx, 'x'))]:
+        old, new = (best(lambda: func(ctx), args.number) for ctx in contexts)
+        rows.append((name, old, new))
+    report('Context ({} -> working tree)'.format(args.rev), rows)
+
+
+if __name__ == '__main__':
+    main()
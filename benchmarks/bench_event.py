@@ -0,0 +1,89 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Event decoding/encoding, current request.py vs an older revision
+
+    python benchmarks/bench_event.py [--rev 395fe14] [--events 10000]
+
+the default revision is the one before Event got __slots__ and from_dict
+(older revisions have no from_json_batch, a from_json per line is used)
+"""
+import base64
+import json
+from argparse import ArgumentParser
+
+from common import best, load_revision, report
+
+from nuclio import request
+
+
+def processor_event(i=0):
+    """a JSON event as encoded by the nuclio processor"""
+    body = json.dumps({'id': i, 'user': 'joe', 'values': list(range(10))})
+    return json.dumps({
+        'body': base64.b64encode(body.encode()).decode(),
+        'content_type': 'application/json',
+        'trigger': {'class': 'sync', 'kind': 'http'},
+        'fields': {'a': '1', 'b': '2'},
+        'headers': {'Content-Type': 'application/json',
+                    'User-Agent': 'python-requests/2.31.0',
+                    'Accept': '*/*', 'X-Request-Id': str(i)},
+        'id': 'ev-{}'.format(i),
+        'method': 'POST',
+        'path': '/api/v1/items',
+        'size': len(body),
+        'timestamp': 1700000000 + i,
+        'url': 'http://function:8080/api/v1/items',
+        'type': '',
+        'type_version': '',
+        'version': '',
+    })
+
+
+def from_json_batch(module, data):
+    if hasattr(module.Event, 'from_json_batch'):
+        return module.Event.from_json_batch(data)
+    return [module.Event.from_json(line) for line in data.splitlines()]
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rev', default='395fe14',
+                        help='git revision of the old request.py')
+    parser.add_argument('--events', type=int, default=10000,
+                        help='events in the batch')
+    args = parser.parse_args()
+
+    old = load_revision(args.rev)
+    event = processor_event()
+    batch = '\n'.join(processor_event(i) for i in range(args.events))
+    rows = []
+    for name, func, number in [
+            ('from_json', lambda mod: mod.Event.from_json(event), 20000),
+            ('{} events, batch'.format(args.events),
+             lambda mod: from_json_batch(mod, batch), 1),
+            ('Event() ctor', lambda mod: mod.Event(body=b'x'), 50000)]:
+        rows.append((name, best(lambda: func(old), number),
+                     best(lambda: func(request), number)))
+
+    # to_json of a decoded event, as used by repr() and event recording
+    old_event, new_event = old.Event.from_json(event), request.Event.from_json(event)
+    for obj in (old_event, new_event):
+        obj.timestamp = 1700000000
+    rows.append(('to_json', best(old_event.to_json, 20000),
+                 best(new_event.to_json, 20000)))
+    report('Event ({} -> working tree)'.format(args.rev), rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""build_file logging with verbose=False, current vs an older revision
+
+    python benchmarks/bench_logging.py [--rev 07aacc5^] [--env 1000]
+
+the default revision is the one before the build/deploy logs were made
+lazy (the code and config YAML were formatted even when not logged).
+deploy_code only logs with verbose=True, before and after, so build_file
+is the path which is measured
+"""
+import logging
+import tempfile
+from argparse import ArgumentParser
+from os import path
+
+from common import best, load_revision, report
+
+from nuclio import build
+from nuclio.config import ConfigSpec
+
+handler_code = '''
+def handler(context, event):
+    return event.body
+'''
+
+
+def main():
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rev', default='07aacc5^',
+                        help='git revision of the old build.py')
+    parser.add_argument('--env', type=int, default=1000,
+                        help='number of env vars in the config')
+    parser.add_argument('--code-size', default=3 * 1024 * 1024, type=int,
+                        help='source size in bytes')
+    args = parser.parse_args()
+
+    # the default (INFO) level, build_file logs at DEBUG with verbose=False
+    logging.getLogger('nuclio_jupyter').setLevel(logging.INFO)
+    spec = ConfigSpec(env={'ENV_{}'.format(i): 'value-{}'.format(i)
+                           for i in range(args.env)})
+    padding = '# ' + 'x' * 98 + '\n'
+    with tempfile.TemporaryDirectory() as tmp:
+        filename = path.join(tmp, 'handler.py')
+        with open(filename, 'w') as fp:
+            fp.write(handler_code)
+            fp.write(padding * (args.code_size // len(padding)))
+
+        old = load_revision(args.rev, 'nuclio/build.py')
+        rows = [('build_file', best(
+            lambda: old.build_file(filename, name='f', spec=spec), 1, 5),
+            best(lambda: build.build_file(filename, name='f', spec=spec),
+                 1, 5))]
+    report('build_file, {} env vars, {}KB source, verbose=False '
+           '({} -> working tree)'.format(args.env, args.code_size // 1024,
+                                         args.rev), rows)
+
+
+if __name__ == '__main__':
+    main()
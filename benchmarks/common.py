@@ -0,0 +1,59 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Helpers for the benchmark scripts (run from the repository root)"""
+import subprocess
+import sys
+import timeit
+import types
+from os import path
+
+root = path.dirname(path.dirname(path.abspath(__file__)))
+if root not in sys.path:
+    sys.path.insert(0, root)
+
+
+def best(func, number, repeat=9):
+    """best time (seconds) of a single func() call, min of repeat runs"""
+    return min(timeit.repeat(func, number=number, repeat=repeat)) / number
+
+
+def load_revision(rev, module='nuclio/request.py'):
+    """a package module as it was in a git revision (e.g. 'HEAD~3')
+
+    the module is executed under the nuclio package, so relative imports
+    use the current tree
+    """
+    code = subprocess.check_output(
+        ['git', 'show', '{}:{}'.format(rev, module)], cwd=root)
+    name = 'nuclio._rev_' + path.splitext(path.basename(module))[0]
+    mod = types.ModuleType(name)
+    mod.__package__ = 'nuclio'
+    mod.__file__ = '<{}:{}>'.format(rev, module)
+    exec(compile(code, mod.__file__, 'exec'), mod.__dict__)
+    return mod
+
+
+def report(title, rows):
+    """print rows of (name, old seconds, new seconds)"""
+    print(title)
+    for name, old, new in rows:
+        print('  {:<24} {:>10} -> {:>10}  ({:.1f}x)'.format(
+            name, _format_time(old), _format_time(new), old / new))
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.2f}{}'.format(seconds / scale, unit)
+    return '{:.0f}ns'.format(seconds / 1e-9)
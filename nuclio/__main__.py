@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 """Nuclio command line script"""
+import logging
 import sys
 from argparse import ArgumentParser
 from os import path
@@ -19,6 +20,7 @@ from os import path
 from nuclio.utils import DeployError
 from nuclio.deploy import (deploy_from_args, delete_func, delete_parser,
                            populate_parser as populate_deploy_parser)
+from nuclio.emulate import HttpEmulator, serve_parser
 
 
 def do_deploy(args):
@@ -35,6 +37,19 @@ def do_delete(args):
         raise SystemExit('error: {}'.format(err))
 
 
+def do_serve(args):
+    try:
+        server = HttpEmulator(
+            args.file, handler=args.handler, workers=args.workers,
+            port=args.port, host=args.host,
+            log_level=logging.DEBUG if args.verbose else logging.INFO)
+    except (DeployError, ValueError) as err:
+        raise SystemExit('error: {}'.format(err))
+    print('serving {} on {} ({} workers)'.format(
+        args.file, server.url, server.workers))
+    print(server.run().summary())
+
+
 def main():
     parser = ArgumentParser(prog='nuclio', description=__doc__)
     sub = parser.add_subparsers()
@@ -47,6 +62,10 @@ def main():
     delete_parser(delp)
     delp.set_defaults(func=do_delete)
 
+    srvp = sub.add_parser('serve')
+    serve_parser(srvp)
+    srvp.set_defaults(func=do_serve)
+
     exargs = [path.expandvars(arg) for arg in sys.argv[1:]]
     args = parser.parse_args(exargs)
     try:
@@ -12,53 +12,673 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import hashlib
 import io
+import json
+import mmap
+import os
+import queue
+import threading
 import zipfile
 from base64 import b64encode
-import yaml
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import requests
 from os import path, remove, environ
 import shlex
+import tempfile
 from argparse import ArgumentParser
 from urllib.parse import urlparse, ParseResult
-from shutil import copyfile
+from shutil import copyfile, copyfileobj
+
+from .codec import yaml_dump, yaml_load
+from .manifest import build_manifest, delta_layout, expand_files, file_digest
+from .utils import env_keys, logger
+
+compression_types = {
+    'stored': zipfile.ZIP_STORED,
+    'deflate': zipfile.ZIP_DEFLATED,
+    'bzip2': zipfile.ZIP_BZIP2,
+    'lzma': zipfile.ZIP_LZMA,
+}
+
+# fixed entry timestamp (earliest zip date), equal inputs give equal bytes
+zip_date_time = (1980, 1, 1, 0, 0, 0)
+# part of archive_key, change when the archive bytes change for equal inputs
+archive_format = 1
+
+
+def parse_compression(compression=None, compresslevel=None):
+    """return (zip compress type, level) from e.g. 'deflate', 'lzma', 'deflate:9'
+
+    defaults to the NUCLIO_ARCHIVE_COMPRESSION env var or 'deflate'
+    """
+    compression = compression or environ.get(env_keys.archive_compression)
+    compression = compression or 'deflate'
+    if ':' in compression:
+        compression, level = compression.split(':', 1)
+        if compresslevel is None:
+            compresslevel = int(level)
+    if compression not in compression_types:
+        raise ValueError('unsupported archive compression {}, use one of {}'
+                         .format(compression, ', '.join(compression_types)))
+    return compression_types[compression], compresslevel
+
+
+_size_units = {'': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+
+def parse_size(size):
+    """size in bytes from int or str with optional unit (e.g. '8MB', '512k')"""
+    if isinstance(size, int):
+        return size
+    value = size.strip().lower().rstrip('ib').rstrip('b')
+    unit = value[-1:] if value[-1:] in _size_units else ''
+    try:
+        return int(float(value[:len(value) - len(unit)]) * _size_units[unit])
+    except ValueError:
+        raise ValueError('illegal size {!r}, use e.g. 8MB'.format(size))
 
 
-def build_zip(zip_path, config, code, files=None, ext='.py', handler='handler'):
-    files = files or []
-    z = zipfile.ZipFile(zip_path, "w")
+def _zip_info(name, mode=0o644):
+    info = zipfile.ZipInfo(name, date_time=zip_date_time)
+    _set_mode(info, mode)
+    return info
+
+
+def _set_mode(info, mode):
+    info.create_system = 3  # unix, same bytes on every platform
+    info.external_attr = (0o100000 | mode) << 16
+
+
+def archive_inputs(config, code, files=None, ext='.py', handler='handler',
+                   previous_manifest=None, hash_files=True):
+    """return (manifest, in memory contents) of a function archive
+
+    files are paths, directories or globs (see manifest.expand_files),
+    digests are reused from previous_manifest for untouched files
+    """
     config['spec']['build'].pop("functionSourceCode", None)
     config['metadata'].pop("name", None)
-    z.writestr(handler + ext, code)
-    z.writestr('function.yaml', yaml.safe_dump(config, default_flow_style=False))
-    for f in files:
-        if not path.isfile(f):
-            raise Exception('file name {} not found'.format(f))
-        z.write(f)
-    z.close()
+
+    contents = {
+        handler + ext: code,
+        'function.yaml': yaml_dump(config),
+    }
+    manifest = build_manifest(expand_files(files or []), contents,
+                              previous_manifest, hash_files=hash_files)
+    return manifest, contents
+
+
+def archive_key(manifest, compress_type, compresslevel):
+    """digest of the archive inputs, equal keys mean equal archive bytes"""
+    sha = hashlib.sha256(json.dumps(
+        [archive_format, compress_type, compresslevel]).encode())
+    for name, entry in manifest['files'].items():
+        sha.update('{}\0{}\0{}\n'.format(
+            name, entry['sha256'], entry['mode']).encode('utf-8'))
+    return sha.hexdigest()
+
+
+def build_zip(zip_path, config, code, files=None, ext='.py', handler='handler',
+              compression=None, compresslevel=None, previous_manifest=None,
+              layout=False):
+    """build a function archive (zip_path can also be a writable file object)
+
+    files are paths, directories or globs (see manifest.expand_files).
+    entries are sorted and have fixed timestamps/permissions so the same
+    inputs always produce the same archive bytes. returns the archive
+    manifest (digests are reused from previous_manifest for untouched files,
+    the others are computed while the files are compressed)
+
+    with layout, entries are ordered for delta uploads (unchanged since
+    previous_manifest first, code last) and the order is kept in the
+    manifest 'layout'
+    """
+    compress_type, compresslevel = parse_compression(compression, compresslevel)
+    # the delta layout compares digests before writing, otherwise the
+    # files are hashed as they are read into the archive (no second read)
+    manifest, contents = archive_inputs(
+        config, code, files, ext, handler, previous_manifest,
+        hash_files=bool(layout and previous_manifest))
+
+    names = None
+    if layout:
+        names = manifest['layout'] = delta_layout(
+            manifest, previous_manifest, contents)
+    write_zip(zip_path, manifest, contents, compress_type, compresslevel,
+              names)
+    return manifest
+
+
+def write_zip(zip_path, manifest, contents, compress_type, compresslevel,
+              names=None):
+    """write the archive of a manifest (see archive_inputs)
+
+    names is the entry order (default the manifest order), members without
+    a sha256 are hashed while they are written, in a thread next to the
+    compression (hashlib and zlib both release the GIL on large buffers)
+    """
+    with zipfile.ZipFile(zip_path, 'w', compress_type,
+                         compresslevel=compresslevel) as z, \
+            ThreadPoolExecutor(1) as hasher:
+        for name in names or list(manifest['files']):
+            entry = manifest['files'][name]
+            if name in contents:
+                z.writestr(_zip_info(name), contents[name],
+                           compress_type, compresslevel)
+                continue
+
+            # opened by name the member gets the zip compression and level
+            # (a ZipInfo has no public level before python 3.13) and the
+            # default ZipInfo date, which is zip_date_time
+            zip64 = entry['size'] * 1.05 > zipfile.ZIP64_LIMIT
+            sha = None if 'sha256' in entry else hashlib.sha256()
+            hashed = None
+            with open(entry['path'], 'rb') as fp, \
+                    z.open(name, 'w', force_zip64=zip64) as zp:
+                for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+                    if sha is not None:
+                        # one chunk in flight, bounds the memory
+                        if hashed is not None:
+                            hashed.result()
+                        hashed = hasher.submit(sha.update, chunk)
+                    zp.write(chunk)
+            if hashed is not None:
+                hashed.result()
+            if sha is not None:
+                entry['sha256'] = sha.hexdigest()
+            # only in the central directory, which is written on close
+            _set_mode(z.infolist()[-1], entry['mode'])
+    return manifest
+
+
+class RangeReader(io.RawIOBase):
+    """seekable read-only file object over read_range(offset, size)"""
+
+    def __init__(self, read_range, size):
+        self.read_range = read_range
+        self.size = size
+        self.pos = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.pos
+        elif whence == io.SEEK_END:
+            offset += self.size
+        if offset < 0:
+            raise OSError('negative seek position {}'.format(offset))
+        self.pos = offset
+        return offset
+
+    def readinto(self, b):
+        size = min(len(b), self.size - self.pos)
+        if size <= 0:
+            return 0
+        data = self.read_range(self.pos, size)
+        size = len(data)
+        b[:size] = data
+        self.pos += size
+        return size
+
+
+class ZipReader:
+    """lazy zip archive reader (local path or remote url)
+
+    local archives are memory mapped, remote ones are read with range
+    requests (see ExternalRepo.read_range). only the central directory is
+    read on open, members are read when accessed (open() returns a stream)
+    """
+
+    buffer_size = 64 * 1024
+
+    def __init__(self, url):
+        self._mmap = None
+        repo = url2repo(url)
+        if repo.kind == 'file':
+            with open(url, 'rb') as fp:
+                self._mmap = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+            mm = self._mmap
+            self._fp = RangeReader(lambda pos, size: mm[pos:pos + size],
+                                   len(mm))
+        else:
+            size = repo.stat()
+            if size is None or size < 0:
+                raise OSError('cannot get the size of {}'.format(url))
+            # buffer the small (header/directory) reads into fewer requests
+            self._fp = io.BufferedReader(RangeReader(repo.read_range, size),
+                                         self.buffer_size)
+        self.zip = zipfile.ZipFile(self._fp)
+
+    def names(self):
+        return self.zip.namelist()
+
+    def infolist(self):
+        return self.zip.infolist()
+
+    def open(self, name):
+        return self.zip.open(name)
+
+    def read_text(self, name):
+        with io.TextIOWrapper(self.open(name), encoding='utf-8') as fp:
+            return fp.read()
+
+    def close(self):
+        self.zip.close()
+        self._fp.close()
+        if self._mmap is not None:
+            self._mmap.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 def load_zip_config(zip_path):
-    data = get_from_zip(zip_path, ['function.yaml', 'handler.py'])
-    return data['handler.py'], data['function.yaml']
+    """return (handler code, function.yaml text) of an archive
+
+    the handler file is found from spec.handler (code is None if missing)
+    """
+    with ZipReader(zip_path) as z:
+        config = z.read_text('function.yaml')
+        name = _handler_file(z.names(), yaml_load(config))
+        code = z.read_text(name) if name else None
+    return code, config
+
+
+def _handler_file(names, config):
+    from .build import get_lang_ext
+
+    spec = config.get('spec') or {}
+    module = (spec.get('handler') or '').split(':')[0]
+    try:
+        ext = get_lang_ext(config)
+    except (KeyError, ValueError):
+        ext = '.py'
+    if module.endswith(ext):
+        module = module[:-len(ext)]
+    candidates = [module]
+    if module.endswith('-nuclio'):
+        # build_file names the module <name>-nuclio, the file is <name><ext>
+        candidates.append(module[:-len('-nuclio')])
+    candidates.append('handler')
+    for base in candidates:
+        if base and base + ext in names:
+            return base + ext
+    return None
 
 
 def get_from_zip(zip_path, files=None):
     files = files or []
     files_data = {}
-    with zipfile.ZipFile(zip_path) as myzip:
+    with ZipReader(zip_path) as z:
         for f in files:
-            with io.TextIOWrapper(myzip.open(f)) as zipped:
-                files_data[f] = zipped.read()
+            files_data[f] = z.read_text(f)
     return files_data
 
 
-def upload_file(file_path, url, del_file=False):
-    url2repo(url).upload(file_path)
+def upload_file(file_path, url, del_file=False, skip_unchanged=False,
+                progress=None, resume=None):
+    """upload a local file to url (any supported repo)
+
+    with skip_unchanged the file sha256 is recorded in a <url>.sha256
+    object next to the target, and the upload is skipped when that digest
+    matches and the target exists (with the same size)
+
+    progress is called with the number of bytes sent since the last call
+    (repos which support it, e.g. s3). with resume (default from
+    NUCLIO_UPLOAD_RESUME) an interrupted upload of the same file continues
+    where it stopped (repos which support it, e.g. v3io)
+    """
+    repo = url2repo(url)
+    repo.progress = progress
+    repo.resume = resume
+    digest = file_digest(file_path) if skip_unchanged else ''
+    if digest and is_uploaded(repo, url, digest, path.getsize(file_path)):
+        logger.debug('%s is unchanged, skipping upload', url)
+    else:
+        repo.upload(file_path)
+        if digest:
+            put_data(digest_url(url), digest)
     if del_file:
         remove(file_path)
 
 
+class UploadSink(io.RawIOBase):
+    """write-only file object which uploads to url as it is written
+
+    data is kept in memory up to memory_limit bytes (NUCLIO_ARCHIVE_MEMORY_LIMIT,
+    default 64MB) and uploaded in one request on close (the upload is skipped
+    when skip_unchanged and the target digest matches, see upload_file).
+    beyond the limit chunks are handed to a background thread which streams
+    them to the repo (upload_stream) while the rest is being written. with
+    skip_unchanged the digest must be known before uploading, so larger
+    archives are written to a temp file instead and uploaded on close.
+    """
+
+    chunk_size = 8 * 1024 * 1024
+    queue_size = 4
+
+    def __init__(self, url, skip_unchanged=False, memory_limit=None,
+                 progress=None):
+        self.url = url
+        self.repo = url2repo(url)
+        self.repo.progress = progress
+        self.skip_unchanged = skip_unchanged
+        if memory_limit is None:
+            memory_limit = environ.get(env_keys.archive_memory_limit, '64MB')
+        self.memory_limit = parse_size(memory_limit)
+        self.digest = ''
+        self.uploaded = False
+        self._sha = hashlib.sha256()
+        self._size = 0
+        self._buf = bytearray()
+        self._queue = None
+        self._thread = None
+        self._error = None
+        self._spill = None
+
+    def writable(self):
+        return True
+
+    def tell(self):
+        return self._size
+
+    def write(self, data):
+        if self._error is not None:
+            raise OSError('upload to {} failed: {}'.format(
+                self.url, self._error)) from self._error
+        self._sha.update(data)
+        self._size += len(data)
+        if self._spill is not None:
+            self._spill.write(data)
+            return len(data)
+        self._buf += data
+        if self._queue is None and len(self._buf) > self.memory_limit:
+            if self.skip_unchanged:
+                self._spill = tempfile.NamedTemporaryFile(
+                    suffix='.zip', delete=False)
+                self._spill.write(self._buf)
+                self._buf = bytearray()
+                return len(data)
+            self._queue = queue.Queue(self.queue_size)
+            self._thread = threading.Thread(target=self._upload, daemon=True)
+            self._thread.start()
+        if self._queue is not None and len(self._buf) >= self.chunk_size:
+            # hand the buffer over to the upload thread (no copy)
+            self._send(self._buf)
+            self._buf = bytearray()
+        return len(data)
+
+    def _send(self, item):
+        # dont block forever on a full queue if the upload thread died
+        while True:
+            try:
+                self._queue.put(item, timeout=0.5)
+                return
+            except queue.Full:
+                if not self._thread.is_alive():
+                    return
+
+    def _chunks(self):
+        while True:
+            chunk = self._queue.get()
+            if chunk is None:
+                return
+            if isinstance(chunk, BaseException):
+                raise chunk
+            yield chunk
+
+    def _upload(self):
+        try:
+            self.repo.upload_stream(self._chunks())
+        except BaseException as exc:
+            self._error = exc
+
+    def close(self):
+        if self.closed:
+            return
+        super().close()
+        self.digest = self._sha.hexdigest()
+        if self._queue is None:
+            try:
+                if self.skip_unchanged and is_uploaded(
+                        self.repo, self.url, self.digest, self._size):
+                    logger.debug('%s is unchanged, skipping upload', self.url)
+                    return
+                if self._spill is not None:
+                    self._spill.close()
+                    self.repo.upload(self._spill.name)
+                else:
+                    self.repo.upload_stream([self._buf])
+            finally:
+                self._remove_spill()
+        else:
+            if self._buf:
+                self._send(self._buf)
+            self._send(None)
+            self._thread.join()
+            if self._error is not None:
+                raise OSError('upload to {} failed: {}'.format(
+                    self.url, self._error)) from self._error
+        self._buf = bytearray()
+        self.uploaded = True
+        if self.skip_unchanged:
+            put_data(digest_url(self.url), self.digest)
+
+    def abort(self):
+        """stop without completing the upload"""
+        if self.closed:
+            return
+        super().close()
+        if self._queue is not None:
+            self._send(OSError('upload aborted'))
+            self._thread.join()
+        self._remove_spill()
+        self._buf = bytearray()
+
+    def _remove_spill(self):
+        if self._spill is not None:
+            self._spill.close()
+            remove(self._spill.name)
+            self._spill = None
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+
+
+def build_and_upload(url, config, code, files=None, ext='.py', handler='handler',
+                     compression=None, compresslevel=None, skip_unchanged=False,
+                     progress=None, delta=None):
+    """build a function archive and upload it to url, without a temp file
+
+    with skip_unchanged the upload is skipped when the archive inputs match
+    the manifest stored with the last upload (<url>.manifest.json) and the
+    target is intact. returns the UploadSink (see .digest and .uploaded).
+    with delta (default
+    from NUCLIO_ARCHIVE_DELTA) only the changed part of the archive is
+    uploaded and the upload_delta manifest is returned
+    """
+    if delta is None:
+        delta = environ.get(env_keys.archive_delta, '').lower() == 'true'
+    if delta:
+        return upload_delta(url, config, code, files, ext, handler,
+                            compression, compresslevel, progress)
+    sink = UploadSink(url, progress=progress)
+    if not skip_unchanged:
+        with sink:
+            build_zip(sink, config, code, files, ext, handler,
+                      compression, compresslevel)
+        return sink
+
+    # the archive bytes only depend on its inputs, their digest (key) is
+    # compared with the stored manifest before writing, so the archive is
+    # still streamed (no temp file) when it changed
+    compress_type, compresslevel = parse_compression(compression, compresslevel)
+    previous = get_manifest(url)
+    manifest, contents = archive_inputs(config, code, files, ext, handler,
+                                        previous)
+    manifest['key'] = archive_key(manifest, compress_type, compresslevel)
+    if previous and previous.get('key') == manifest['key'] and is_uploaded(
+            sink.repo, url, previous.get('sha256'), previous.get('size')):
+        logger.debug('%s is unchanged, skipping upload', url)
+        sink.abort()
+        sink.digest = previous['sha256']
+        return sink
+
+    with sink:
+        write_zip(sink, manifest, contents, compress_type, compresslevel)
+    manifest['size'], manifest['sha256'] = sink.tell(), sink.digest
+    put_data(digest_url(url), sink.digest)
+    put_data(manifest_url(url), json.dumps(manifest))
+    return sink
+
+
+def upload_delta(url, config, code, files=None, ext='.py', handler='handler',
+                 compression=None, compresslevel=None, progress=None):
+    """build an archive and upload only the part changed since the last upload
+
+    the archive manifest (member digests, layout and byte spans) is stored
+    in <url>.manifest.json. members unchanged since the previous upload are
+    written first and in the same order (code last), so the new archive
+    starts with the same bytes as the stored one and only the tail from
+    the first changed member is written (repos with ranged writes). a
+    shrinking archive is padded (zip comment) to the stored size.
+    falls back to a full upload if the stored archive doesnt match its
+    manifest. returns the manifest ('uploaded' holds the bytes sent)
+    """
+    repo = url2repo(url)
+    repo.progress = progress
+    previous = get_manifest(url)
+    if previous and not is_uploaded(repo, url, previous.get('sha256'),
+                                    previous.get('size')):
+        logger.debug('%s doesnt match its manifest, full upload', url)
+        previous = None
+
+    zip_path = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
+    try:
+        manifest = build_zip(zip_path, config, code, files, ext, handler,
+                             compression, compresslevel, previous, layout=True)
+        manifest['spans'], size, digest = archive_spans(zip_path)
+        offset = 0
+        if previous and repo.ranged_writes:
+            pad = previous['size'] - size
+            if 0 < pad <= 0xffff:
+                with zipfile.ZipFile(zip_path, 'a') as z:
+                    z.comment = b' ' * pad
+                manifest['spans'], size, digest = archive_spans(zip_path)
+            if size >= previous['size']:
+                offset = delta_offset(previous, manifest)
+
+        # the target is written in place, until the new digest and manifest
+        # are stored an interrupted write must not match the old ones
+        if previous:
+            put_data(digest_url(url), '')
+            put_data(manifest_url(url), '{}')
+        if offset:
+            logger.debug('uploading %s from offset %d', url, offset)
+            repo.upload_tail(zip_path, offset)
+        else:
+            repo.upload(zip_path)
+    finally:
+        remove(zip_path)
+
+    manifest['size'], manifest['sha256'] = size, digest
+    put_data(digest_url(url), digest)
+    put_data(manifest_url(url), json.dumps(manifest))
+    manifest['uploaded'] = size - offset
+    return manifest
+
+
+def archive_spans(zip_path):
+    """return ({member: [offset, length, sha256]}, size, sha256) of a zip
+
+    a member span is its local header and data
+    """
+    with zipfile.ZipFile(zip_path) as z:
+        infos = sorted(z.infolist(), key=lambda info: info.header_offset)
+        bounds = [info.header_offset for info in infos] + [z.start_dir]
+
+    spans, sha = {}, hashlib.sha256()
+    with open(zip_path, 'rb') as fp:
+        sha.update(fp.read(bounds[0]))
+        for info, start, end in zip(infos, bounds, bounds[1:]):
+            span_sha, left = hashlib.sha256(), end - start
+            while left:
+                chunk = fp.read(min(left, 1024 * 1024))
+                span_sha.update(chunk)
+                sha.update(chunk)
+                left -= len(chunk)
+            spans[info.filename] = [start, end - start, span_sha.hexdigest()]
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            sha.update(chunk)
+        size = fp.tell()
+    return spans, size, sha.hexdigest()
+
+
+def delta_offset(previous, manifest):
+    # offset of the first byte which differs from the previous archive
+    offset = 0
+    old_spans = previous.get('spans', {})
+    for name in manifest['layout']:
+        span = manifest['spans'][name]
+        if old_spans.get(name) != span:
+            return span[0]
+        offset = span[0] + span[1]
+    return offset
+
+
+def manifest_url(url):
+    return digest_url(url)[:-len('.sha256')] + '.manifest.json'
+
+
+def get_manifest(url):
+    """the manifest stored with an archive by upload_delta, or None"""
+    try:
+        data = url2repo(manifest_url(url)).get()
+    except Exception:
+        return None
+    try:
+        manifest = json.loads(data)
+    except ValueError:
+        return None
+    return manifest if isinstance(manifest, dict) else None
+
+
+def digest_url(url):
+    # drop the #workdir fragment (used in remote archive urls)
+    if '://' in url:
+        url = url.partition('#')[0]
+    return url + '.sha256'
+
+
+def is_uploaded(repo, url, digest, size):
+    try:
+        remote_digest = url2repo(digest_url(url)).get()
+    except Exception:
+        return False
+    if isinstance(remote_digest, bytes):
+        remote_digest = remote_digest.decode('utf-8')
+    if not remote_digest or remote_digest.strip() != digest:
+        return False
+    remote_size = repo.stat()
+    return remote_size is not None and remote_size in (size, -1)
+
+
 def put_data(url, data):
     url2repo(url).put(data)
 
@@ -132,7 +752,107 @@ def url2repo(url=''):
         raise ValueError('unsupported repo scheme ({})'.format(scheme))
 
 
+class RepoCache:
+    """local cache of remote objects, validated on every read
+
+    entries are keyed by url (sha256) and revalidated with a conditional GET
+    (If-None-Match/If-Modified-Since, see ExternalRepo.conditional_get),
+    least recently used entries are evicted beyond max_size bytes
+    """
+
+    def __init__(self, root, max_size='1GB'):
+        self.root = root
+        self.max_size = parse_size(max_size)
+        os.makedirs(root, exist_ok=True)
+
+    def _paths(self, url):
+        key = path.join(self.root, hashlib.sha256(url.encode()).hexdigest())
+        return key + '.data', key + '.json'
+
+    def fetch(self, repo, url):
+        """return the local path of an up to date copy of url"""
+        data_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path) if path.isfile(data_path) else {}
+        resp = repo.conditional_get(meta.get('etag', ''),
+                                    meta.get('last_modified', ''))
+        if resp is None:
+            try:
+                os.utime(data_path)
+                logger.debug('using cached %s', url)
+                return data_path
+            except FileNotFoundError:
+                # evicted (by another process) since, fetch it again
+                resp = repo.conditional_get()
+
+        chunks, etag, last_modified = resp
+        with self._temp_file(data_path, 'wb') as fp:
+            for chunk in chunks:
+                fp.write(chunk)
+        with self._temp_file(meta_path, 'w') as fp:
+            json.dump({'etag': etag, 'last_modified': last_modified}, fp)
+        self.evict(keep=data_path)
+        return data_path
+
+    @staticmethod
+    def _read_meta(meta_path):
+        # a missing or corrupt entry is a cache miss
+        try:
+            with open(meta_path) as fp:
+                meta = json.load(fp)
+        except (OSError, ValueError):
+            return {}
+        return meta if isinstance(meta, dict) else {}
+
+    @contextmanager
+    def _temp_file(self, file_path, mode):
+        # written to a temp file and renamed, readers never see partial files
+        tmp_path = '{}.{}.{}.tmp'.format(file_path, os.getpid(),
+                                         threading.get_ident())
+        try:
+            with open(tmp_path, mode) as fp:
+                yield fp
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if path.isfile(tmp_path):
+                remove(tmp_path)
+            raise
+
+    def evict(self, keep=''):
+        entries, total = [], 0
+        for entry in os.scandir(self.root):
+            if entry.name.endswith('.data'):
+                stat = entry.stat()
+                total += stat.st_size
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        for _, size, data_path in sorted(entries):
+            if total <= self.max_size:
+                break
+            if data_path == keep:
+                continue
+            for file_path in (data_path, data_path[:-5] + '.json'):
+                try:
+                    remove(file_path)
+                except FileNotFoundError:
+                    pass
+            total -= size
+
+
+def repo_cache():
+    """RepoCache in NUCLIO_CACHE_DIR (size limit NUCLIO_CACHE_SIZE), or None"""
+    root = environ.get(env_keys.cache_dir)
+    if not root:
+        return None
+    return RepoCache(root, environ.get(env_keys.cache_size, '1GB'))
+
+
 class ExternalRepo:
+    # optional callback(bytes_sent) for uploads
+    progress = None
+    # supports upload_tail (write at an offset of an existing object)
+    ranged_writes = False
+    # continue interrupted uploads (None for the NUCLIO_UPLOAD_RESUME env)
+    resume = None
+
     def __init__(self, urlobj: ParseResult):
         self.urlobj = urlobj
         self.kind = ''
@@ -144,20 +864,56 @@ class ExternalRepo:
         pass
 
     def download(self, target_path):
-        text = self.get()
-        with open(target_path, 'w') as fp:
-            fp.write(text)
-            fp.close()
+        data = self.get()
+        with open(target_path, 'wb' if isinstance(data, bytes) else 'w') as fp:
+            fp.write(data)
 
     def upload(self, src_path):
         pass
 
+    def upload_stream(self, chunks):
+        # upload an iterable of bytes chunks
+        raise ValueError('unimplemented (cant stream to this repo)')
+
+    def upload_tail(self, src_path, offset):
+        # write src_path from offset into the object at the same offset
+        raise ValueError('unimplemented (no ranged writes to this repo)')
+
+    def stat(self):
+        # return object size, -1 if the size is unknown, None if missing
+        return None
+
+    def conditional_get(self, etag='', last_modified=''):
+        """return (bytes chunks, etag, last_modified) or None if not modified
+
+        repos which implement it are cached when NUCLIO_CACHE_DIR is set
+        """
+        raise ValueError('unimplemented (no conditional get from this repo)')
+
+    def read_range(self, offset, size):
+        # return size bytes from offset
+        raise ValueError('unimplemented (no range reads from this repo)')
+
+    def cache_url(self):
+        # cache key, (e.g. url with credentials), '' for non cached repos
+        return ''
+
+    def cached_path(self):
+        """local path of an up to date cached copy, None if not cached"""
+        url = self.cache_url()
+        cache = repo_cache() if url else None
+        if cache is None:
+            return None
+        return cache.fetch(self, url)
+
     def archive_cfg(self):
         # return (path, headers {}, workdir)
         raise Exception('unimplemented (nuclio cant load zip from this repo)')
 
 
 class FileRepo(ExternalRepo):
+    ranged_writes = True
+
     def __init__(self, path=''):
         self.path = path
         self.kind = 'file'
@@ -177,6 +933,47 @@ class FileRepo(ExternalRepo):
     def upload(self, src_path):
         copyfile(src_path, self.path)
 
+    def upload_tail(self, src_path, offset):
+        with open(src_path, 'rb') as src, open(self.path, 'r+b') as dst:
+            src.seek(offset)
+            dst.seek(offset)
+            copyfileobj(src, dst, 1024 * 1024)
+            dst.truncate()
+
+    def upload_stream(self, chunks):
+        try:
+            with open(self.path, 'wb') as fp:
+                for chunk in chunks:
+                    fp.write(chunk)
+        except BaseException:
+            remove(self.path)
+            raise
+
+    def stat(self):
+        if path.isfile(self.path):
+            return path.getsize(self.path)
+
+
+def s3_transfer_config(part_size=None, concurrency=None, max_bandwidth=None):
+    """boto3 TransferConfig, defaults from the NUCLIO_S3_* env vars
+
+    part_size is also the multipart threshold, max_bandwidth is in bytes/sec
+    """
+    from boto3.s3.transfer import TransferConfig
+
+    part_size = part_size or environ.get(env_keys.s3_part_size)
+    concurrency = concurrency or environ.get(env_keys.s3_concurrency)
+    max_bandwidth = max_bandwidth or environ.get(env_keys.s3_max_bandwidth)
+    kw = {}
+    if part_size:
+        kw['multipart_threshold'] = kw['multipart_chunksize'] = \
+            parse_size(part_size)
+    if concurrency:
+        kw['max_concurrency'] = int(concurrency)
+    if max_bandwidth:
+        kw['max_bandwidth'] = parse_size(max_bandwidth)
+    return TransferConfig(**kw)
+
 
 class S3Repo(ExternalRepo):
     def __init__(self, urlobj: ParseResult):
@@ -185,27 +982,105 @@ class S3Repo(ExternalRepo):
         self.bucket = urlobj.hostname
         self.key = urlobj.path[1:]
         region = None
+        self.access_key = urlobj.username or ''
         if urlobj.username or urlobj.password:
             self.s3 = boto3.resource('s3', region_name=region,
                                      aws_access_key_id=urlobj.username,
                                      aws_secret_access_key=urlobj.password)
         else:
             self.s3 = boto3.resource('s3', region_name=region)
+        self._transfer_config = None
+
+    @property
+    def transfer_config(self):
+        if self._transfer_config is None:
+            self._transfer_config = s3_transfer_config()
+        return self._transfer_config
 
     def upload(self, src_path):
-        self.s3.Object(self.bucket, self.key).put(Body=open(src_path, 'rb'))
+        # managed transfer, multipart (with per part retries) for large files
+        self.s3.Object(self.bucket, self.key).upload_file(
+            src_path, Config=self.transfer_config, Callback=self.progress)
+
+    def upload_stream(self, chunks):
+        self.s3.Object(self.bucket, self.key).upload_fileobj(
+            ChunksReader(chunks), Config=self.transfer_config,
+            Callback=self.progress)
+
+    def stat(self):
+        from botocore.exceptions import ClientError
+        try:
+            return self.s3.Object(self.bucket, self.key).content_length
+        except ClientError as err:
+            if err.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey'):
+                return None
+            raise
 
     def get(self):
+        cached = self.cached_path()
+        if cached:
+            with open(cached, 'rb') as fp:
+                return fp.read()
         obj = self.s3.Object(self.bucket, self.key)
         return obj.get()['Body'].read()
 
+    def download(self, target_path):
+        cached = self.cached_path()
+        if cached:
+            copyfile(cached, target_path)
+            return
+        self.s3.Object(self.bucket, self.key).download_file(
+            target_path, Config=self.transfer_config)
+
     def put(self, data):
         self.s3.Object(self.bucket, self.key).put(Body=data)
 
+    def read_range(self, offset, size):
+        resp = self.s3.Object(self.bucket, self.key).get(
+            Range='bytes={}-{}'.format(offset, offset + size - 1))
+        return resp['Body'].read()
+
+    def cache_url(self):
+        return 's3://{}/{}#{}'.format(self.bucket, self.key, self.access_key)
+
+    def conditional_get(self, etag='', last_modified=''):
+        from botocore.exceptions import ClientError
+        kw = {'IfNoneMatch': etag} if etag else {}
+        try:
+            resp = self.s3.Object(self.bucket, self.key).get(**kw)
+        except ClientError as err:
+            if err.response.get('Error', {}).get('Code') in ('304', 'NotModified'):
+                return None
+            raise
+        body = resp['Body']
+        return iter(lambda: body.read(1024 * 1024), b''), resp.get('ETag', ''), ''
+
     def archive_cfg(self):
         raise Exception('unimplemented (nuclio load from private s3)')
 
 
+class ChunksReader(io.RawIOBase):
+    """readable file object over an iterable of bytes chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._buf = b''
+
+    def readable(self):
+        return True
+
+    def readinto(self, b):
+        while not self._buf:
+            self._buf = next(self._chunks, None)
+            if self._buf is None:
+                self._buf = b''
+                return 0
+        size = min(len(b), len(self._buf))
+        b[:size] = self._buf[:size]
+        self._buf = self._buf[size:]
+        return size
+
+
 def basic_auth_header(user, password):
     username = user.encode('latin1')
     password = password.encode('latin1')
@@ -214,9 +1089,24 @@ def basic_auth_header(user, password):
     return {'Authorization': authstr}
 
 
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def http_session(url):
+    """pooled (keep-alive) requests session per scheme://host"""
+    p = urlparse(url)
+    key = (p.scheme, p.netloc)
+    session = _sessions.get(key)
+    if session is None:
+        with _sessions_lock:
+            session = _sessions.setdefault(key, requests.Session())
+    return session
+
+
 def http_get(url, headers=None, auth=None):
     try:
-        resp = requests.get(url, headers=headers, auth=auth)
+        resp = http_session(url).get(url, headers=headers, auth=auth)
     except OSError:
         raise OSError('error: cannot connect to {}'.format(url))
 
@@ -225,9 +1115,85 @@ def http_get(url, headers=None, auth=None):
     return resp.text
 
 
+def http_download(url, target_path, headers=None, auth=None):
+    """stream url body into a local (binary) file"""
+    try:
+        resp = http_session(url).get(url, headers=headers, auth=auth,
+                                     stream=True)
+    except OSError:
+        raise OSError('error: cannot connect to {}'.format(url))
+
+    with resp:
+        if not resp.ok:
+            raise OSError('failed to read file in {}'.format(url))
+        with open(target_path, 'wb') as fp:
+            for chunk in resp.iter_content(1024 * 1024):
+                fp.write(chunk)
+
+
+def http_conditional_get(url, etag='', last_modified='', headers=None,
+                         auth=None):
+    # see ExternalRepo.conditional_get
+    headers = dict(headers or {})
+    if etag:
+        headers['If-None-Match'] = etag
+    if last_modified:
+        headers['If-Modified-Since'] = last_modified
+    try:
+        resp = http_session(url).get(url, headers=headers, auth=auth,
+                                     stream=True)
+    except OSError:
+        raise OSError('error: cannot connect to {}'.format(url))
+    if resp.status_code == 304:
+        resp.close()
+        return None
+    if not resp.ok:
+        resp.close()
+        raise OSError('failed to read file in {}'.format(url))
+
+    def chunks():
+        with resp:
+            yield from resp.iter_content(1024 * 1024)
+
+    return (chunks(), resp.headers.get('ETag', ''),
+            resp.headers.get('Last-Modified', ''))
+
+
+def http_read_range(url, offset, size, headers=None, auth=None):
+    headers = dict(headers or {})
+    headers['Range'] = 'bytes={}-{}'.format(offset, offset + size - 1)
+    try:
+        resp = http_session(url).get(url, headers=headers, auth=auth)
+    except OSError:
+        raise OSError('error: cannot connect to {}'.format(url))
+    if resp.status_code != 206:
+        raise OSError('failed range read of {} {}'.format(
+            url, resp.status_code))
+    return resp.content
+
+
+def read_text(file_path):
+    with open(file_path, encoding='utf-8') as fp:
+        return fp.read()
+
+
+def http_head_size(url, headers=None, auth=None):
+    # return Content-Length (-1 if not sent), None if url not found
+    try:
+        resp = http_session(url).head(url, headers=headers, auth=auth,
+                                      allow_redirects=True)
+    except OSError:
+        raise OSError('error: cannot connect to {}'.format(url))
+    if resp.status_code == 404:
+        return None
+    if not resp.ok:
+        raise OSError('failed to stat {} {}'.format(url, resp.status_code))
+    return int(resp.headers.get('Content-Length', -1))
+
+
 def http_put(url, data, headers=None, auth=None):
     try:
-        resp = requests.put(url, data=data, headers=headers, auth=auth)
+        resp = http_session(url).put(url, data=data, headers=headers, auth=auth)
     except OSError:
         raise OSError('error: cannot connect to {}'.format(url))
     if not resp.ok:
@@ -235,9 +1201,100 @@ def http_put(url, data, headers=None, auth=None):
             'failed to upload to {} {}'.format(url, resp.status_code))
 
 
-def http_upload(url, file_path, headers=None, auth=None):
+def http_upload(url, file_path, headers=None, auth=None, progress=None):
     with open(file_path, 'rb') as data:
         http_put(url, data, headers, auth)
+    if progress:
+        progress(path.getsize(file_path))
+
+
+def upload_chunk_size():
+    return parse_size(environ.get(env_keys.upload_chunk_size, '16MB'))
+
+
+def iter_file_chunks(file_path, offset=0, chunk_size=None):
+    chunk_size = chunk_size or upload_chunk_size()
+    with open(file_path, 'rb') as fp:
+        fp.seek(offset)
+        for chunk in iter(lambda: fp.read(chunk_size), b''):
+            yield chunk
+
+
+def http_put_ranges(url, chunks, headers=None, auth=None, offset=0,
+                    progress=None, retries=3):
+    """upload chunks with a PUT per chunk, written at their offset (Range)
+
+    the first chunk at offset 0 replaces the object, a failed chunk PUT is
+    retried (it is idempotent) up to retries times
+    """
+    for chunk in chunks:
+        chunk_headers = dict(headers or {})
+        if offset:
+            chunk_headers['Range'] = 'bytes={}-{}'.format(
+                offset, offset + len(chunk) - 1)
+        for attempt in range(retries + 1):
+            try:
+                http_put(url, chunk, chunk_headers, auth)
+                break
+            except OSError as exc:
+                if attempt == retries:
+                    raise
+                logger.debug('retry upload of %s at %d: %s', url, offset, exc)
+        offset += len(chunk)
+        if progress:
+            progress(len(chunk))
+    if not offset:
+        http_put(url, b'', headers, auth)
+
+
+def partial_url(url):
+    return url + '.partial'
+
+
+def prefix_digest(file_path, size):
+    """sha256 of the first size bytes of a file"""
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        while size > 0:
+            chunk = fp.read(min(size, 1024 * 1024))
+            if not chunk:
+                break
+            sha.update(chunk)
+            size -= len(chunk)
+    return sha.hexdigest()
+
+
+def http_put_partial(url, file_path, offset, headers=None, auth=None):
+    # marker of an interrupted upload, see http_resume_offset
+    marker = {'offset': offset, 'size': path.getsize(file_path),
+              'sha256': prefix_digest(file_path, offset)}
+    http_put(partial_url(url), json.dumps(marker), headers, auth)
+
+
+def http_resume_offset(url, file_path, headers=None, auth=None):
+    """bytes of file_path already uploaded to url by an interrupted upload
+
+    an interrupted upload leaves a <url>.partial marker (offset, file size
+    and sha256 of the uploaded prefix). the upload resumes only when the
+    marker matches the file and the target holds at least offset bytes,
+    otherwise it starts from 0
+    """
+    try:
+        marker = json.loads(http_get(partial_url(url), headers, auth))
+    except (OSError, ValueError):
+        return 0
+    if not isinstance(marker, dict):
+        return 0
+    offset = marker.get('offset')
+    if not isinstance(offset, int) or offset <= 0 or \
+            marker.get('size') != path.getsize(file_path):
+        return 0
+    remote = http_head_size(url, headers, auth)
+    if remote is None or remote < offset:
+        return 0
+    if marker.get('sha256') != prefix_digest(file_path, offset):
+        return 0
+    return offset
 
 
 class HttpRepo(ExternalRepo):
@@ -259,20 +1316,50 @@ class HttpRepo(ExternalRepo):
         self.workdir = urlobj.fragment
 
     def upload(self, src_path):
-        raise ValueError('unimplemented')
+        # streaming (single request) PUT of the file
+        http_upload(self.url, src_path, None, self.auth, self.progress)
+
+    def upload_stream(self, chunks):
+        # chunked transfer encoding PUT
+        http_put(self.url, iter(chunks), None, self.auth)
 
     def put(self, data):
-        raise ValueError('unimplemented')
+        http_put(self.url, data, None, self.auth)
 
     def get(self):
+        cached = self.cached_path()
+        if cached:
+            return read_text(cached)
         return http_get(self.url, None, self.auth)
 
+    def download(self, target_path):
+        cached = self.cached_path()
+        if cached:
+            copyfile(cached, target_path)
+            return
+        http_download(self.url, target_path, None, self.auth)
+
+    def cache_url(self):
+        return '{}#{}'.format(self.url, self.auth)
+
+    def read_range(self, offset, size):
+        return http_read_range(self.url, offset, size, None, self.auth)
+
+    def conditional_get(self, etag='', last_modified=''):
+        return http_conditional_get(self.url, etag, last_modified, None,
+                                    self.auth)
+
+    def stat(self):
+        return http_head_size(self.url, None, self.auth)
+
     def archive_cfg(self):
         # return path, headers {}, workdir
         return self.url, self.nuclio_header, self.workdir
 
 
 class V3ioRepo(ExternalRepo):
+    ranged_writes = True
+
     def __init__(self, urlobj: ParseResult):
         self.kind = 'v3io'
         host = urlobj.hostname or environ.get('V3IO_API')
@@ -296,12 +1383,76 @@ class V3ioRepo(ExternalRepo):
         self.path = urlobj.path
         self.workdir = urlobj.fragment
 
-    def upload(self, src_path):
-        http_upload(self.url, src_path, self.headers, None)
+    def upload(self, src_path, resume=None):
+        """upload in chunks (NUCLIO_UPLOAD_CHUNK_SIZE, default 16MB)
+
+        a failed upload records the bytes written so far in a <url>.partial
+        marker, with resume (default .resume or NUCLIO_UPLOAD_RESUME) an
+        upload of the same file continues from there (see http_resume_offset)
+        """
+        if resume is None:
+            resume = self.resume
+        if resume is None:
+            resume = environ.get(env_keys.upload_resume, '').lower() == 'true'
+        offset = 0
+        if resume:
+            offset = http_resume_offset(self.url, src_path, self.headers,
+                                        None)
+        written = [offset]
+
+        def progress(size):
+            written[0] += size
+            if self.progress:
+                self.progress(size)
+
+        try:
+            http_put_ranges(self.url, iter_file_chunks(src_path, offset),
+                            self.headers, None, offset, progress)
+        except BaseException:
+            if written[0]:
+                try:
+                    http_put_partial(self.url, src_path, written[0],
+                                     self.headers, None)
+                except Exception as exc:
+                    logger.debug('cannot save upload marker: %s', exc)
+            raise
+        if offset:
+            http_put(partial_url(self.url), '{}', self.headers, None)
+
+    def upload_stream(self, chunks):
+        http_put_ranges(self.url, chunks, self.headers, None,
+                        progress=self.progress)
+
+    def upload_tail(self, src_path, offset):
+        http_put_ranges(self.url, iter_file_chunks(src_path, offset),
+                        self.headers, None, offset, self.progress)
 
     def get(self):
+        cached = self.cached_path()
+        if cached:
+            return read_text(cached)
         return http_get(self.url, self.headers, None)
 
+    def download(self, target_path):
+        cached = self.cached_path()
+        if cached:
+            copyfile(cached, target_path)
+            return
+        http_download(self.url, target_path, self.headers, None)
+
+    def cache_url(self):
+        return '{}#{}'.format(self.url, self.headers)
+
+    def read_range(self, offset, size):
+        return http_read_range(self.url, offset, size, self.headers, None)
+
+    def conditional_get(self, etag='', last_modified=''):
+        return http_conditional_get(self.url, etag, last_modified,
+                                    self.headers, None)
+
+    def stat(self):
+        return http_head_size(self.url, self.headers, None)
+
     def put(self, data):
         http_put(self.url, data, self.headers, None)
 
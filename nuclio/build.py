@@ -19,13 +19,13 @@ from sys import executable, stderr
 from subprocess import run, PIPE
 from base64 import b64encode, b64decode
 
-import yaml
 from IPython import get_ipython
 
+from .codec import yaml_dump, yaml_load, LazyYaml
 from .utils import (env_keys, notebook_file_name, logger, normalize_name,
                     BuildError)
-from .archive import (build_zip, get_archive_config, url2repo, upload_file,
-                      put_data)
+from .archive import (build_zip, build_and_upload, get_archive_config,
+                      url2repo, put_data)
 from .config import (update_in, new_config, ConfigSpec, load_config,
                      meta_keys, extend_config, set_handler)
 
@@ -44,6 +44,7 @@ def build_file(filename='', name='', handler='', archive=False, project='',
             raise ValueError('please specify file name/path/url')
 
     filebase, ext = os.path.splitext(os.path.basename(filename))
+    source = filename
     is_source = False
     if ext == '.ipynb':
         from_url = '://' in filename
@@ -87,29 +88,26 @@ def build_file(filename='', name='', handler='', archive=False, project='',
     # Avoid import issues if the filename is the same as an existing Python library by adding a Nuclio suffix
     normalized_filebase = normalize_name(filebase) + '-nuclio'
     update_in(config, 'metadata.name', name)
-    config = extend_config(config, spec, tag, filename)
+    config = extend_config(config, spec, tag, source)
     set_handler(config, normalized_filebase, '' if kind else handler, ext)
 
     log = logger.info if verbose else logger.debug
-    log('Code:\n{}'.format(code))
-    log('Config:\n{}'.format(yaml.safe_dump(config, default_flow_style=False)))
+    log('Code:\n%s', code)
+    log('Config:\n%s', LazyYaml(config))
 
     if archive or files:
         output, url_target = archive_path(output_dir, project, name, tag)
+        log('Build/upload archive in: %s', output)
         if url_target:
-            zip_path = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
+            build_and_upload(output, config, code, files, ext, filebase,
+                             skip_unchanged=True)
+            config = get_archive_config(name, output)
+            config = extend_config(config, None, tag, source)
+            log('Archive Config:\n%s', LazyYaml(config))
         else:
             zip_path = os.path.abspath(output)
             os.makedirs(os.path.dirname(zip_path), exist_ok=True)
-
-        log('Build/upload archive in: {}'.format(output))
-        build_zip(zip_path, config, code, files, ext, filebase)
-        if url_target:
-            upload_file(zip_path, output, True)
-            config = get_archive_config(name, output)
-            config = extend_config(config, None, tag, filename)
-            config_text = yaml.safe_dump(config, default_flow_style=False)
-            log('Archive Config:\n{}'.format(config_text))
+            build_zip(zip_path, config, code, files, ext, filebase)
 
     elif output_dir:
         if '://' not in output_dir:
@@ -118,7 +116,7 @@ def build_file(filename='', name='', handler='', archive=False, project='',
 
         config['metadata'].pop("name", None)
         put_data('{}/function.yaml'.format(output_dir),
-                 yaml.safe_dump(config, default_flow_style=False))
+                 yaml_dump(config))
         update_in(config, 'metadata.name', name)
 
         # make sure we dont overwrite the source code
@@ -180,7 +178,7 @@ def build_notebook(nb_file, no_embed=False, tag="", name="", ignored_tags=""):
 
     with open(yaml_filepath) as yp:
         config_data = yp.read()
-    config = yaml.safe_load(config_data)
+    config = yaml_load(config_data)
     os.remove(yaml_filepath)
 
     if py_filepath:
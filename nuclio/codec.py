@@ -0,0 +1,66 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""YAML/JSON encoding, using the native (C) implementations when installed"""
+import json
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader, CSafeDumper as SafeDumper
+except ImportError:
+    from yaml import SafeLoader, SafeDumper
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def yaml_load(data):
+    """Parse YAML text/stream (same semantics as yaml.safe_load)"""
+    return yaml.load(data, Loader=SafeLoader)
+
+
+def yaml_dump(obj, default_flow_style=False):
+    """Dump obj to YAML text (same semantics as yaml.safe_dump)"""
+    return yaml.dump(obj, Dumper=SafeDumper,
+                     default_flow_style=default_flow_style)
+
+
+def json_loads(data):
+    """Parse JSON str/bytes"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def response_json(resp):
+    """Decode the JSON body of a requests.Response"""
+    return json_loads(resp.content)
+
+
+class LazyYaml:
+    """Defer YAML rendering of obj until converted to str
+
+    Pass as a logging argument (e.g. log('Config: %s', LazyYaml(config))) so
+    the config is only rendered when the record is actually emitted.
+    """
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    def __str__(self):
+        return yaml_dump(self.obj)
@@ -13,11 +13,12 @@
 # limitations under the License.
 
 from base64 import b64decode
-from copy import deepcopy
+from functools import lru_cache
 from os import path, environ
 import yaml
 from IPython import get_ipython
 
+from .codec import yaml_load, SafeDumper
 from .utils import parse_env, logger
 from .archive import url2repo
 from .triggers import HttpTrigger
@@ -34,7 +35,82 @@ class meta_keys:
     generated_by = 'nuclio.io/generated_by'
 
 
-_function_config = {
+class _FrozenDict(dict):
+    """read-only dict, a config sub tree shared by a template or snapshots"""
+
+    __slots__ = ()
+
+    def _read_only(self, *args, **kw):
+        raise TypeError('shared config sub tree is read-only, access it '
+                        'through its ConfigDict or copy it first')
+
+    __setitem__ = __delitem__ = __ior__ = _read_only
+    setdefault = pop = popitem = update = clear = _read_only
+
+    def __reduce__(self):
+        return dict, (_copy_tree(self),)
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return _copy_tree(self)
+
+
+class _FrozenList(list):
+    """read-only list, a config sub tree shared by a template or snapshots"""
+
+    __slots__ = ()
+
+    _read_only = _FrozenDict._read_only
+    __setitem__ = __delitem__ = __iadd__ = __imul__ = _read_only
+    append = extend = insert = pop = remove = clear = _read_only
+    sort = reverse = _read_only
+
+    def __reduce__(self):
+        return list, (_copy_tree(self),)
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return _copy_tree(self)
+
+
+_frozen_types = (_FrozenDict, _FrozenList)
+
+
+def _freeze(value):
+    """read-only copy of a config tree, frozen sub trees are reused"""
+    if type(value) in _frozen_types:
+        return value
+    if isinstance(value, dict):
+        return _FrozenDict(
+            {k: _freeze(v) for k, v in dict.items(value)})
+    if isinstance(value, list):
+        return _FrozenList([_freeze(v) for v in value])
+    return value
+
+
+def _copy_tree(value):
+    """plain (mutable) copy of a config tree"""
+    if isinstance(value, dict):
+        return {k: _copy_tree(v) for k, v in dict.items(value)}
+    if isinstance(value, list):
+        return [_copy_tree(v) for v in value]
+    return value
+
+
+def _thaw(value):
+    """one level mutable copy of a frozen sub tree"""
+    if isinstance(value, dict):
+        return ConfigDict(value)
+    if isinstance(value, list):
+        return [_thaw(v) for v in value]
+    return value
+
+
+_function_config = _freeze({
     'apiVersion': 'nuclio.io/v1',
     'kind': 'Function',
     'metadata': {
@@ -52,11 +128,115 @@ _function_config = {
             'noBaseImagesPull': True,
         },
     },
-}
+})
+
+
+class ConfigDict(dict):
+    """dict with copy-on-write sub trees
+
+    Children may be read-only sub trees shared with the template or with
+    another snapshot, they are copied one level (lists get ConfigDict
+    items) the first time they are accessed through this dict, since the
+    caller may modify what it gets. Sub trees which are never accessed
+    stay shared, this makes new_config() O(top level keys) and copy() (a
+    snapshot) O(nodes modified since the last snapshot). dict(obj) and
+    {**obj} get mutable children, raw dict access (e.g. dict.items(obj) or
+    orjson) sees the shared sub trees, which raise TypeError when modified
+    instead of corrupting the template.
+    """
+
+    __slots__ = ()
+
+    def _own(self, key, value):
+        value = _thaw(value)
+        dict.__setitem__(self, key, value)
+        return value
+
+    def _own_all(self):
+        for key, value in list(dict.items(self)):
+            if type(value) in _frozen_types:
+                self._own(key, value)
+
+    def __getitem__(self, key):
+        value = dict.__getitem__(self, key)
+        if type(value) in _frozen_types:
+            return self._own(key, value)
+        return value
+
+    def __iter__(self):
+        # not the dict one, so dict(obj) and {**obj} go through __getitem__
+        return dict.__iter__(self)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+    def setdefault(self, key, default=None):
+        if key in self:
+            return self[key]
+        self[key] = default
+        return default
+
+    def pop(self, key, *default):
+        if key in self:
+            value = self[key]
+            del self[key]
+            return value
+        return dict.pop(self, key, *default)
+
+    def popitem(self):
+        self._own_all()
+        return dict.popitem(self)
+
+    def items(self):
+        self._own_all()
+        return dict.items(self)
+
+    def values(self):
+        self._own_all()
+        return dict.values(self)
+
+    def copy(self):
+        """snapshot, sub trees are shared with this dict
+
+        this dict gives up its modified sub trees for their frozen copies
+        (so the next snapshot reuses them), sub trees taken from it before
+        the copy are detached from it
+        """
+        frozen = _freeze(self)
+        dict.update(self, frozen)
+        return ConfigDict(frozen)
+
+    def __copy__(self):
+        return self.copy()
+
+    def __deepcopy__(self, memo):
+        return self.copy()
+
+    def __reduce__(self):
+        return ConfigDict, (_copy_tree(self),)
+
+
+def _represent_dict(dumper, data):
+    return dumper.represent_dict(dict(data))
+
+
+def _represent_list(dumper, data):
+    return dumper.represent_list(list(data))
+
+
+_dumpers = {SafeDumper, yaml.SafeDumper, yaml.Dumper,
+            getattr(yaml, 'CDumper', yaml.Dumper)}
+for _dumper in _dumpers:
+    _dumper.add_representer(ConfigDict, _represent_dict)
+    _dumper.add_representer(_FrozenDict, _represent_dict)
+    _dumper.add_representer(_FrozenList, _represent_list)
 
 
 def new_config():
-    return deepcopy(_function_config)
+    """new function config, a ConfigDict sharing the default template"""
+    return ConfigDict(_function_config)
 
 
 def get_in(obj, keys):
@@ -65,7 +245,7 @@ def get_in(obj, keys):
     1
     """
     if isinstance(keys, str):
-        keys = keys.split('.')
+        keys = key_path(keys)
 
     for key in keys:
         if not obj or key not in obj:
@@ -92,8 +272,21 @@ def _split_by_dots_with_escaping(key: str):
     return parts
 
 
+@lru_cache(maxsize=4096)
+def key_path(key: str):
+    """
+    parsed (and memoized) path of a dotted key, escaped dots are kept
+
+    >>> key_path('spec.build.commands')
+    ('spec', 'build', 'commands')
+    """
+    if '\\' not in key:
+        return tuple(key.split('.'))
+    return tuple(_split_by_dots_with_escaping(key))
+
+
 def update_in(obj, key, value, append=False):
-    parts = _split_by_dots_with_escaping(key) if isinstance(key, str) else key
+    parts = key_path(key) if isinstance(key, str) else key
     for part in parts[:-1]:
         sub = obj.get(part, missing)
         if sub is missing:
@@ -116,13 +309,58 @@ def update_in(obj, key, value, append=False):
         obj[last_key] = value
 
 
+def apply_updates(obj, updates: dict):
+    """
+    apply {dotted.key: value, ..} in one pass, values are appended to
+    existing lists (same as update_in(obj, key, value, append=True)) and
+    set otherwise, shared key prefixes are resolved only once
+
+    >>> obj = {'a': {'c': [1]}}
+    >>> apply_updates(obj, {'a.b': 1, 'a.c': 2, 'x.y': 3})
+    >>> obj
+    {'a': {'c': [1, 2], 'b': 1}, 'x': {'y': 3}}
+    """
+    parents = {(): obj}
+    for key, value in updates.items():
+        parts = key_path(key) if isinstance(key, str) else tuple(key)
+        parent_path = parts[:-1]
+        parent = parents.get(parent_path)
+        if parent is None:
+            depth = len(parent_path) - 1
+            while parent_path[:depth] not in parents:
+                depth -= 1
+            parent = parents[parent_path[:depth]]
+            for depth in range(depth, len(parent_path)):
+                part = parent_path[depth]
+                sub = parent.get(part, missing)
+                if sub is missing:
+                    sub = parent[part] = {}
+                parent = parents[parent_path[:depth + 1]] = sub
+
+        last_key = parts[-1]
+        current = parent.get(last_key)
+        if isinstance(current, list):
+            if isinstance(value, list):
+                current += value
+            else:
+                current.append(value)
+            continue
+
+        parent[last_key] = value
+        if parts in parents:
+            # the value replaced an already resolved sub tree
+            size = len(parts)
+            parents = {path: sub for path, sub in parents.items()
+                       if path[:size] != parts}
+
+
 def load_config(config_file):
     config_data = url2repo(config_file).get()
     return load_config_data(config_data)
 
 
 def load_config_data(config_data):
-    config = yaml.safe_load(config_data)
+    config = yaml_load(config_data)
     code = config['spec']['build'].get('functionSourceCode')
     if code:
         code = b64decode(code).decode('utf-8')
@@ -208,7 +446,8 @@ def set_commands(config, commands):
         update_in(config, 'spec.build.commands', line, append=True)
 
 
-def set_env(config, env):
+def set_env(config, env, index=None):
+    index = index or EnvIndex(config)
     for line in env:
         line = line.strip()
         if not line or line[0] == '#':
@@ -218,7 +457,7 @@ def set_env(config, env):
             for key in ['V3IO_FRAMESD', 'V3IO_USERNAME',
                         'V3IO_ACCESS_KEY', 'V3IO_API']:
                 if key in environ:
-                    create_or_update_env_var(config, key, environ[key])
+                    index.set(key, environ[key])
             continue
 
         key, value = parse_env(line)
@@ -227,42 +466,61 @@ def set_env(config, env):
                 'cannot parse environment value from: {}'.format(line))
 
         # TODO: allow external source env with magic
-        create_or_update_env_var(config, key, value)
+        index.set(key, value)
 
 
-def set_env_dict(config, env=None):
+def set_env_dict(config, env=None, index=None):
     env = env or {}
+    index = index or EnvIndex(config)
     for k, v in env.items():
-        create_or_update_env_var(config, k, value=str(v))
+        index.set(k, value=str(v))
 
 
-def set_external_source_env_dict(config, external_source_env=None):
+def set_external_source_env_dict(config, external_source_env=None,
+                                 index=None):
     external_source_env = external_source_env or {}
+    index = index or EnvIndex(config)
     for k, v in external_source_env.items():
-        create_or_update_env_var(config, k, value_from=v)
+        index.set(k, value_from=v)
 
 
-def create_or_update_env_var(config, key, value=None, value_from=None):
+def env_item(key, value=None, value_from=None):
     if value is not None:
-        item = {'name': key, 'value': value}
+        return {'name': key, 'value': value}
     elif value_from is not None:
-        item = {'name': key, 'valueFrom': value_from}
-    else:
-        raise Exception(f'either value or value_from required for env var: {key}')
+        return {'name': key, 'valueFrom': value_from}
+    raise Exception(f'either value or value_from required for env var: {key}')
 
-    config['spec'].setdefault('env', [])
 
-    # find key existence in env
-    env_names = [env['name'] for env in config['spec']['env']]
-    try:
-        location = env_names.index(key)
-    except ValueError:
-        location = None
+class EnvIndex:
+    """name -> position index over the config 'spec.env' list
 
-    if location is not None:
-        config['spec']['env'][location] = item
-    else:
-        config['spec']['env'].append(item)
+    Build once per batch of updates (instead of scanning the list for
+    every variable), the list is updated in place and stays a plain list
+    of {'name': .., 'value'/'valueFrom': ..} items in insertion order.
+    """
+
+    def __init__(self, config):
+        config['spec'].setdefault('env', [])
+        self.env = config['spec']['env']
+        self.positions = {}
+        for i, item in enumerate(self.env):
+            self.positions.setdefault(item['name'], i)
+
+    def set(self, key, value=None, value_from=None):
+        self.put(env_item(key, value, value_from))
+
+    def put(self, item):
+        location = self.positions.get(item['name'])
+        if location is not None:
+            self.env[location] = item
+        else:
+            self.positions[item['name']] = len(self.env)
+            self.env.append(item)
+
+
+def create_or_update_env_var(config, key, value=None, value_from=None):
+    EnvIndex(config).set(key, value=value, value_from=value_from)
 
 
 def update_env_var(config, key, value=None, value_from=None):
@@ -279,13 +537,11 @@ def fill_config(config, extra_config=None, env=None, cmd=None, mount: Volume = N
     cmd = cmd or []
     external_source_env = external_source_env or {}
     if config:
-        for k, v in extra_config.items():
-            current = get_in(config, k)
-            update_in(config, k, v, isinstance(current, list))
-    if env:
-        set_env_dict(config, env)
-    if external_source_env:
-        set_external_source_env_dict(config, external_source_env)
+        apply_updates(config, extra_config)
+    if env or external_source_env:
+        index = EnvIndex(config)
+        set_env_dict(config, env, index)
+        set_external_source_env_dict(config, external_source_env, index)
     if cmd:
         set_commands(config, cmd)
     if mount:
@@ -303,36 +559,86 @@ class ConfigSpec:
     cmd                         - string list with build commands
                                 e.g. ["pip install requests", "apt-get wget -y"]
     mount                       - Volume object for remote mount into a function
-
+    base                        - ConfigSpec layer merged before this one
+                                e.g. base -> team -> function, see extend()
+    name                        - layer name
+
+    Layers shared by many functions can be frozen, freeze() renders the
+    layer once (env items, expanded commands, volumes) and merge() then
+    only overlays the cached patch. Use the set/add methods to modify a
+    frozen spec (they drop the cached patch), in-place edits of env/config
+    dicts are not detected.
     """
 
     def __init__(self, env=None, config=None, cmd=None,
-                 mount: Volume = None, v3io=False, external_source_env=None):
+                 mount: Volume = None, v3io=False, external_source_env=None,
+                 base=None, name=''):
         self.env = env or {}
         self.external_source_env = external_source_env or {}
         self.extra_config = config or {}
         self.cmd = cmd or []
         self.mounts = []
+        self.base = base
+        self.name = name
+        self._patch = None
         if mount:
             self.mounts.append(mount)
         if v3io:
             self.with_v3io()
 
+    def extend(self, name='', **kw):
+        """new ConfigSpec layer on top of this one"""
+        return ConfigSpec(base=self, name=name, **kw)
+
+    def freeze(self):
+        """render this layer once, later merges apply the cached patch"""
+        if self.base:
+            self.base.freeze()
+        rendered = {'spec': {'env': [], 'volumes': [],
+                             'build': {'commands': []}}}
+        self._merge(rendered, with_config=False)
+        spec = rendered['spec']
+        self._patch = (dict(self.extra_config), spec['env'],
+                       spec['build']['commands'], spec['volumes'])
+        return self
+
     def merge(self, config):
-        if self.extra_config:
-            for k, v in self.extra_config.items():
-                current = get_in(config, k)
-                update_in(config, k, v, isinstance(current, list))
-        if self.env:
-            set_env_dict(config, self.env)
-        if self.external_source_env:
-            set_external_source_env_dict(config, self.external_source_env)
+        if self.base:
+            self.base.merge(config)
+        if self._patch is None:
+            self._merge(config)
+            return
+
+        extra_config, env, commands, volumes = self._patch
+        if extra_config:
+            apply_updates(config, extra_config)
+        if env:
+            index = EnvIndex(config)
+            for item in env:
+                index.put(dict(item))
+        if commands:
+            update_in(config, 'spec.build.commands', list(commands),
+                      append=True)
+        if volumes:
+            update_in(config, 'spec.volumes', _copy_tree(volumes),
+                      append=True)
+
+    def _merge(self, config, with_config=True):
+        if self.extra_config and with_config:
+            apply_updates(config, self.extra_config)
+        if self.env or self.external_source_env:
+            index = EnvIndex(config)
+            set_env_dict(config, self.env, index)
+            set_external_source_env_dict(config, self.external_source_env,
+                                         index)
         if self.cmd:
             set_commands(config, self.cmd)
         for mount in self.mounts:
             mount.render(config)
 
     def apply(self, skipcmd=False):
+        if self.base:
+            self.base.apply(skipcmd)
         for k, v in self.env.items():
             environ[k] = v
 
@@ -342,28 +648,34 @@ class ConfigSpec:
                 ipy.system(path.expandvars(line))
 
     def set_env(self, name, value):
+        self._patch = None
         self.env[name] = value
         return self
 
     def set_external_source_env(self, name, value_from):
+        self._patch = None
         self.external_source_env[name] = value_from
         return self
 
     def set_config(self, key, value):
+        self._patch = None
         self.extra_config[key] = value
         return self
 
     def add_commands(self, *cmd):
+        self._patch = None
         self.cmd += cmd
         return self
 
     def add_volume(self, local, remote, kind='', name='fs',
                    key='', readonly=False):
+        self._patch = None
         vol = Volume(local, remote, kind, name, key, readonly)
         self.mounts.append(vol)
         return self
 
     def add_trigger(self, name, spec):
+        self._patch = None
         if hasattr(spec, 'to_dict'):
             spec = spec.to_dict()
         self.extra_config['spec.triggers.{}'.format(name)] = spec
@@ -377,6 +689,7 @@ class ConfigSpec:
         return self
 
     def with_v3io(self):
+        self._patch = None
         for key in ['V3IO_FRAMESD', 'V3IO_USERNAME',
                     'V3IO_ACCESS_KEY', 'V3IO_API']:
             if key in environ:
@@ -14,23 +14,26 @@
 """Deploy notebook to nuclio"""
 import json
 import os
-import tempfile
 from operator import itemgetter
 from time import sleep, time
 from datetime import datetime
 
-import yaml
 import requests
+from .codec import LazyYaml, response_json
 from .utils import DeployError, list2dict, str2nametag, logger, normalize_name
 from .config import (update_in, meta_keys, ConfigSpec, extend_config, Volume,
                      set_handler, new_config)
-from .archive import get_archive_config, build_zip, upload_file, is_archive
+from .archive import get_archive_config, build_and_upload, is_archive
 from .build import code2config, build_file, archive_path
+from .schema import config_errors
 from .auth import AuthInfo
 
 # False by default for backwards compatibility
 VERIFY_CERT = os.getenv("NUCLIO_VERIFY_CERT", "false").lower() == "true"
 
+# validate function configs locally before submitting them to the dashboard
+VALIDATE_CONFIG = os.getenv("NUCLIO_VALIDATE_CONFIG", "true").lower() == "true"
+
 
 class ReturnAddressModes(object):
     external_first = 'external_first'
@@ -107,7 +110,8 @@ def deploy_from_args(args, name=''):
     addr = deploy_file(name or args.file, args.dashboard_url, name=args.name,
                        project=args.project, verbose=args.verbose,
                        create_project=args.create_project, spec=spec,
-                       archive=args.archive, tag=args.tag, kind=args.kind)
+                       archive=args.archive, tag=args.tag, kind=args.kind,
+                       validate=args.validate)
     with open('/tmp/output', 'w') as fp:
         fp.write(addr)
     return addr
@@ -155,13 +159,13 @@ def deploy_file(source='', dashboard_url='', name='', project='', handler='',
                 tag='', verbose=False, create_project=True, archive=False,
                 spec: ConfigSpec = None, files=[], output_dir='', kind=None,
                 return_address_mode=ReturnAddressModes.default,
-                auth_info: AuthInfo = None):
+                auth_info: AuthInfo = None, validate=None):
 
     if source.startswith('$') or is_archive(source):
         return deploy_zip(source, name, project, tag,
                           dashboard_url=dashboard_url,
                           verbose=verbose, spec=spec,
-                          create_project=create_project)
+                          create_project=create_project, validate=validate)
 
     if archive or files:
         _, url_target = archive_path(output_dir, project, name, tag)
@@ -176,13 +180,13 @@ def deploy_file(source='', dashboard_url='', name='', project='', handler='',
     return deploy_config(config, dashboard_url, name=name, project=project,
                          tag=tag, verbose=verbose, create_new=create_project,
                          return_address_mode=return_address_mode,
-                         auth_info=auth_info)
+                         auth_info=auth_info, validate=validate)
 
 
 def deploy_zip(source='', name='', project='', tag='', dashboard_url='',
                verbose=False, spec: ConfigSpec = None,
                create_project=True, return_address_mode=ReturnAddressModes.default,
-               auth_info: AuthInfo = None):
+               auth_info: AuthInfo = None, validate=None):
 
     if source.startswith('$'):
         oproject, oname, otag = str2nametag(source[1:])
@@ -196,20 +200,19 @@ def deploy_zip(source='', name='', project='', tag='', dashboard_url='',
     config = extend_config(config, spec, tag, 'archive ' + source)
 
     if verbose:
-        logger.info('Config:\n{}'.format(
-            yaml.safe_dump(config, default_flow_style=False)))
+        logger.info('Config:\n%s', LazyYaml(config))
 
     return deploy_config(config, dashboard_url, name=name, project=project,
                          tag=tag, verbose=verbose, create_new=create_project,
                          return_address_mode=return_address_mode,
-                         auth_info=auth_info)
+                         auth_info=auth_info, validate=validate)
 
 
 def deploy_code(code, dashboard_url='', name='', project='', handler='',
                 lang='.py', tag='', verbose=False, create_project=True,
                 archive='', spec: ConfigSpec = None, files=[], kind=None,
                 return_address_mode=ReturnAddressModes.default,
-                auth_info: AuthInfo = None):
+                auth_info: AuthInfo = None, validate=None):
 
     name = normalize_name(name)
     newconfig, code = code2config(code, lang, kind=kind)
@@ -217,9 +220,8 @@ def deploy_code(code, dashboard_url='', name='', project='', handler='',
     if spec:
         spec.merge(newconfig)
     if verbose:
-        logger.info('Code:\n{}'.format(code))
-        logger.info('Config:\n{}'.format(
-            yaml.safe_dump(newconfig, default_flow_style=False)))
+        logger.info('Code:\n%s', code)
+        logger.info('Config:\n%s', LazyYaml(newconfig))
 
     if archive:
         archive, url_target = archive_path(archive, name=name,
@@ -228,15 +230,11 @@ def deploy_code(code, dashboard_url='', name='', project='', handler='',
         raise DeployError('archive URL must be specified when packing files')
 
     if files:
-        zip_path = archive
-        if url_target:
-            zip_path = tempfile.NamedTemporaryFile(suffix='.zip', delete=False).name
-        build_zip(zip_path, newconfig, code, files, lang)
-        upload_file(zip_path, archive, True)
+        build_and_upload(archive, newconfig, code, files, lang,
+                         skip_unchanged=True)
         newconfig = get_archive_config(name, archive)
         if verbose:
-            logger.info('Archive Config:\n{}'.format(
-                yaml.safe_dump(newconfig, default_flow_style=False)))
+            logger.info('Archive Config:\n%s', LazyYaml(newconfig))
 
     newconfig = extend_config(newconfig, None, tag, 'code')
     update_in(newconfig, 'metadata.name', name)
@@ -244,13 +242,13 @@ def deploy_code(code, dashboard_url='', name='', project='', handler='',
     return deploy_config(newconfig, dashboard_url, name=name, project=project,
                          tag=tag, verbose=verbose, create_new=create_project,
                          return_address_mode=return_address_mode,
-                         auth_info=auth_info),
+                         auth_info=auth_info, validate=validate),
 
 
 def deploy_config(config, dashboard_url='', name='', project='', tag='',
                   verbose=False, create_new=False, watch=True,
                   return_address_mode=ReturnAddressModes.default,
-                  auth_info: AuthInfo = None):
+                  auth_info: AuthInfo = None, validate=None):
     # logger level is INFO, debug won't emit
     log = logger.info if verbose else logger.debug
 
@@ -260,6 +258,13 @@ def deploy_config(config, dashboard_url='', name='', project='', tag='',
     if not project:
         raise DeployError('project name must be specified (using -p option)')
 
+    if validate is None:
+        validate = VALIDATE_CONFIG
+    if validate:
+        errors = config_errors(config)
+        if errors:
+            raise DeployError('invalid function config:\n' + '\n'.join(errors))
+
     if auth_info is None:
         auth_info = AuthInfo.from_envvar()
 
@@ -275,7 +280,7 @@ def deploy_config(config, dashboard_url='', name='', project='', tag='',
     verb = 'creating' if is_new else 'updating'
     log('%s %s', verb, name)
     if resp.ok:
-        func_project = resp.json()['metadata']['labels'].get(
+        func_project = response_json(resp)['metadata']['labels'].get(
             meta_keys.project, '')
         if func_project != project:
             raise DeployError(f'error: function name already exists under a different project ({func_project})')
@@ -441,6 +446,10 @@ def populate_parser(parser):
     parser.add_argument('--mount', default='',
                         help='volume mount, [vol-type:]<vol-url>:<dst>')
     parser.add_argument('--kind', default=None)
+    parser.add_argument(
+        '--no-validate', dest='validate', action='store_false', default=None,
+        help="don't check the function config locally before submitting it",
+    )
 
 
 def deploy_progress(api_address, name, verbose=False, return_function_config=False, auth_info: AuthInfo = None):
@@ -455,7 +464,7 @@ def deploy_progress(api_address, name, verbose=False, return_function_config=Fal
         if not resp.ok:
             raise DeployError('error: cannot poll {} status'.format(name), response=resp)
 
-        resp_as_json = resp.json()
+        resp_as_json = response_json(resp)
         function_status = resp_as_json.get('status')
         http_port = function_status.get('httpPort', 0)
 
@@ -489,7 +498,7 @@ def get_deploy_status(api_address,
     if not resp.ok:
         raise DeployError('error: failed getting function {}'.format(name), response=resp)
 
-    function_config = resp.json()
+    function_config = response_json(resp)
     function_status = function_config.get('status', {})
     internal_invocation_urls, external_invocation_urls = _resolve_function_addresses(api_address,
                                                                                      name,
@@ -518,7 +527,7 @@ def get_function_status(api_address, name, auth_info: AuthInfo = None):
     if not resp.ok:
         raise DeployError('error: cannot poll {} status'.format(name), response=resp)
 
-    resp_as_json = resp.json()
+    resp_as_json = response_json(resp)
     return resp_as_json.get('status', {})
 
 
@@ -532,7 +541,7 @@ def get_address(api_url, auth_info: AuthInfo = None):
         logger.warning('failed to obtain external IP address, returned local')
         return "localhost"
 
-    addresses = resp.json()['externalIPAddresses']['addresses']
+    addresses = response_json(resp)['externalIPAddresses']['addresses']
     return addresses[0]
 
 
@@ -577,7 +586,7 @@ def find_or_create_project(api_url, project, create_new=False, auth_info: AuthIn
     project = project.strip()
     if not resp.ok:
         raise OSError(f'nuclio API call failed. status code: {resp.status_code}')
-    for k, v in resp.json().items():
+    for k, v in response_json(resp).items():
         if v['metadata'].get('name') == project:
             return k
 
@@ -613,7 +622,7 @@ def find_or_create_project(api_url, project, create_new=False, auth_info: AuthIn
         raise DeployError('failed to create project {}'.format(project), response=resp)
 
     logger.info('project name not found created new (%s)', project)
-    return resp.json()['metadata']['name']
+    return response_json(resp)['metadata']['name']
 
 
 def list_functions(dashboard_url='', namespace='', auth_info: AuthInfo = None):
@@ -639,7 +648,7 @@ def list_functions(dashboard_url='', namespace='', auth_info: AuthInfo = None):
     if not resp.ok:
         logger.warning(f'failed to list functions, {resp.text}')
         return None
-    return resp.json()
+    return response_json(resp)
 
 
 def delete_func(name, dashboard_url='', namespace='', auth_info: AuthInfo = None):
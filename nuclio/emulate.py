@@ -0,0 +1,1117 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Local trigger emulators, feed a handler the way the processor does
+
+HttpEmulator serves a handler over HTTP (asyncio), with the http trigger
+workers, port, paths and body size limit. Sync handlers run in a thread
+per worker, async handlers run on the event loop; in both cases a worker
+handles one request at a time, e.g.
+
+    with HttpEmulator('func.ipynb', trigger=HttpTrigger(workers=4)) as srv:
+        requests.post(srv.url, json={'x': 1})
+    print(srv.stats.summary())
+
+or from the command line: nuclio serve func.ipynb --port 8080
+
+StreamEmulator feeds a handler from a PartitionedLog (in memory or files)
+with the kafka/v3io stream trigger batching, worker allocation and
+ack/commit settings, and reports the per partition lag and throughput.
+
+CronEmulator fires a handler on a cron trigger interval or schedule (can
+be time compressed) and measures the invocation drift and overlaps.
+"""
+import asyncio
+import datetime
+import inspect
+import json
+import logging
+import os
+import queue
+import re
+import threading
+import time
+import uuid
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+from .codec import json_loads
+from .local import RunStats, Worker, as_event, load_function, percentile
+from .archive import parse_size
+from .replay import EventRecorder, LazyEvent, iter_records
+from .request import Event, Headers, TriggerInfo
+
+default_http_port = 8080
+# the processor (fasthttp) defaults
+default_max_body_size = 4 * 1024 * 1024
+default_worker_timeout = 10.0
+max_header_size = 64 * 1024
+
+
+def trigger_config(trigger, config=None, kinds=()):
+    """trigger dict from a trigger object/dict, or the first trigger of
+    one of the kinds in the function config"""
+    if trigger is not None:
+        return trigger.to_dict() if hasattr(trigger, 'to_dict') else trigger
+    if isinstance(kinds, str):
+        kinds = (kinds,)
+    triggers = (config or {}).get('spec', {}).get('triggers') or {}
+    for value in triggers.values():
+        if value.get('kind') in kinds:
+            return value
+    return {}
+
+
+_duration_units = {'ns': 1e-9, 'us': 1e-6, 'ms': 1e-3, 's': 1.0,
+                   'm': 60.0, 'h': 3600.0}
+
+
+def parse_duration(value):
+    """seconds from a number or a Go style duration (e.g. '1s', '1m30s')"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    parts = re.findall(r'(\d+(?:\.\d*)?)(ns|us|ms|s|m|h)', value.strip())
+    if not parts or ''.join(n + u for n, u in parts) != value.strip():
+        raise ValueError('illegal duration {!r}, use e.g. 1s'.format(value))
+    return sum(float(num) * _duration_units[unit] for num, unit in parts)
+
+
+def load_handler(source='', code='', handler=''):
+    """return (code, handler name, function config or None)"""
+    config = None
+    if not code:
+        code, handler, config = load_function(source, handler)
+    return code, handler or 'handler', config
+
+
+class HttpError(Exception):
+    def __init__(self, status, message=''):
+        super(HttpError, self).__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+
+def http_response(output):
+    """handler output to (status, content type, headers, body bytes)
+
+    same mapping as the processor python wrapper: str, bytes, dict/list
+    (as JSON), (status, body) tuples and Response like objects
+    """
+    status, headers, content_type = 200, {}, None
+    if isinstance(output, tuple) and len(output) == 2:
+        status, output = output
+    elif hasattr(output, 'status_code') and hasattr(output, 'body'):
+        status = output.status_code
+        headers = getattr(output, 'headers', None) or {}
+        content_type = getattr(output, 'content_type', None)
+        output = output.body
+
+    if output is None:
+        body = b''
+    elif isinstance(output, (bytes, bytearray)):
+        body = bytes(output)
+        content_type = content_type or 'application/octet-stream'
+    elif isinstance(output, str):
+        body = output.encode('utf-8')
+        content_type = content_type or 'text/plain'
+    else:
+        body = json.dumps(output, default=str).encode('utf-8')
+        content_type = content_type or 'application/json'
+    return int(status), content_type, headers, body
+
+
+def encode_response(status, content_type, headers, body, keep_alive=True):
+    try:
+        reason = HTTPStatus(status).phrase
+    except ValueError:
+        reason = ''
+    lines = ['HTTP/1.1 {} {}'.format(status, reason)]
+    if content_type:
+        lines.append('Content-Type: {}'.format(content_type))
+    for key, value in headers.items():
+        if key.lower() not in ('content-length', 'connection'):
+            lines.append('{}: {}'.format(key, value))
+    lines.append('Content-Length: {}'.format(len(body)))
+    if not keep_alive:
+        lines.append('Connection: close')
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + body
+
+
+async def read_request(reader, max_body_size=default_max_body_size):
+    """return (method, target, version, headers, body), None on EOF"""
+    try:
+        head = await reader.readuntil(b'\r\n\r\n')
+    except asyncio.IncompleteReadError as err:
+        if err.partial.strip():
+            raise HttpError(400)
+        return None
+    except asyncio.LimitOverrunError:
+        raise HttpError(431)
+
+    lines = head.decode('latin-1').split('\r\n')
+    try:
+        method, target, version = lines[0].split(' ')
+    except ValueError:
+        raise HttpError(400, 'bad request line')
+    headers = Headers()
+    for line in lines[1:]:
+        if not line:
+            continue
+        key, sep, value = line.partition(':')
+        if not sep:
+            raise HttpError(400, 'bad header line')
+        key, value = key.strip(), value.strip()
+        headers[key] = headers[key] + ', ' + value if key in headers else value
+
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        body = await _read_chunked(reader, max_body_size)
+    else:
+        try:
+            size = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HttpError(400, 'bad content length')
+        if size > max_body_size:
+            raise HttpError(413)
+        body = await reader.readexactly(size) if size else b''
+    return method, target, version, headers, body
+
+
+async def _read_chunked(reader, max_body_size):
+    chunks, total = [], 0
+    while True:
+        line = await reader.readline()
+        try:
+            size = int(line.split(b';')[0].strip(), 16)
+        except ValueError:
+            raise HttpError(400, 'bad chunk size')
+        if not size:
+            # trailers end with an empty line
+            while (await reader.readline()).strip():
+                pass
+            return b''.join(chunks)
+        total += size
+        if total > max_body_size:
+            raise HttpError(413)
+        chunks.append(await reader.readexactly(size))
+        await reader.readexactly(2)
+
+
+class HttpStats(RunStats):
+    """handler latencies, and the requests rejected (503) because no worker
+    was available in time (not counted as handler errors or latencies)
+    """
+
+    def __init__(self):
+        super(HttpStats, self).__init__()
+        self.rejected = 0
+
+    def to_dict(self):
+        stats = super(HttpStats, self).to_dict()
+        stats['rejected'] = self.rejected
+        return stats
+
+    def summary(self, histogram=False):
+        return '{}\n{} requests rejected (no available worker)'.format(
+            super(HttpStats, self).summary(histogram), self.rejected)
+
+
+class HttpEmulator:
+    """serve a handler over HTTP like the nuclio http trigger
+
+    :param source:    notebook/code/yaml file or url (see build_file)
+    :param trigger:   HttpTrigger (or dict), default is the http trigger
+                      in the source config
+    :param code:      handler code (instead of source)
+    :param handler:   handler function name
+    :param workers:   override the trigger maxWorkers
+    :param port:      override the trigger port (0 for any free port)
+    :param host:      address to listen on
+    :param log_level: context.logger level
+    :param log_buffered:  write the logs from a background thread
+    """
+
+    def __init__(self, source='', trigger=None, code='', handler='',
+                 workers=None, port=None, host='127.0.0.1',
+                 log_level=logging.WARNING, log_buffered=False):
+        self.code, self.handler, config = load_handler(source, code, handler)
+        config = trigger_config(trigger, config, 'http')
+        attributes = config.get('attributes') or {}
+        self.workers = int(workers or config.get('maxWorkers') or 1)
+        if port is None:
+            port = attributes.get('port') or default_http_port
+        self.port = port
+        self.host = host
+        self.paths = [path for ingress in
+                      (attributes.get('ingresses') or {}).values()
+                      for path in ingress.get('paths') or []]
+        self.max_body_size = int(attributes.get('maxRequestBodySize') or
+                                 default_max_body_size)
+        self.worker_timeout = (config.get('workerAvailabilityTimeoutMilliseconds')
+                               or default_worker_timeout * 1000) / 1000.0
+        self.log_level = log_level
+        self.log_buffered = log_buffered
+        self.stats = HttpStats()
+        self._server = None
+        self._writers = set()
+        self._start_time = 0.0
+        self._loop = None
+        self._thread = None
+        self._started = None
+        self._error = None
+
+    @property
+    def url(self):
+        return 'http://{}:{}/'.format(self.host, self.port)
+
+    async def start(self):
+        """create the workers (init_context) and start listening"""
+        self._pool = [Worker(self.code, self.handler, i, self.log_level,
+                             'http', log_buffered=self.log_buffered)
+                      for i in range(self.workers)]
+        self._is_async = inspect.iscoroutinefunction(self._pool[0].handler)
+        self._free = asyncio.Queue()
+        for worker in self._pool:
+            self._free.put_nowait(worker)
+        self._executor = ThreadPoolExecutor(
+            self.workers, thread_name_prefix='nuclio-worker')
+        self._server = await asyncio.start_server(
+            self._handle_connection, self.host, self.port,
+            limit=max_header_size)
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._start_time = time.perf_counter()
+
+    async def close(self):
+        if self._server is None:
+            return
+        self._server.close()
+        # idle keep-alive connections would block wait_closed()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+        self._executor.shutdown(wait=True)
+        for worker in self._pool:
+            worker.close_logs()
+        self.stats.elapsed = time.perf_counter() - self._start_time
+        self._server = None
+
+    async def serve(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.close()
+
+    def run(self):
+        """serve until interrupted (Ctrl-C), return the RunStats"""
+        try:
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            pass
+        return self.stats
+
+    def start_background(self):
+        """serve from a background thread (e.g. in a notebook)"""
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run_thread, daemon=True)
+        self._thread.start()
+        self._started.wait()
+        if self._server is None:
+            raise self._error
+        return self
+
+    def _run_thread(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self.start())
+        except Exception as exc:
+            self._error = exc
+            self._started.set()
+            return
+        self._started.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self.close())
+        self._loop.close()
+
+    def stop(self):
+        if self._thread is not None:
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start_background()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    async def _handle_connection(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await read_request(reader, self.max_body_size)
+                except HttpError as err:
+                    writer.write(encode_response(
+                        err.status, 'text/plain', {},
+                        str(err).encode('utf-8'), keep_alive=False))
+                    break
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+                keep_alive = _keep_alive(version, headers)
+                response = await self._dispatch(method, target, headers, body)
+                writer.write(encode_response(*response, keep_alive=keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        path = url.path or '/'
+        if self.paths and not any(path.startswith(prefix)
+                                  for prefix in self.paths):
+            return 404, 'text/plain', {}, b'Not Found'
+
+        try:
+            worker = await asyncio.wait_for(self._free.get(),
+                                            self.worker_timeout)
+        except asyncio.TimeoutError:
+            self.stats.rejected += 1
+            return 503, 'text/plain', {}, b'no available worker'
+
+        event = http_event(method, target, path, url.query, headers, body)
+        try:
+            if self._is_async:
+                output, latency, error = await _call_async(worker, event)
+            else:
+                output, latency, error = await asyncio.get_running_loop(
+                ).run_in_executor(self._executor, _call, worker, event)
+        finally:
+            self._free.put_nowait(worker)
+        self.stats.add(latency, error)
+        if error:
+            return 500, 'text/plain', {}, error.encode('utf-8')
+        try:
+            return http_response(output)
+        except Exception as exc:
+            return 500, 'text/plain', {}, str(exc).encode('utf-8')
+
+
+def _keep_alive(version, headers):
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+def http_event(method, target, path, query, headers, body):
+    """Event as the processor creates it for an http request"""
+    size = len(body)
+    content_type = headers.get('content-type', '')
+    if content_type.split(';')[0].strip() == 'application/json':
+        try:
+            body = json_loads(body)
+        except ValueError:
+            pass
+    return Event(body=body, content_type=content_type,
+                 trigger=TriggerInfo('sync', 'http'),
+                 fields=dict(parse_qsl(query)), headers=headers,
+                 _id=str(uuid.uuid4()), method=method, path=path,
+                 size=size,
+                 timestamp=datetime.datetime.now(datetime.timezone.utc),
+                 url=target)
+
+
+def _error(exc):
+    return '{}: {}'.format(type(exc).__name__, exc)
+
+
+def _call(worker, event):
+    start = time.perf_counter()
+    try:
+        output, error = worker.handler(worker.context, event), None
+    except Exception as exc:
+        output, error = None, _error(exc)
+    return output, time.perf_counter() - start, error
+
+
+async def _call_async(worker, event):
+    start = time.perf_counter()
+    try:
+        output, error = await worker.handler(worker.context, event), None
+    except Exception as exc:
+        output, error = None, _error(exc)
+    return output, time.perf_counter() - start, error
+
+
+stream_kinds = ('kafka-cluster', 'v3ioStream')
+ack_modes = ('disable', 'enable', 'explicitOnly')
+allocation_modes = ('pool', 'static')
+# with explicitAckMode=enable, a response with this header is not acked
+no_ack_header = 'x-nuclio-stream-no-ack'
+
+
+def _record_size(record):
+    if isinstance(record, LazyEvent):
+        return len(record.data) + len(record.body or b'')
+    body = getattr(record, 'body', record)
+    return len(body) if isinstance(body, (bytes, str)) else 0
+
+
+class PartitionedLog:
+    """in memory partitioned event log (a local stand-in for a stream)
+
+    records are Event objects, bodies or (undecoded) replay records, the
+    offset of a record is its index in the partition
+    """
+
+    def __init__(self, partitions=1):
+        if isinstance(partitions, int):
+            partitions = range(partitions)
+        self._records = {partition: [] for partition in partitions}
+        self._cond = threading.Condition()
+        self._next = 0
+        self.closed = False
+
+    @property
+    def partitions(self):
+        return list(self._records)
+
+    def append(self, record, partition=None, key=None):
+        """add a record, to a partition by key hash or round robin,
+        return (partition, offset)"""
+        with self._cond:
+            if self.closed:
+                raise ValueError('log is closed')
+            if partition is None:
+                partitions = self.partitions
+                if key is not None:
+                    index = zlib.crc32(str(key).encode('utf-8'))
+                else:
+                    index, self._next = self._next, self._next + 1
+                partition = partitions[index % len(partitions)]
+            records = self._records[partition]
+            records.append(record)
+            self._cond.notify_all()
+            return partition, len(records) - 1
+
+    def close(self):
+        """no more records, consumers stop at the end of the log"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def end_offset(self, partition):
+        return len(self._records[partition])
+
+    def read(self, partition, offset, max_records=0, max_bytes=0):
+        """records from offset, up to max_records/max_bytes (at least one)"""
+        records = self._records[partition]
+        end = len(records)
+        if max_records:
+            end = min(end, offset + max_records)
+        if max_bytes:
+            total = 0
+            for index in range(offset, end):
+                total += _record_size(records[index])
+                if total > max_bytes and index > offset:
+                    end = index
+                    break
+        return records[offset:end]
+
+    def wait(self, partition, offset, timeout):
+        """wait up to timeout for records after offset (or close)"""
+        with self._cond:
+            return self._cond.wait_for(
+                lambda: self.closed or
+                len(self._records[partition]) > offset, timeout)
+
+    @classmethod
+    def from_dir(cls, dir_path):
+        """load a partition per events file (see replay.EventRecorder),
+        files are named <partition>.jsonl or <partition>.bin"""
+        names = sorted(name for name in os.listdir(dir_path)
+                       if name.endswith(('.jsonl', '.bin')))
+        partitions = [name.rsplit('.', 1)[0] for name in names]
+        partitions = [int(name) if name.isdigit() else name
+                      for name in partitions]
+        log = cls(partitions)
+        for partition, name in zip(partitions, names):
+            log._records[partition].extend(
+                iter_records(os.path.join(dir_path, name)))
+        log.closed = True
+        return log
+
+    def save(self, dir_path, binary=True):
+        """write a file per partition (can be loaded with from_dir)"""
+        os.makedirs(dir_path, exist_ok=True)
+        for partition, records in self._records.items():
+            name = '{}.{}'.format(partition, 'bin' if binary else 'jsonl')
+            with EventRecorder(os.path.join(dir_path, name), binary) as rec:
+                for record in records:
+                    rec.write(_decode(record))
+
+
+def _decode(record):
+    if isinstance(record, LazyEvent):
+        return record.decode()
+    return as_event(record)
+
+
+class PartitionStats:
+    """consumer position, commits and lag of a partition"""
+
+    def __init__(self, partition):
+        self.partition = partition
+        self.count = 0
+        self.batches = 0
+        self.errors = 0
+        self.position = 0
+        self.marked = 0
+        self.committed = 0
+        self.commits = 0
+        self.end_offset = 0
+        self.max_lag = 0
+        self.elapsed = 0.0
+
+    @property
+    def lag(self):
+        """records not committed yet"""
+        return self.end_offset - self.committed
+
+    @property
+    def throughput(self):
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def to_dict(self):
+        return {
+            'partition': self.partition,
+            'count': self.count,
+            'batches': self.batches,
+            'avg_batch': self.count / self.batches if self.batches else 0.0,
+            'errors': self.errors,
+            'committed': self.committed,
+            'commits': self.commits,
+            'lag': self.lag,
+            'max_lag': self.max_lag,
+            'throughput': self.throughput,
+        }
+
+
+class StreamStats(RunStats):
+    """handler latencies with per partition stats"""
+
+    def __init__(self):
+        super(StreamStats, self).__init__()
+        self.partitions = {}
+
+    def summary(self, histogram=False):
+        lines = [super(StreamStats, self).summary(histogram)]
+        for stats in self.partitions.values():
+            lines.append(
+                'partition {partition}: {count} events in {batches} batches '
+                '(avg {avg_batch:.1f}), {throughput:.1f} events/sec, '
+                'lag {lag} (max {max_lag}), {commits} commits'
+                .format(**stats.to_dict()))
+        return '\n'.join(lines)
+
+
+class StreamPlatform:
+    """context.platform of stream workers, for explicit acks"""
+
+    def __init__(self, emulator):
+        self._emulator = emulator
+
+    async def explicit_ack(self, event):
+        """mark the event offset (and the ones before it) as processed"""
+        self._emulator.ack(event)
+
+
+class StreamEmulator:
+    """feed a handler from a PartitionedLog like a kafka/v3io stream trigger
+
+    from the trigger: maxWorkers, workerAllocationMode (pool - any free
+    worker per event, static - partition N on worker N % workers),
+    partitions, readBatchSize (v3io) or fetchDefault bytes (kafka),
+    pollingIntervalMs/maxWaitTime, sequenceNumberCommitInterval and
+    explicitAckMode (with ack, async handlers call
+    await context.platform.explicit_ack(event)).
+
+    events of a partition are handled in order, one at a time, offsets
+    are committed every commit interval and at the end of the run
+
+    :param source:    notebook/code/yaml file or url (see build_file)
+    :param trigger:   KafkaTrigger/V3IOStreamTrigger (or dict), default is
+                      the stream trigger in the source config
+    :param log:       PartitionedLog (default is an empty log with the
+                      trigger partitions)
+    :param code:      handler code (instead of source)
+    :param handler:   handler function name
+    :param workers:   override the trigger maxWorkers
+    """
+
+    def __init__(self, source='', trigger=None, log=None, code='',
+                 handler='', workers=None, log_level=logging.WARNING,
+                 log_buffered=False):
+        self.code, self.handler, config = load_handler(source, code, handler)
+        config = trigger_config(trigger, config, stream_kinds)
+        attributes = config.get('attributes') or {}
+        self.kind = config.get('kind') or 'v3ioStream'
+        self.workers = int(workers or config.get('maxWorkers') or 1)
+        self.allocation = attributes.get('workerAllocationMode') or 'pool'
+        if self.allocation not in allocation_modes:
+            raise ValueError('worker allocation mode must be one of {}'
+                             .format(allocation_modes))
+        self.ack_mode = config.get('explicitAckMode') or 'disable'
+        if self.ack_mode not in ack_modes:
+            raise ValueError('explicit ack mode must be one of {}'
+                             .format(ack_modes))
+        if self.kind == 'kafka-cluster':
+            self.batch_size = 0
+            self.max_bytes = parse_size(attributes.get('fetchDefault') or
+                                        1024 * 1024)
+            self.poll_interval = parse_duration(
+                attributes.get('maxWaitTime') or '250ms')
+            self.commit_interval = parse_duration(
+                attributes.get('commitInterval') or '1s')
+        else:
+            self.batch_size = int(attributes.get('readBatchSize') or 64)
+            self.max_bytes = 0
+            self.poll_interval = int(
+                attributes.get('pollingIntervalMs') or 500) / 1000.0
+            self.commit_interval = parse_duration(
+                attributes.get('sequenceNumberCommitInterval') or '1s')
+        self.log = log or PartitionedLog(attributes.get('partitions') or 1)
+        self.partitions = attributes.get('partitions') or self.log.partitions
+        missing = set(self.partitions) - set(self.log.partitions)
+        if missing:
+            raise ValueError('partitions {} are not in the log'.format(
+                sorted(missing, key=str)))
+        self.log_level = log_level
+        self.log_buffered = log_buffered
+        self.stats = StreamStats()
+        self.pool = []
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        """stop consuming (from another thread)"""
+        self._stop.set()
+
+    def run(self, duration=None):
+        """consume until the (closed) log is drained, duration seconds
+        passed or stop() is called, return StreamStats"""
+        pool = self.pool = [Worker(self.code, self.handler, i, self.log_level,
+                                   self.kind, log_buffered=self.log_buffered)
+                            for i in range(self.workers)]
+        for worker in pool:
+            worker.context.platform = StreamPlatform(self)
+        free = queue.Queue()
+        for worker in pool:
+            free.put(worker)
+        worker_locks = [threading.Lock() for _ in pool]
+        self.stats = StreamStats()
+        for partition in self.partitions:
+            self.stats.partitions[partition] = PartitionStats(partition)
+        self._stop.clear()
+        deadline = time.monotonic() + duration if duration else None
+
+        threads = [threading.Thread(
+            target=self._consume, daemon=True,
+            args=(index, partition, pool, free, worker_locks, deadline))
+            for index, partition in enumerate(self.partitions)]
+        committer = threading.Thread(target=self._commit_loop, daemon=True)
+        start = time.perf_counter()
+        for thread in threads + [committer]:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.stats.elapsed = time.perf_counter() - start
+        self._stop.set()
+        committer.join()
+        self._commit()
+        for worker in pool:
+            worker.close_logs()
+        self._in_flight.clear()
+        return self.stats
+
+    def ack(self, event):
+        """mark an (in flight) event offset as processed"""
+        with self._lock:
+            partition, offset = self._in_flight.pop(id(event), (None, 0))
+            if partition is not None:
+                stats = self.stats.partitions[partition]
+                stats.marked = max(stats.marked, offset + 1)
+
+    def _commit(self):
+        with self._lock:
+            for partition, stats in self.stats.partitions.items():
+                if stats.committed != stats.marked:
+                    stats.committed = stats.marked
+                    stats.commits += 1
+                stats.end_offset = self.log.end_offset(partition)
+                stats.max_lag = max(stats.max_lag, stats.lag)
+
+    def _commit_loop(self):
+        while not self._stop.wait(self.commit_interval):
+            self._commit()
+
+    def _consume(self, index, partition, pool, free, worker_locks, deadline):
+        stats = self.stats.partitions[partition]
+        trigger = TriggerInfo('async', self.kind)
+        loop = None
+        if inspect.iscoroutinefunction(pool[0].handler):
+            loop = asyncio.new_event_loop()
+        track = self.ack_mode != 'disable'
+        start = time.perf_counter()
+        while not self._stop.is_set():
+            if deadline and time.monotonic() >= deadline:
+                break
+            batch = self.log.read(partition, stats.position,
+                                  self.batch_size, self.max_bytes)
+            if not batch:
+                if self.log.closed:
+                    break
+                self.log.wait(partition, stats.position, self.poll_interval)
+                continue
+            stats.batches += 1
+            for offset, record in enumerate(batch, stats.position):
+                event = _decode(record)
+                event.trigger = trigger
+                if track:
+                    with self._lock:
+                        self._in_flight[id(event)] = (partition, offset)
+                if self.allocation == 'static':
+                    worker_index = index % len(pool)
+                    with worker_locks[worker_index]:
+                        output, latency, error = _invoke(
+                            pool[worker_index], event, loop)
+                else:
+                    worker = free.get()
+                    try:
+                        output, latency, error = _invoke(worker, event, loop)
+                    finally:
+                        free.put(worker)
+                with self._lock:
+                    self.stats.add(latency, error)
+                    stats.count += 1
+                    stats.errors += 1 if error else 0
+                    if self.ack_mode == 'explicitOnly' or (
+                            self.ack_mode == 'enable' and _no_ack(output)):
+                        continue
+                    self._in_flight.pop(id(event), None)
+                    stats.marked = offset + 1
+            stats.position += len(batch)
+            stats.elapsed = time.perf_counter() - start
+        if loop is not None:
+            loop.close()
+
+
+def _invoke(worker, event, loop=None):
+    if loop is None:
+        return _call(worker, event)
+    return loop.run_until_complete(_call_async(worker, event))
+
+
+def _no_ack(output):
+    headers = getattr(output, 'headers', None) or {}
+    return any(key.lower() == no_ack_header for key in headers)
+
+
+_cron_descriptors = {
+    '@yearly': '0 0 1 1 *', '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *', '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *', '@midnight': '0 0 * * *', '@hourly': '0 * * * *',
+}
+_cron_names = {
+    'month': ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep',
+              'oct', 'nov', 'dec'],
+    'dow': ['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'],
+}
+
+
+def _cron_field(text, low, high, names=None):
+    """set of values of a cron field (*, a-b, */n, a-b/n, lists, names)"""
+    values = set()
+    for part in text.lower().split(','):
+        expr, _, step = part.partition('/')
+        if expr in ('*', '?'):
+            start, end = low, high
+        else:
+            start, _, end = expr.partition('-')
+            start, end = _cron_value(start, names), _cron_value(end, names)
+            if end is None:
+                end = high if step else start
+        step = int(step) if step else 1
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError('illegal cron field {!r}'.format(text))
+        values.update(range(start, end + 1, step))
+    return values
+
+
+def _cron_value(text, names):
+    if not text:
+        return None
+    if names and text in names:
+        return names.index(text) + (1 if len(names) == 12 else 0)
+    return int(text)
+
+
+class CronSchedule:
+    """fire times of a cron trigger interval or schedule
+
+    schedule is a cron string with 5 fields (minute hour day month weekday)
+    or 6 (with leading seconds), or a descriptor (@hourly, @every 10s, ..)
+    """
+
+    def __init__(self, interval='', schedule=''):
+        schedule = schedule.strip()
+        if schedule.startswith('@every '):
+            interval, schedule = schedule[len('@every '):], ''
+        schedule = _cron_descriptors.get(schedule, schedule)
+        self.interval = parse_duration(interval) if interval else 0.0
+        if interval and self.interval <= 0:
+            raise ValueError('cron interval must be positive')
+        if not interval:
+            fields = schedule.split()
+            if len(fields) == 5:
+                fields.insert(0, '0')
+            if len(fields) != 6:
+                raise ValueError(
+                    'illegal cron schedule {!r}, use e.g. */5 * * * *'
+                    .format(schedule))
+            self.seconds = _cron_field(fields[0], 0, 59)
+            self.minutes = _cron_field(fields[1], 0, 59)
+            self.hours = _cron_field(fields[2], 0, 23)
+            self.days = _cron_field(fields[3], 1, 31)
+            self.months = _cron_field(fields[4], 1, 12, _cron_names['month'])
+            self.weekdays = {day % 7 for day in _cron_field(
+                fields[5], 0, 7, _cron_names['dow'])}
+            self._any_day = fields[3] in ('*', '?')
+            self._any_weekday = fields[5] in ('*', '?')
+
+    @classmethod
+    def from_trigger(cls, trigger):
+        attributes = trigger_config(trigger).get('attributes') or {}
+        return cls(attributes.get('interval', ''),
+                   attributes.get('schedule', ''))
+
+    def next_after(self, when):
+        """first fire time (datetime) after when"""
+        if self.interval:
+            return when + datetime.timedelta(seconds=self.interval)
+        step = datetime.timedelta
+        when = when.replace(microsecond=0) + step(seconds=1)
+        limit = when.year + 5
+        while when.year <= limit:
+            if when.month not in self.months:
+                year, month = divmod(when.month, 12)
+                when = when.replace(year=when.year + year, month=month + 1,
+                                    day=1, hour=0, minute=0, second=0)
+            elif not self._day_matches(when):
+                when = when.replace(hour=0, minute=0, second=0) + step(days=1)
+            elif when.hour not in self.hours:
+                when = when.replace(minute=0, second=0) + step(hours=1)
+            elif when.minute not in self.minutes:
+                when = when.replace(second=0) + step(minutes=1)
+            elif when.second not in self.seconds:
+                when += step(seconds=1)
+            else:
+                return when
+        raise ValueError('cron schedule does not fire in 5 years')
+
+    def _day_matches(self, when):
+        day = when.day in self.days
+        weekday = (when.weekday() + 1) % 7 in self.weekdays
+        # like cron, when both are set either one matches
+        if self._any_day or self._any_weekday:
+            return day and weekday
+        return day or weekday
+
+
+class CronStats(RunStats):
+    """handler latencies with the schedule drift, overlaps and backlog
+
+    drift is how late (real seconds) each invocation started, an overlap
+    is a fire time when all the workers were still busy and the backlog is
+    the number of fire times waiting for a worker
+    """
+
+    def __init__(self):
+        super(CronStats, self).__init__()
+        self.scheduled = []
+        self.drifts = []
+        self.overlaps = 0
+        self.max_backlog = 0
+
+    def drift(self, pct):
+        return percentile(self.drifts, pct)
+
+    @property
+    def keeps_up(self):
+        return not self.overlaps
+
+    def to_dict(self):
+        stats = super(CronStats, self).to_dict()
+        stats.update({
+            'drift_p50': self.drift(50),
+            'drift_p99': self.drift(99),
+            'drift_max': max(self.drifts) if self.drifts else 0.0,
+            'overlaps': self.overlaps,
+            'max_backlog': self.max_backlog,
+        })
+        return stats
+
+    def summary(self, histogram=False):
+        stats = self.to_dict()
+        lines = [
+            super(CronStats, self).summary(histogram),
+            'drift p50={:.3f}ms p99={:.3f}ms max={:.3f}ms'.format(
+                *(stats[key] * 1000 for key in
+                  ('drift_p50', 'drift_p99', 'drift_max'))),
+            '{overlaps} overlaps, max backlog {max_backlog}'.format(**stats),
+        ]
+        if not self.keeps_up:
+            lines.append('the handler does not keep up with the schedule')
+        return '\n'.join(lines)
+
+
+class CronEmulator:
+    """fire a handler on a cron trigger interval/schedule
+
+    with speed > 1 the schedule is compressed (e.g. speed=60 runs an hour
+    of a '1m' interval in a minute), the handlers run at normal speed.
+    fire times are queued to the workers (maxWorkers, default 1) like the
+    processor does, so a slow handler piles up as drift and backlog
+
+    :param source:    notebook/code/yaml file or url (see build_file)
+    :param trigger:   CronTrigger (or dict), default is the cron trigger in
+                      the source config
+    :param code:      handler code (instead of source)
+    :param handler:   handler function name
+    :param workers:   override the trigger maxWorkers
+    :param speed:     schedule time / real time
+    """
+
+    def __init__(self, source='', trigger=None, code='', handler='',
+                 workers=None, speed=1.0, log_level=logging.WARNING,
+                 log_buffered=False):
+        self.code, self.handler, config = load_handler(source, code, handler)
+        config = trigger_config(trigger, config, 'cron')
+        if not config:
+            raise ValueError('cron trigger not found')
+        self.schedule = CronSchedule.from_trigger(config)
+        event = (config.get('attributes') or {}).get('event') or {}
+        self.body = event.get('body', '')
+        self.headers = event.get('headers') or {}
+        self.workers = int(workers or config.get('maxWorkers') or 1)
+        if speed <= 0:
+            raise ValueError('speed must be positive')
+        self.speed = float(speed)
+        self.log_level = log_level
+        self.log_buffered = log_buffered
+        self.stats = CronStats()
+        self.pool = []
+
+    def fire_times(self, start, count=0, duration=None):
+        """schedule times after start, up to count or duration seconds"""
+        end = None
+        if duration:
+            end = start + datetime.timedelta(seconds=duration)
+        when, fired = start, 0
+        while not count or fired < count:
+            when = self.schedule.next_after(when)
+            if end and when > end:
+                return
+            yield when
+            fired += 1
+
+    def run(self, count=0, duration=None, start=None):
+        """fire count times or for duration schedule seconds from start
+        (datetime, default now), return CronStats"""
+        if not count and not duration:
+            raise ValueError('count or duration must be specified')
+        start = start or datetime.datetime.now(datetime.timezone.utc)
+        pool = self.pool = [
+            Worker(self.code, self.handler, i, self.log_level, 'cron',
+                   log_buffered=self.log_buffered)
+            for i in range(self.workers)]
+        self.stats = stats = CronStats()
+        tasks = queue.Queue()
+        lock = threading.Lock()
+        # busy counts the running and the queued fire times
+        state = {'busy': 0}
+
+        def work(worker):
+            loop = None
+            if inspect.iscoroutinefunction(worker.handler):
+                loop = asyncio.new_event_loop()
+            for when, due in iter(tasks.get, None):
+                started = time.perf_counter()
+                event = Event(body=self.body, headers=self.headers,
+                              trigger=TriggerInfo('async', 'cron'),
+                              _id=str(uuid.uuid4()), timestamp=when)
+                _, latency, error = _invoke(worker, event, loop)
+                with lock:
+                    state['busy'] -= 1
+                    stats.add(latency, error)
+                    stats.drifts.append(max(started - due, 0.0))
+            if loop is not None:
+                loop.close()
+
+        threads = [threading.Thread(target=work, args=(worker,), daemon=True)
+                   for worker in pool]
+        for thread in threads:
+            thread.start()
+        real_start = time.perf_counter()
+        for when in self.fire_times(start, count, duration):
+            due = real_start + (when - start).total_seconds() / self.speed
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            with lock:
+                if state['busy'] >= len(pool):
+                    stats.overlaps += 1
+                state['busy'] += 1
+                stats.max_backlog = max(stats.max_backlog,
+                                        state['busy'] - len(pool))
+            stats.scheduled.append(when)
+            tasks.put((when, due))
+        for _ in threads:
+            tasks.put(None)
+        for thread in threads:
+            thread.join()
+        stats.elapsed = time.perf_counter() - real_start
+        for worker in pool:
+            worker.close_logs()
+        return stats
+
+
+def serve_parser(parser):
+    parser.add_argument('file', help='notebook/code file')
+    parser.add_argument('--handler', default='', help='handler name')
+    parser.add_argument('--port', '-p', type=int, default=None,
+                        help='port (default from the http trigger or 8080)')
+    parser.add_argument('--host', default='127.0.0.1',
+                        help='address to listen on')
+    parser.add_argument('--workers', '-w', type=int, default=None,
+                        help='number of workers (default trigger maxWorkers)')
+    parser.add_argument('--verbose', '-v', action='store_true',
+                        default=False, help='handler debug logs')
@@ -22,15 +22,16 @@ from os import environ, path
 from textwrap import indent
 from sys import stdout
 
-import yaml
 from nbconvert.exporters import Exporter
 from nbconvert.filters import ipython2python
 
+from .codec import yaml_dump
 from .utils import (env_keys, iter_env_lines, parse_config_line,
                     parse_mount_line, normalize_name)
 from .archive import parse_archive_line
+from .manifest import expand_files
 from .config import (new_config, update_in, get_in, set_env, set_commands,
-                     Volume, meta_keys)
+                     Volume, meta_keys, EnvIndex)
 from . import magic as magic_module
 
 here = path.dirname(path.abspath(__file__))
@@ -135,8 +136,8 @@ class NuclioExporter(Exporter):
         elif efiles and env_keys.drop_nb_outputs not in environ:
             outputs = {'handler.py': py_code,
                        'function.yaml': gen_config(config)}
-            for filename in efiles:
-                with open(filename) as fp:
+            for filename in expand_files(archive_settings['files']):
+                with open(filename, 'rb') as fp:
                     data = fp.read()
                     outputs[filename] = data
             resources['outputs'] = outputs
@@ -328,7 +329,7 @@ def exporter_name():
 
 
 def gen_config(config):
-    return header() + yaml.safe_dump(config, default_flow_style=False)
+    return header() + yaml_dump(config)
 
 
 def parse_magic_line(line):
@@ -398,9 +399,10 @@ def env_file(magic, config):
 def process_env_files(env_files, config):
     # %nuclio env_file magic will populate this
     from_env = json.loads(environ.get(env_keys.env_files, '[]'))
+    index = EnvIndex(config)
     for fname in (env_files | set(from_env)):
         with open(fname) as fp:
-            set_env(config, iter_env_lines(fp))
+            set_env(config, iter_env_lines(fp), index)
 
 
 def is_code_cell(cell):
@@ -493,9 +495,10 @@ def add(magic, config):
 
     files = args.file + magic.lines
     for filename in files:
-        filename = filename.strip()
-        if not path.isfile(filename):
-            raise MagicError('file {} doesnt exist'.format(filename))
+        try:
+            expand_files([filename])
+        except ValueError:
+            raise MagicError('file {} doesnt exist'.format(filename.strip()))
 
     archive_settings = {'files': files, 'notebook': args.add_notebook}
     return ''
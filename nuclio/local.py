@@ -0,0 +1,305 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Run function handlers locally, the way the nuclio processor does
+
+The handler code (as generated by build_file) runs in N workers (threads
+or processes), each with its own Context on which init_context() is called
+once. Events are dispatched to the free workers and the handler latency
+is measured, e.g.
+
+    stats = run_local('func.ipynb', [Event(body='x')] * 1000, workers=4)
+    print(stats.summary())
+"""
+import bisect
+import itertools
+import logging
+import math
+import multiprocessing
+import multiprocessing.util
+import queue
+import threading
+import time
+import traceback
+import types
+from sys import stderr
+
+from .request import Context, Event, HumanReadableFormatter, Logger
+
+worker_kinds = ('thread', 'process')
+
+
+def load_function(source, handler=''):
+    """return (code, handler name, config) from a file/url build_file accepts"""
+    from .build import build_file
+
+    _, config, code = build_file(source, handler=handler)
+    return code, config['spec']['handler'].split(':')[-1], config
+
+
+def load_source(source, handler=''):
+    """return (code, handler name) from a file/url build_file accepts"""
+    code, handler, _ = load_function(source, handler)
+    return code, handler
+
+
+def load_module(code, name='handler'):
+    """execute handler code as a new (not imported) module"""
+    module = types.ModuleType(name)
+    module.__file__ = '<{}>'.format(name)
+    exec(compile(code, module.__file__, 'exec'), module.__dict__)
+    return module
+
+
+_run_ids = itertools.count()
+
+
+class Worker:
+    """handler with its own context, init_context() runs on creation"""
+
+    def __init__(self, code, handler='handler', worker_id=0,
+                 log_level=logging.WARNING, trigger_name='local',
+                 log_buffered=False, run_id=None):
+        module = load_module(code)
+        self.handler = getattr(module, handler)
+        # a logger per run and worker id (loggers are process global and
+        # concurrent runs have the same worker ids), the nuclio_jupyter
+        # (notebook) logger level and handlers are left as they are
+        if run_id is None:
+            run_id = next(_run_ids)
+        self._log_name = 'nuclio_local-{}-{}'.format(run_id, worker_id)
+        logger = Logger(level=log_level, name=self._log_name)
+        logger._logger.propagate = False
+        logger.set_handler('nuclio-local', stderr, HumanReadableFormatter(),
+                           buffered=log_buffered)
+        self.context = Context(logger, worker_id, trigger_name)
+        init_context = getattr(module, 'init_context', None)
+        if init_context is not None:
+            init_context(self.context)
+
+    def invoke(self, event):
+        """return (latency in seconds, error or None)"""
+        start = time.perf_counter()
+        try:
+            self.handler(self.context, event)
+            error = None
+        except Exception as exc:
+            error = '{}: {}'.format(type(exc).__name__, exc)
+        return time.perf_counter() - start, error
+
+    def flush_logs(self):
+        self.context.logger.flush()
+
+    def close_logs(self):
+        """flush and close the log handlers (and buffered writer threads)"""
+        self.context.logger.close()
+        # the name isn't used again, don't keep the logger around
+        logging.root.manager.loggerDict.pop(self._log_name, None)
+
+
+def as_event(event):
+    if isinstance(event, Event):
+        return event
+    return Event(body=event)
+
+
+def percentile(values, pct):
+    """value at pct (0-100) of values, nearest rank"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = math.ceil(pct / 100.0 * len(ordered)) - 1
+    return ordered[min(max(rank, 0), len(ordered) - 1)]
+
+
+class RunStats:
+    """handler latencies and errors of a run"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = {}
+        self.elapsed = 0.0
+
+    def add(self, latency, error=None):
+        self.latencies.append(latency)
+        if error:
+            self.errors[error] = self.errors.get(error, 0) + 1
+
+    @property
+    def count(self):
+        return len(self.latencies)
+
+    @property
+    def error_count(self):
+        return sum(self.errors.values())
+
+    @property
+    def throughput(self):
+        return self.count / self.elapsed if self.elapsed else 0.0
+
+    def percentile(self, pct):
+        """latency (seconds) at pct (0-100), nearest rank"""
+        return percentile(self.latencies, pct)
+
+    def histogram(self, bounds=None):
+        """[(upper bound seconds, count)], default bounds 10us * 2^n to ~10s
+
+        the last bucket (inf) counts the latencies above the bounds
+        """
+        bounds = list(bounds or [1e-5 * 2 ** i for i in range(21)])
+        counts = [0] * (len(bounds) + 1)
+        for latency in self.latencies:
+            counts[bisect.bisect_left(bounds, latency)] += 1
+        return list(zip(bounds + [float('inf')], counts))
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.error_count,
+            'elapsed': self.elapsed,
+            'throughput': self.throughput,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'max': max(self.latencies) if self.latencies else 0.0,
+        }
+
+    def summary(self, histogram=False):
+        stats = self.to_dict()
+        lines = [
+            '{count} events in {elapsed:.3f}s, {throughput:.1f} events/sec, '
+            '{errors} errors'.format(**stats),
+            'latency p50={:.3f}ms p95={:.3f}ms p99={:.3f}ms max={:.3f}ms'
+            .format(*(stats[key] * 1000 for key in ('p50', 'p95', 'p99', 'max'))),
+        ]
+        for error, count in sorted(self.errors.items(), key=lambda e: -e[1]):
+            lines.append('  {} x {}'.format(count, error))
+        if histogram and self.latencies:
+            buckets = self.histogram()
+            first = next(i for i, (_, count) in enumerate(buckets) if count)
+            last = max(i for i, (_, count) in enumerate(buckets) if count)
+            width = 40.0 / max(count for _, count in buckets)
+            for bound, count in buckets[first:last + 1]:
+                lines.append('  <= {:>10.3f}ms {:>8} {}'.format(
+                    bound * 1000, count, '#' * int(math.ceil(count * width))))
+        return '\n'.join(lines)
+
+    def __repr__(self):
+        return 'RunStats({})'.format(self.to_dict())
+
+
+def run_local(source='', events=None, workers=1, kind='thread', handler='',
+              code='', log_level=logging.WARNING, log_buffered=False):
+    """invoke the handler with events on N local workers, return RunStats
+
+    :param source:     notebook/code/yaml file or url (see build_file)
+    :param events:     iterable of Event objects (or bodies)
+    :param workers:    number of workers (like the trigger maxWorkers)
+    :param kind:       'thread' or 'process' workers
+    :param handler:    handler function name (default from the source)
+    :param code:       handler code (instead of source)
+    :param log_level:  context.logger level
+    :param log_buffered:  write the logs from a background thread (see
+                          request.BufferedHandler), not in the handler
+    """
+    if kind not in worker_kinds:
+        raise ValueError('worker kind must be one of {}'.format(worker_kinds))
+    if not code:
+        code, handler = load_source(source, handler)
+    handler = handler or 'handler'
+    events = (as_event(event) for event in events or [])
+
+    stats = RunStats()
+    worker_args = {'log_level': log_level, 'log_buffered': log_buffered,
+                   'run_id': next(_run_ids)}
+    if kind == 'process':
+        _run_processes(code, handler, events, workers, worker_args, stats)
+    else:
+        _run_threads(code, handler, events, workers, worker_args, stats)
+    return stats
+
+
+def _run_threads(code, handler, events, workers, worker_args, stats):
+    # init all the workers before the clock starts (as the processor does)
+    pool = [Worker(code, handler, i, **worker_args) for i in range(workers)]
+    tasks = queue.Queue(workers * 2)
+    lock = threading.Lock()
+
+    def work(worker):
+        for event in iter(tasks.get, None):
+            latency, error = worker.invoke(event)
+            with lock:
+                stats.add(latency, error)
+
+    threads = [threading.Thread(target=work, args=(worker,), daemon=True)
+               for worker in pool]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for event in events:
+        tasks.put(event)
+    for _ in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+    stats.elapsed = time.perf_counter() - start
+    for worker in pool:
+        worker.close_logs()
+
+
+_process_worker = None
+
+
+def _init_process(code, handler, worker_args, counter, started):
+    global _process_worker
+    with counter.get_lock():
+        worker_id = counter.value
+        counter.value += 1
+    try:
+        _process_worker = Worker(code, handler, worker_id, **worker_args)
+    except BaseException:
+        started.abort()
+        raise
+    # runs when the pool process exits (after pool.close() and join())
+    multiprocessing.util.Finalize(_process_worker, _process_worker.close_logs,
+                                  exitpriority=10)
+    started.wait()
+
+
+def _invoke_process(event):
+    try:
+        return _process_worker.invoke(event)
+    except BaseException:
+        return 0.0, traceback.format_exc(limit=1)
+
+
+def _run_processes(code, handler, events, workers, worker_args, stats):
+    counter = multiprocessing.Value('i', 0)
+    # all the workers are initialized (init_context) before the clock starts
+    started = multiprocessing.Barrier(workers + 1)
+    with multiprocessing.Pool(
+            workers, _init_process,
+            (code, handler, worker_args, counter, started)) as pool:
+        try:
+            started.wait()
+        except threading.BrokenBarrierError:
+            raise RuntimeError('process worker failed to start, see the '
+                               'init_context error above')
+        start = time.perf_counter()
+        for latency, error in pool.imap_unordered(_invoke_process, events,
+                                                  chunksize=16):
+            stats.add(latency, error)
+        stats.elapsed = time.perf_counter() - start
+        # let the workers exit (and close their logs) instead of terminating
+        pool.close()
+        pool.join()
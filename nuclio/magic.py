@@ -19,16 +19,17 @@ from base64 import b64decode
 from os import environ, path
 from sys import stderr
 
-import yaml
 from IPython import get_ipython
 from IPython.core.magic import register_line_cell_magic
 
+from .codec import yaml_dump, yaml_load
 from .config import ConfigSpec, v3ioenv_magic
 from .deploy import populate_parser as populate_deploy_parser, deploy_from_args
 from .utils import (env_keys, iter_env_lines, parse_config_line, DeployError,
                     parse_env, parse_export_line, parse_mount_line,
                     notebook_file_name, list2dict, BuildError)
 from .archive import parse_archive_line
+from .manifest import expand_files
 from .build import build_file
 
 log_prefix = '%nuclio: '
@@ -270,6 +271,8 @@ def deploy(line, cell):
         add/override environment variable, can be repeated
     -v, --verbose
         emit more logs
+    --no-validate
+        don't check the function config locally before submitting it
 
     when deploying a function which contains extra files or if we want to
     archive/version functions we specify output-dir with archiving option (-a)
@@ -337,7 +340,7 @@ def handler(line, cell):
 
 def save_handler(config_file, out_dir):
     with open(config_file) as fp:
-        config_ = yaml.safe_load(fp)
+        config_ = yaml_load(fp)
 
     py_code = b64decode(config_['spec']['build']['functionSourceCode'])
     py_module = config_['spec']['handler'].split(':')[0]
@@ -470,7 +473,7 @@ def print_handler_code(notebook_file=None):
 
     line = shlex.quote(notebook_file)
     config_, code = build(line, None, return_dir=True)
-    config_yaml = yaml.safe_dump(config_, default_flow_style=False)
+    config_yaml = yaml_dump(config_)
     print('Config:\n{}'.format(config_yaml))
     print('Code:\n{}'.format(code))
 
@@ -501,8 +504,12 @@ def mount(line, cell):
 def add(line, cell):
     """add files, will be stored in an archive (zip) or git
 
+    files can also be directories or glob patterns, files matching the
+    patterns in .nuclioignore are skipped
+
     Example:
     In [1]: %nuclio add -f model.json -f mylib.py
+    In [2]: %nuclio add -f models/ -f 'lib/**/*.py'
     """
     args, rest = parse_archive_line(line)
     file_list = args.file
@@ -510,7 +517,9 @@ def add(line, cell):
         file_list += cell.splitlines()
 
     for filename in file_list:
-        if not path.isfile(filename.strip()):
+        try:
+            expand_files([filename])
+        except ValueError:
             log_error('file {} doesnt exist'.format(filename))
             return
         else:
@@ -0,0 +1,212 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Archive input files: directory/glob expansion and content manifests
+
+A manifest describes the archive members:
+    {'version': 1,
+     'files': {arcname: {'sha256': .., 'size': .., 'mode': ..,
+                         'path': local path, 'mtime': st_mtime_ns}}}
+path/mtime are only set for members read from local files.
+"""
+import glob
+import hashlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from os import path
+
+ignore_file_name = '.nuclioignore'
+default_ignore = ['.git/', '__pycache__/', '*.pyc', '.ipynb_checkpoints/']
+manifest_version = 1
+
+
+def arcname(file_path):
+    # same entry name as zipfile.ZipFile.write(file_path)
+    name = path.normpath(path.splitdrive(file_path)[1])
+    name = name.lstrip(os.sep + (os.altsep or ''))
+    return name.replace(os.sep, '/')
+
+
+def file_digest(file_path):
+    sha = hashlib.sha256()
+    with open(file_path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1024 * 1024), b''):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def read_ignore_file(file_path=ignore_file_name):
+    """ignore patterns (gitignore like, one per line) or the defaults"""
+    if not path.isfile(file_path):
+        return list(default_ignore)
+    patterns = []
+    with open(file_path) as fp:
+        for line in fp:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                patterns.append(line)
+    return patterns
+
+
+def is_ignored(name, patterns, is_dir=False):
+    """match a '/' separated path against ignore patterns
+
+    patterns with a '/' match the whole path, others the base name,
+    patterns ending with '/' only match directories
+    """
+    base = name.rsplit('/', 1)[-1]
+    for pattern in patterns:
+        if pattern.endswith('/'):
+            if not is_dir:
+                continue
+            pattern = pattern[:-1]
+        if fnmatch(name if '/' in pattern else base, pattern.lstrip('/')):
+            return True
+    return False
+
+
+def expand_files(patterns, ignore=None):
+    """expand file paths, directories (recursive) and globs to a file list
+
+    ignore is a list of patterns (defaults to the .nuclioignore file),
+    raises ValueError for a path or pattern without matching files
+    """
+    if ignore is None:
+        ignore = read_ignore_file()
+    files = {}
+    for pattern in patterns:
+        pattern = pattern.strip()
+        if not pattern:
+            continue
+        if glob.has_magic(pattern):
+            matches = sorted(glob.glob(pattern, recursive=True))
+        elif path.isfile(pattern):
+            # explicitly listed files are never ignored
+            files.setdefault(arcname(pattern), pattern)
+            continue
+        else:
+            matches = [pattern]
+        found = False
+        for match in matches:
+            for file_path in _walk(match, ignore):
+                files.setdefault(arcname(file_path), file_path)
+                found = True
+        if not found:
+            raise ValueError('file name {} not found'.format(pattern))
+    return [files[name] for name in sorted(files)]
+
+
+def _walk(file_path, ignore):
+    if path.isfile(file_path):
+        if not is_ignored(arcname(file_path), ignore):
+            yield file_path
+        return
+    for root, dirs, files in os.walk(file_path):
+        dirs[:] = sorted(d for d in dirs if not is_ignored(
+            arcname(path.join(root, d)), ignore, is_dir=True))
+        for name in sorted(files):
+            file_path = path.join(root, name)
+            if not is_ignored(arcname(file_path), ignore):
+                yield file_path
+
+
+def build_manifest(files, contents=None, previous=None, workers=None,
+                   hash_files=True):
+    """manifest of local files (hashed in parallel) and in memory contents
+
+    files entries reuse the digest from the previous manifest when their
+    size and mtime did not change (no re-read). without hash_files the
+    other entries have no sha256 (e.g. hashed by the reader, see
+    archive.build_zip)
+    """
+    old_files = (previous or {}).get('files', {})
+    entries, to_hash = {}, []
+    for file_path in files:
+        stat = os.stat(file_path)
+        name = arcname(file_path)
+        entry = {
+            'path': file_path,
+            'size': stat.st_size,
+            'mode': 0o755 if stat.st_mode & 0o111 else 0o644,
+            'mtime': stat.st_mtime_ns,
+        }
+        old = old_files.get(name)
+        if old and all(old.get(key) == entry[key]
+                       for key in ('path', 'size', 'mtime')):
+            entry['sha256'] = old['sha256']
+        else:
+            to_hash.append(name)
+        entries[name] = entry
+
+    if to_hash and hash_files:
+        with ThreadPoolExecutor(workers) as pool:
+            digests = pool.map(file_digest,
+                               [entries[name]['path'] for name in to_hash])
+            for name, digest in zip(to_hash, digests):
+                entries[name]['sha256'] = digest
+
+    for name, data in (contents or {}).items():
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        entries[name] = {'sha256': hashlib.sha256(data).hexdigest(),
+                         'size': len(data), 'mode': 0o644}
+
+    return {'version': manifest_version,
+            'files': {name: entries[name] for name in sorted(entries)}}
+
+
+def delta_layout(manifest, previous=None, tail=()):
+    """member order for delta uploads (see archive.upload_delta)
+
+    members unchanged since the previous layout come first in the same
+    order, then new/changed members and last the tail (e.g. code) members
+    """
+    files = manifest['files']
+    old_files = (previous or {}).get('files', {})
+    keep = [name for name in (previous or {}).get('layout', [])
+            if name in files and name not in tail and name in old_files and
+            (old_files[name]['sha256'], old_files[name]['mode']) ==
+            (files[name]['sha256'], files[name]['mode'])]
+    kept = set(keep)
+    rest = [name for name in files if name not in kept and name not in tail]
+    return keep + rest + [name for name in files if name in tail]
+
+
+def diff_manifests(old, new):
+    """return (added, changed, removed) member names"""
+    old_files = (old or {}).get('files', {})
+    new_files = new.get('files', {})
+    added = [name for name in new_files if name not in old_files]
+    removed = [name for name in old_files if name not in new_files]
+    changed = [name for name, entry in new_files.items()
+               if name in old_files and
+               (old_files[name]['sha256'], old_files[name]['mode']) !=
+               (entry['sha256'], entry['mode'])]
+    return added, changed, removed
+
+
+def changed_files(manifest):
+    """names of local members which differ on disk (by size/mtime)"""
+    changed = []
+    for name, entry in manifest.get('files', {}).items():
+        if 'path' not in entry:
+            continue
+        try:
+            stat = os.stat(entry['path'])
+        except FileNotFoundError:
+            changed.append(name)
+            continue
+        if (stat.st_size, stat.st_mtime_ns) != (entry['size'], entry['mtime']):
+            changed.append(name)
+    return changed
@@ -0,0 +1,242 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Record events to a file and replay them against a handler
+
+Two file formats are supported:
+    .jsonl  - one event per line, in the processor JSON encoding
+              (see Event.from_json), body is base64 encoded
+    other   - binary, a header and length prefixed records:
+              >II (meta length, body length), meta JSON, raw body bytes
+
+Files are read one record at a time and every record is decoded only when
+it is dispatched, so files of any size can be replayed, e.g.
+
+    with EventRecorder('traffic.bin') as rec:
+        rec.write(event)
+    stats = replay('traffic.bin', 'func.ipynb', workers=4, rate=500)
+    print(stats.summary())
+"""
+import base64
+import datetime
+import json
+import queue
+import struct
+import threading
+import time
+
+from .codec import json_loads
+from .local import RunStats, Worker, load_source
+from .request import Event
+
+binary_magic = b'NUCLIO-EVENTS-1\n'
+replay_modes = ('closed', 'open')
+_record_header = struct.Struct('>II')
+_meta_keys = ('content_type', 'fields', 'headers', 'id', 'method', 'path',
+              'size', 'url', 'type', 'type_version', 'version')
+
+
+def _timestamp(value):
+    if isinstance(value, datetime.datetime):
+        if value.tzinfo is None:
+            value = value.replace(tzinfo=datetime.timezone.utc)
+        return value.timestamp()
+    return value or 0
+
+
+def event_meta(event):
+    """event fields (without the body) as a JSON serializable dict"""
+    meta = {key: getattr(event, key) for key in _meta_keys}
+    meta['trigger'] = {'class': event.trigger.klass, 'kind': event.trigger.kind}
+    meta['timestamp'] = _timestamp(event.timestamp)
+    return meta
+
+
+def _body_bytes(body):
+    if isinstance(body, (bytes, bytearray)):
+        return bytes(body), 'bytes'
+    if isinstance(body, str):
+        return body.encode('utf-8'), 'str'
+    return json.dumps(body).encode('utf-8'), 'json'
+
+
+class EventRecorder:
+    """write events to a JSONL (.jsonl) or binary file"""
+
+    def __init__(self, path, binary=None):
+        if binary is None:
+            binary = not path.endswith('.jsonl')
+        self.binary = binary
+        self.count = 0
+        self._fp = open(path, 'wb')
+        if binary:
+            self._fp.write(binary_magic)
+
+    def write(self, event):
+        meta = event_meta(event)
+        body, kind = _body_bytes(event.body)
+        if self.binary:
+            meta['body_kind'] = kind
+            data = json.dumps(meta, separators=(',', ':')).encode('utf-8')
+            self._fp.write(_record_header.pack(len(data), len(body)))
+            self._fp.write(data)
+            self._fp.write(body)
+        else:
+            if kind == 'json':
+                meta['body'] = event.body
+            else:
+                meta['body'] = base64.b64encode(body).decode('ascii')
+            self._fp.write(json.dumps(meta).encode('utf-8') + b'\n')
+        self.count += 1
+
+    def close(self):
+        self._fp.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def record_events(path, events, binary=None):
+    """write events to path, return the number of events written"""
+    with EventRecorder(path, binary) as recorder:
+        for event in events:
+            recorder.write(event)
+    return recorder.count
+
+
+class LazyEvent:
+    """undecoded event record, decode() returns the Event"""
+
+    __slots__ = ('data', 'body')
+
+    def __init__(self, data, body=None):
+        self.data = data
+        self.body = body
+
+    def decode(self):
+        if self.body is None:
+            return Event.from_json(self.data)
+        meta = json_loads(self.data)
+        body, kind = self.body, meta.pop('body_kind', 'bytes')
+        if kind == 'str':
+            body = body.decode('utf-8')
+        elif kind == 'json':
+            body = json_loads(body)
+        meta['body'] = body
+        return Event.from_dict(meta, decode_body=False)
+
+
+def iter_records(path):
+    """yield the (undecoded) LazyEvent records of an events file"""
+    with open(path, 'rb') as fp:
+        if fp.read(len(binary_magic)) != binary_magic:
+            fp.seek(0)
+            for line in fp:
+                if line.strip():
+                    yield LazyEvent(line)
+            return
+
+        while True:
+            header = fp.read(_record_header.size)
+            if not header:
+                return
+            if len(header) < _record_header.size:
+                raise ValueError('truncated record in {}'.format(path))
+            meta_size, body_size = _record_header.unpack(header)
+            meta, body = fp.read(meta_size), fp.read(body_size)
+            if len(body) < body_size:
+                raise ValueError('truncated record in {}'.format(path))
+            yield LazyEvent(meta, body)
+
+
+def iter_events(path):
+    """yield the events of an events file (decoded one at a time)"""
+    for record in iter_records(path):
+        yield record.decode()
+
+
+def replay(path, source='', code='', handler='', workers=1, rate=0,
+           mode='closed', limit=0, log_level=None, log_buffered=False):
+    """replay recorded events against a handler, return local.RunStats
+
+    :param path:     events file (see EventRecorder)
+    :param source:   notebook/code/yaml file or url (see build_file)
+    :param code:     handler code (instead of source)
+    :param handler:  handler function name
+    :param workers:  number of (thread) workers
+    :param rate:     target events/sec, 0 for as fast as possible
+    :param mode:     'closed' - a worker takes the next event when done
+                     (throttled to rate), latency is the handler time
+                     'open' - events are sent on schedule (requires rate)
+                     even if workers are busy, latency includes queueing
+    :param limit:    max events to replay (0 for all)
+    :param log_buffered:  write the logs from a background thread
+    """
+    if mode not in replay_modes:
+        raise ValueError('mode must be one of {}'.format(replay_modes))
+    if mode == 'open' and not rate:
+        raise ValueError('open loop replay requires a rate')
+    if not code:
+        code, handler = load_source(source, handler)
+    kw = {'log_buffered': log_buffered}
+    if log_level is not None:
+        kw['log_level'] = log_level
+    pool = [Worker(code, handler or 'handler', i, **kw)
+            for i in range(workers)]
+
+    stats = RunStats()
+    # open loop: unbounded queue, the schedule doesnt wait for workers
+    tasks = queue.Queue(0 if mode == 'open' else workers)
+    lock = threading.Lock()
+
+    def work(worker):
+        for record, scheduled in iter(tasks.get, None):
+            try:
+                event = record.decode()
+            except Exception as exc:
+                with lock:
+                    stats.add(0.0, 'decode error: {}'.format(exc))
+                continue
+            start = time.perf_counter()
+            latency, error = worker.invoke(event)
+            if mode == 'open':
+                latency += start - scheduled
+            with lock:
+                stats.add(latency, error)
+
+    threads = [threading.Thread(target=work, args=(worker,), daemon=True)
+               for worker in pool]
+    for thread in threads:
+        thread.start()
+
+    start = time.perf_counter()
+    interval = 1.0 / rate if rate else 0.0
+    for i, record in enumerate(iter_records(path)):
+        if limit and i >= limit:
+            break
+        scheduled = start + i * interval
+        delay = scheduled - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        tasks.put((record, scheduled))
+    for _ in threads:
+        tasks.put(None)
+    for thread in threads:
+        thread.join()
+    stats.elapsed = time.perf_counter() - start
+    for worker in pool:
+        worker.close_logs()
+    return stats
@@ -14,11 +14,15 @@
 
 import logging
 import os
+import queue
+import threading
 from sys import stdout
 import base64
 import json
 import datetime
 
+from .codec import json_loads
+
 
 class HumanReadableFormatter(logging.Formatter):
 
@@ -39,22 +43,143 @@ class HumanReadableFormatter(logging.Formatter):
             more)
 
 
+class JSONFormatter(logging.Formatter):
+    """structured log lines, same fields as the processor (python wrapper)"""
+
+    def format(self, record):
+        return json.dumps({
+            'datetime': self.formatTime(record, self.datefmt),
+            'level': record.levelname.lower(),
+            'name': record.name,
+            'message': record.getMessage(),
+            'with': getattr(record, 'with', {}),
+        }, default=str)
+
+
+overflow_policies = ('drop', 'block')
+
+
+class BufferedHandler(logging.Handler):
+    """non blocking handler, a background thread writes records in batches
+
+    emit() only queues the record, formatting (including message % args)
+    and writing happen in the flush thread, so log arguments should not be
+    mutated after the call. when the queue is full the record is dropped
+    (overflow='drop', the count is reported in the log) or emit() waits
+    (overflow='block') while the flush thread runs. records emitted after
+    close() are dropped.
+    """
+
+    def __init__(self, stream=None, queue_size=10000, batch_size=512,
+                 overflow='drop', flush_interval=0.5):
+        if overflow not in overflow_policies:
+            raise ValueError(
+                'overflow must be one of {}'.format(overflow_policies))
+        super(BufferedHandler, self).__init__()
+        self.stream = stream or stdout
+        self.batch_size = batch_size
+        self.overflow = overflow
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self._reported = 0
+        self._closed = False
+        self._queue = queue.Queue(queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True,
+                                        name='nuclio-log-writer')
+        self._thread.start()
+
+    def emit(self, record):
+        if self._closed:
+            self.dropped += 1
+            return
+        if self.overflow == 'block':
+            # the flush thread may exit (close) while we wait
+            while self._thread.is_alive():
+                try:
+                    self._queue.put(record, timeout=self.flush_interval)
+                    return
+                except queue.Full:
+                    pass
+            self.dropped += 1
+            return
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self):
+        while True:
+            try:
+                batch = [self._queue.get(timeout=self.flush_interval)]
+            except queue.Empty:
+                self._write([])
+                continue
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            done = None in batch
+            self._write([record for record in batch if record is not None])
+            for _ in batch:
+                self._queue.task_done()
+            if done:
+                return
+
+    def _write(self, records):
+        dropped = self.dropped
+        if dropped > self._reported:
+            records.insert(0, logging.makeLogRecord({
+                'msg': 'log queue full, dropped %d records',
+                'args': (dropped - self._reported,),
+                'levelname': 'WARNING', 'levelno': logging.WARNING,
+                'name': records[0].name if records else 'nuclio',
+            }))
+            self._reported = dropped
+        lines = []
+        for record in records:
+            try:
+                lines.append(self.format(record))
+            except Exception:
+                self.handleError(record)
+        if lines:
+            try:
+                self.stream.write('\n'.join(lines) + '\n')
+                self.stream.flush()
+            except Exception:
+                self.handleError(records[-1])
+
+    def flush(self):
+        """wait until the queued records are written"""
+        if self._thread.is_alive():
+            self._queue.join()
+
+    def close(self):
+        self._closed = True
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join()
+        super(BufferedHandler, self).close()
+
+
 class Context(object):
     """Wrapper around nuclio_sdk.Context to make automatically create
     logger"""
     def __init__(self, logger=None, worker_id=None, trigger_name=None):
-        self.logger = logger
+        if logger is not None:
+            self.logger = logger
         self.user_data = lambda: None
         self.worker_id = worker_id
         self.trigger_name = trigger_name
 
-    def __getattribute__(self, attr):
-        value = object.__getattribute__(self, attr)
-        if value is None and attr == 'logger':
-            value = self.logger = Logger(level=logging.INFO)
-            value.set_handler(
-                'nuclio-jupyter', stdout, HumanReadableFormatter())
-        return value
+    def __getattr__(self, attr):
+        # only called for missing attributes, once the logger is created
+        # it is a plain instance attribute (no per access overhead)
+        if attr == 'logger':
+            self.set_logger_level()
+            return self.logger
+        raise AttributeError('{!r} object has no attribute {!r}'.format(
+            type(self).__name__, attr))
 
     def set_logger_level(self, verbose=False):
         if verbose:
@@ -71,16 +196,26 @@ class Logger(object):
         self._logger = logging.getLogger(name)
         self._logger.setLevel(level)
 
-    def set_handler(self, handler_name, file, formatter):
+    def set_handler(self, handler_name, file, formatter, buffered=False,
+                    **buffer_args):
+        """write to file with formatter, replacing a handler of that name
+
+        buffered=True writes from a background thread (see BufferedHandler,
+        which accepts buffer_args)
+        """
 
         # check if there's a handler by this name
         for handler in self._logger.handlers:
             if handler.name == handler_name:
                 self._logger.removeHandler(handler)
+                handler.close()
                 break
 
         # create a stream handler from the file
-        stream_handler = logging.StreamHandler(file)
+        if buffered:
+            stream_handler = BufferedHandler(file, **buffer_args)
+        else:
+            stream_handler = logging.StreamHandler(file)
         stream_handler.name = handler_name
 
         # set the formatter
@@ -89,6 +224,17 @@ class Logger(object):
         # add the handler to the logger
         self._logger.addHandler(stream_handler)
 
+    def flush(self):
+        """write pending (buffered) records"""
+        for handler in self._logger.handlers:
+            handler.flush()
+
+    def close(self):
+        """write pending records, remove and close the handlers"""
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+            handler.close()
+
     def debug(self, message, *args):
         self._logger.debug(message, *args)
 
@@ -101,28 +247,119 @@ class Logger(object):
     def error(self, message, *args):
         self._logger.error(message, *args)
 
+    def _log_with(self, level, message, args, kw_args):
+        # nothing is built when the level is disabled, the caller lookup
+        # of Logger.log() is skipped (it would always find this module)
+        logger = self._logger
+        if logger.isEnabledFor(level):
+            logger.handle(logger.makeRecord(
+                logger.name, level, '(unknown file)', 0, message, args, None,
+                extra={'with': kw_args}))
+
     def debug_with(self, message, *args, **kw_args):
-        self._logger.debug(message, *args, extra={'with': kw_args})
+        self._log_with(logging.DEBUG, message, args, kw_args)
 
     def info_with(self, message, *args, **kw_args):
-        self._logger.info(message, *args, extra={'with': kw_args})
+        self._log_with(logging.INFO, message, args, kw_args)
 
     def warn_with(self, message, *args, **kw_args):
-        self._logger.warning(message, *args, extra={'with': kw_args})
+        self._log_with(logging.WARNING, message, args, kw_args)
 
     def error_with(self, message, *args, **kw_args):
-        self._logger.error(message, *args, extra={'with': kw_args})
+        self._log_with(logging.ERROR, message, args, kw_args)
 
 
 class TriggerInfo(object):
 
+    __slots__ = ('klass', 'kind')
+
     def __init__(self, klass='', kind=''):
         self.klass = klass
         self.kind = kind
 
 
+class Headers(dict):
+    """header dict with case insensitive lookups, original keys are kept
+
+    the lower case key index is built on the first lookup which misses
+    the exact key and kept up to date on writes
+    """
+
+    # no __init__, construction costs the same as a plain dict copy
+    _index = None
+
+    def _lower_index(self):
+        if self._index is None:
+            self._index = {str(name).lower(): name for name in self}
+        return self._index
+
+    def _key(self, key):
+        if dict.__contains__(self, key):
+            return key
+        return self._lower_index().get(str(key).lower(), key)
+
+    def _reset(self):
+        self._index = None
+
+    def __getitem__(self, key):
+        return dict.__getitem__(self, self._key(key))
+
+    def __contains__(self, key):
+        return dict.__contains__(self, self._key(key))
+
+    def get(self, key, default=None):
+        return dict.get(self, self._key(key), default)
+
+    def __setitem__(self, key, value):
+        key = self._key(key)
+        dict.__setitem__(self, key, value)
+        self._lower_index()[str(key).lower()] = key
+
+    def __delitem__(self, key):
+        dict.__delitem__(self, self._key(key))
+        self._reset()
+
+    def pop(self, key, *default):
+        value = dict.pop(self, self._key(key), *default)
+        self._reset()
+        return value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kw):
+        for key, value in dict(*args, **kw).items():
+            self[key] = value
+
+    def popitem(self):
+        item = dict.popitem(self)
+        self._reset()
+        return item
+
+    def clear(self):
+        self._reset()
+        dict.clear(self)
+
+    def copy(self):
+        return Headers(self)
+
+    def __reduce__(self):
+        return Headers, (dict(self),)
+
+
+# Event attributes in to_json order
+_event_fields = ('body', 'content_type', 'trigger', 'fields', 'headers', 'id',
+                 'method', 'path', 'size', 'timestamp', 'url', 'type',
+                 'type_version', 'version')
+
+
 class Event(object):
 
+    __slots__ = tuple('_headers' if key == 'headers' else key
+                      for key in _event_fields)
+
     def __init__(self,
                  body=None,
                  content_type=None,
@@ -142,7 +379,7 @@ class Event(object):
         self.content_type = content_type
         self.trigger = trigger or TriggerInfo(klass='', kind='')
         self.fields = fields or {}
-        self.headers = headers or {}
+        self.headers = headers
         self.id = _id
         self.method = method
         self.path = path or '/'
@@ -154,46 +391,74 @@ class Event(object):
         self.version = version
 
     def to_json(self):
-        obj = vars(self).copy()
+        obj = {key: getattr(self, key) for key in _event_fields}
         obj['trigger'] = {
             'class': self.trigger.klass,
             'kind': self.trigger.kind,
         }
         return json.dumps(obj)
 
+    @property
+    def headers(self):
+        return self._headers
+
+    @headers.setter
+    def headers(self, headers):
+        if type(headers) is not Headers:
+            headers = Headers(headers or {})
+        self._headers = headers
+
     def get_header(self, header_key):
-        for key, value in self.headers.items():
-            if key.lower() == header_key.lower():
-                return value
+        return self._headers.get(header_key)
 
     @staticmethod
     def from_json(data):
         """Decode event encoded as JSON by processor"""
+        return Event.from_dict(json_loads(data))
+
+    @staticmethod
+    def from_json_batch(data):
+        """Decode newline delimited events (str/bytes) to a list of events"""
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        lines = [line for line in data.splitlines() if line.strip()]
+        # one parse of the whole buffer is faster than a parse per line
+        parsed = json_loads(b'[' + b','.join(lines) + b']')
+        return [Event.from_dict(item) for item in parsed]
 
-        parsed_data = json.loads(data)
-        trigger = TriggerInfo(
-            parsed_data['trigger']['class'],
-            parsed_data['trigger']['kind'],
-        )
+    @staticmethod
+    def from_dict(parsed_data, decode_body=True):
+        """Build event from a parsed processor JSON event"""
+
+        trigger = parsed_data['trigger']
+        new_trigger = TriggerInfo.__new__(TriggerInfo)
+        new_trigger.klass = trigger['class']
+        new_trigger.kind = trigger['kind']
 
         # extract content type, needed to decode body
         content_type = parsed_data['content_type']
-
-        return Event(body=Event.decode_body(parsed_data['body'], content_type),
-                     content_type=content_type,
-                     trigger=trigger,
-                     fields=parsed_data.get('fields'),
-                     headers=parsed_data.get('headers'),
-                     _id=parsed_data['id'],
-                     method=parsed_data['method'],
-                     path=parsed_data['path'],
-                     size=parsed_data['size'],
-                     timestamp=datetime.datetime.utcfromtimestamp(
-                         parsed_data['timestamp']),
-                     url=parsed_data['url'],
-                     _type=parsed_data['type'],
-                     type_version=parsed_data['type_version'],
-                     version=parsed_data['version'])
+        body = parsed_data['body']
+        if decode_body:
+            body = Event.decode_body(body, content_type)
+
+        # skip __init__, all the fields are set here
+        event = Event.__new__(Event)
+        event.body = body
+        event.content_type = content_type
+        event.trigger = new_trigger
+        event.fields = parsed_data.get('fields') or {}
+        event._headers = Headers(parsed_data.get('headers') or {})
+        event.id = parsed_data['id']
+        event.method = parsed_data['method']
+        event.path = parsed_data['path'] or '/'
+        event.size = parsed_data['size']
+        event.timestamp = datetime.datetime.utcfromtimestamp(
+            parsed_data['timestamp'])
+        event.url = parsed_data['url']
+        event.type = parsed_data['type']
+        event.type_version = parsed_data['type_version']
+        event.version = parsed_data['version']
+        return event
 
     @staticmethod
     def decode_body(body, content_type):
@@ -209,7 +474,7 @@ class Event(object):
 
             if content_type == 'application/json':
                 try:
-                    return json.loads(decoded_body)
+                    return json_loads(decoded_body)
                 except Exception:
                     pass
 
@@ -0,0 +1,247 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+"""Local validation of the function config fields generated by this package
+
+The schema is a nested structure of:
+    type            - leaf value type (e.g. str, int, bool, dict), object for
+                      fields the platform passes on as they are
+    {key: schema}   - object, unknown keys are allowed and fields which are
+                      not required may be None (same as a missing field)
+    [schema]        - list of items
+    required(s)     - object key which must exist (and not be None)
+    optional(s)     - value may also be None (e.g. in a list or a mapping)
+    mapping(s)      - dict of str -> s
+
+compile_schema() turns it once into a tree of closures.
+"""
+
+
+class required:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class optional:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+class mapping:
+    def __init__(self, schema):
+        self.schema = schema
+
+
+_type_names = {str: 'string', int: 'int', bool: 'bool', dict: 'dict',
+               list: 'list', float: 'float'}
+
+
+def _type_name(typ):
+    return _type_names.get(typ, typ.__name__)
+
+
+def compile_schema(schema):
+    """compile schema to a check(value, path, errors) function"""
+    if isinstance(schema, optional):
+        check = compile_schema(schema.schema)
+
+        def check_optional(value, path, errors):
+            if value is not None:
+                check(value, path, errors)
+        return check_optional
+
+    if isinstance(schema, mapping):
+        check_item = compile_schema(schema.schema)
+
+        def check_mapping(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(_type_error(path, dict, value))
+                return
+            for key, item in dict.items(value):
+                check_item(item, path + '.' + str(key), errors)
+        return check_mapping
+
+    if isinstance(schema, list):
+        check_item = compile_schema(schema[0])
+
+        def check_list(value, path, errors):
+            if not isinstance(value, list):
+                errors.append(_type_error(path, list, value))
+                return
+            for i, item in enumerate(value):
+                check_item(item, path + '[' + str(i) + ']', errors)
+        return check_list
+
+    if isinstance(schema, dict):
+        checks, required_keys = {}, []
+        for key, field in schema.items():
+            if isinstance(field, required):
+                required_keys.append(key)
+                field = field.schema
+            checks[key] = compile_schema(field)
+
+        def check_object(value, path, errors):
+            if not isinstance(value, dict):
+                errors.append(_type_error(path, dict, value))
+                return
+            prefix = path + '.' if path else ''
+            for key, item in dict.items(value):
+                check = checks.get(key)
+                if check is not None and (item is not None or
+                                          key in required_keys):
+                    check(item, prefix + key, errors)
+            for key in required_keys:
+                if key not in value:
+                    errors.append('{}{}: missing required field'.format(prefix, key))
+        return check_object
+
+    if isinstance(schema, type):
+        if schema is int:
+            def check_int(value, path, errors):
+                if not isinstance(value, int) or isinstance(value, bool):
+                    errors.append(_type_error(path, int, value))
+            return check_int
+
+        def check_type(value, path, errors):
+            if not isinstance(value, schema):
+                errors.append(_type_error(path, schema, value))
+        return check_type
+
+    raise ValueError('bad schema entry {!r}'.format(schema))
+
+
+def _type_error(path, typ, value):
+    return '{}: expected {}, got {}'.format(
+        path, _type_name(typ), _type_name(type(value)))
+
+
+env_schema = {
+    'name': required(str),
+    'value': str,
+    'valueFrom': dict,
+}
+
+volume_schema = {
+    'volume': required({
+        'name': required(str),
+        'flexVolume': {
+            'driver': str,
+            'options': mapping(str),
+        },
+        'persistentVolumeClaim': {'claimName': required(str)},
+        'secret': {'secretName': required(str)},
+        'configMap': {'name': required(str)},
+    }),
+    'volumeMount': required({
+        'name': required(str),
+        'mountPath': required(str),
+        'readOnly': bool,
+    }),
+}
+
+trigger_schema = {
+    'kind': required(str),
+    'name': str,
+    'url': str,
+    'password': str,
+    'disabled': bool,
+    'maxWorkers': int,
+    'workerTerminationTimeout': str,
+    'explicitAckMode': str,
+    'annotations': mapping(str),
+    'attributes': {
+        # http
+        'port': int,
+        'ingresses': mapping({
+            'host': str,
+            'paths': [str],
+            'secretName': str,
+        }),
+        # cron
+        'interval': str,
+        'schedule': str,
+        # the event body and header values may be any JSON value
+        'event': {
+            'body': object,
+            'headers': mapping(object),
+        },
+        # kafka
+        'topics': [str],
+        'brokers': [str],
+        'partitions': [int],
+        'consumerGroup': str,
+        'initialOffset': str,
+        'sessionTimeout': str,
+        'heartbeatInterval': str,
+        'workerAllocationMode': str,
+        'fetchDefault': int,
+        'sasl': {'enable': bool, 'user': str, 'password': str},
+        # v3io stream
+        'containerName': optional(str),
+        'streamPath': optional(str),
+        'seekTo': str,
+        'readBatchSize': int,
+        'pollingIntervalMs': int,
+        'sequenceNumberCommitInterval': str,
+    },
+}
+
+function_schema = {
+    'apiVersion': str,
+    'kind': str,
+    'metadata': required({
+        'name': str,
+        'namespace': str,
+        'labels': mapping(str),
+        'annotations': mapping(str),
+    }),
+    'spec': required({
+        'runtime': str,
+        'handler': optional(str),
+        'image': str,
+        'minReplicas': int,
+        'maxReplicas': int,
+        'env': [env_schema],
+        'volumes': [volume_schema],
+        'triggers': mapping(trigger_schema),
+        'build': {
+            'commands': [str],
+            'baseImage': str,
+            'noBaseImagesPull': bool,
+            'functionSourceCode': str,
+            'codeEntryType': str,
+            'path': str,
+            'codeEntryAttributes': {
+                'headers': optional(mapping(str)),
+                'workDir': optional(str),
+                'branch': str,
+            },
+        },
+    }),
+}
+
+_check_function = compile_schema(function_schema)
+
+
+def config_errors(config):
+    """list of schema errors in a function config (empty if valid)"""
+    errors = []
+    _check_function(config, '', errors)
+    # config (and its sub dicts) may be a ConfigDict, read it without copies
+    env = dict.get(config['spec'], 'env') if not errors else None
+    for i, item in enumerate(env or []):
+        if (dict.get(item, 'value') is None) == \
+                (dict.get(item, 'valueFrom') is None):
+            errors.append('spec.env[{}]: exactly one of value or valueFrom '
+                          'required'.format(i))
+    return errors
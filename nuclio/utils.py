@@ -67,6 +67,16 @@ class env_keys:
     default_archive = 'NUCLIO_ARCHIVE_PATH'
     function_name = 'NUCLIO_FUNCTION_NAME'
     ignored_tags = 'NUCLIO_IGNORED_TAGS'
+    archive_compression = 'NUCLIO_ARCHIVE_COMPRESSION'
+    archive_memory_limit = 'NUCLIO_ARCHIVE_MEMORY_LIMIT'
+    archive_delta = 'NUCLIO_ARCHIVE_DELTA'
+    upload_chunk_size = 'NUCLIO_UPLOAD_CHUNK_SIZE'
+    upload_resume = 'NUCLIO_UPLOAD_RESUME'
+    cache_dir = 'NUCLIO_CACHE_DIR'
+    cache_size = 'NUCLIO_CACHE_SIZE'
+    s3_part_size = 'NUCLIO_S3_PART_SIZE'
+    s3_concurrency = 'NUCLIO_S3_CONCURRENCY'
+    s3_max_bandwidth = 'NUCLIO_S3_MAX_BANDWIDTH'
 
 
 def list2dict(lines: list):
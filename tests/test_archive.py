@@ -0,0 +1,628 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import json
+import os
+import zipfile
+
+import pytest
+from os import path
+
+from nuclio import archive
+from nuclio.config import new_config
+
+code = 'def handler(context, event):\n    return "hello"\n' * 100
+
+
+@pytest.fixture
+def files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs('model')
+    with open('model/weights.txt', 'w') as fp:
+        fp.write('0.1 0.2 0.3\n' * 10000)
+    with open('a.py', 'w') as fp:
+        fp.write('x = 1\n')
+    return ['model/weights.txt', 'a.py']
+
+
+def build(zip_path, files, **kw):
+    archive.build_zip(str(zip_path), new_config(), code, files, **kw)
+    with open(zip_path, 'rb') as fp:
+        return fp.read()
+
+
+def test_build_zip_deterministic(tmp_path, files):
+    first = build(tmp_path / 'a.zip', files)
+    os.utime(files[0], (0, 0))
+    second = build(tmp_path / 'b.zip', list(reversed(files)))
+    assert first == second, 'same inputs produced different archives'
+
+    with zipfile.ZipFile(tmp_path / 'a.zip') as z:
+        names = z.namelist()
+        assert names == sorted(names)
+        assert set(names) == {'handler.py', 'function.yaml', 'a.py', 'model/weights.txt'}
+        assert z.read('handler.py').decode() == code
+        for info in z.infolist():
+            assert info.date_time == archive.zip_date_time
+            assert info.create_system == 3
+            assert info.external_attr >> 16 == 0o100644
+
+
+@pytest.mark.parametrize('compression', ['deflate', 'deflate:9', 'bzip2', 'lzma'])
+def test_build_zip_compression(tmp_path, files, compression):
+    stored = build(tmp_path / 'stored.zip', files, compression='stored')
+    compressed = build(tmp_path / 'c.zip', files, compression=compression)
+    assert len(compressed) < len(stored) / 10
+    with zipfile.ZipFile(tmp_path / 'c.zip') as z:
+        assert z.testzip() is None
+        assert z.read('model/weights.txt') == b'0.1 0.2 0.3\n' * 10000
+
+
+def test_build_zip_compresslevel(tmp_path, files):
+    build(tmp_path / 'fast.zip', files, compression='deflate:1')
+    build(tmp_path / 'best.zip', files, compression='deflate:9')
+    with zipfile.ZipFile(tmp_path / 'fast.zip') as fast, \
+            zipfile.ZipFile(tmp_path / 'best.zip') as best:
+        fast_size = fast.getinfo('model/weights.txt').compress_size
+        best_size = best.getinfo('model/weights.txt').compress_size
+    assert best_size < fast_size, 'compression level not applied'
+
+
+def test_bad_compression():
+    with pytest.raises(ValueError):
+        archive.parse_compression('zstd')
+    assert archive.parse_compression('deflate:3') == (zipfile.ZIP_DEFLATED, 3)
+
+
+def test_upload_skip_unchanged(tmp_path, files, monkeypatch):
+    zip_path = tmp_path / 'f.zip'
+    target = tmp_path / 'store' / 'f.zip'
+    target.parent.mkdir()
+    url = str(target)
+    build(zip_path, files)
+
+    uploads = []
+    upload = archive.FileRepo.upload
+    monkeypatch.setattr(archive.FileRepo, 'upload', lambda self, src: (
+        uploads.append(src), upload(self, src)))
+
+    archive.upload_file(str(zip_path), url, skip_unchanged=True)
+    assert len(uploads) == 1
+    digest = (tmp_path / 'store' / 'f.zip.sha256').read_text()
+    assert digest == archive.file_digest(str(zip_path))
+
+    archive.upload_file(str(zip_path), url, skip_unchanged=True)
+    assert len(uploads) == 1, 'unchanged archive uploaded again'
+
+    target.write_bytes(b'corrupt')
+    archive.upload_file(str(zip_path), url, skip_unchanged=True)
+    assert len(uploads) == 2, 'size mismatch not detected'
+
+    build(zip_path, files, compression='stored')
+    archive.upload_file(str(zip_path), url, skip_unchanged=True)
+    assert len(uploads) == 3, 'changed archive not uploaded'
+    assert target.read_bytes() == zip_path.read_bytes()
+
+
+def test_digest_url():
+    assert archive.digest_url('v3io://h/a/f.zip#dir') == 'v3io://h/a/f.zip.sha256'
+    assert archive.digest_url('/tmp/f.zip') == '/tmp/f.zip.sha256'
+
+
+@pytest.mark.parametrize('memory_limit', [None, 1024])
+def test_build_and_upload(tmp_path, files, monkeypatch, memory_limit):
+    monkeypatch.setattr(archive.UploadSink, 'chunk_size', 4096)
+    target = tmp_path / 'f.zip'
+    with archive.UploadSink(str(target), memory_limit=memory_limit) as sink:
+        archive.build_zip(sink, new_config(), code, files)
+    assert sink.uploaded
+    data = target.read_bytes()
+    assert sink.digest == archive.file_digest(str(target))
+
+    with zipfile.ZipFile(str(target)) as z:
+        assert z.read('model/weights.txt') == b'0.1 0.2 0.3\n' * 10000
+        assert z.read('handler.py').decode() == code
+
+    # same bytes when streamed or buffered in memory
+    archive.build_and_upload(str(target), new_config(), code, files)
+    assert target.read_bytes() == data
+
+
+@pytest.mark.parametrize('memory_limit', ['64MB', '100'])
+def test_build_and_upload_skip_unchanged(tmp_path, files, monkeypatch,
+                                         memory_limit):
+    monkeypatch.setenv('NUCLIO_ARCHIVE_MEMORY_LIMIT', memory_limit)
+    uploads = []
+    upload, upload_stream = archive.FileRepo.upload, archive.FileRepo.upload_stream
+    monkeypatch.setattr(archive.FileRepo, 'upload', lambda self, src: (
+        uploads.append(src), upload(self, src)))
+    monkeypatch.setattr(archive.FileRepo, 'upload_stream', lambda self, it: (
+        uploads.append('stream'), upload_stream(self, it)))
+
+    target = str(tmp_path / 'f.zip')
+    sink = archive.build_and_upload(target, new_config(), code, files,
+                                    skip_unchanged=True)
+    # streamed above the memory limit as well, no temp file
+    assert sink.uploaded and uploads == ['stream']
+    assert sink.digest == archive.file_digest(target)
+    assert archive.get_manifest(target)['size'] == path.getsize(target)
+
+    sink = archive.build_and_upload(target, new_config(), code, files,
+                                    skip_unchanged=True)
+    assert not sink.uploaded and len(uploads) == 1
+    assert sink.digest == archive.file_digest(target)
+
+    with open('a.py', 'w') as fp:
+        fp.write('x = 2\n')
+    sink = archive.build_and_upload(target, new_config(), code, files,
+                                    skip_unchanged=True)
+    assert sink.uploaded and len(uploads) == 2
+    sink = archive.build_and_upload(target, new_config(), code, files,
+                                    skip_unchanged=True, compression='stored')
+    assert sink.uploaded and len(uploads) == 3
+
+    with open(target, 'ab') as fp:
+        fp.write(b'corrupt')
+    sink = archive.build_and_upload(target, new_config(), code, files,
+                                    skip_unchanged=True, compression='stored')
+    assert sink.uploaded and len(uploads) == 4
+
+
+def test_upload_sink_abort(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive.UploadSink, 'chunk_size', 10)
+    target = tmp_path / 'f.zip'
+    with pytest.raises(ValueError):
+        with archive.UploadSink(str(target), memory_limit=10) as sink:
+            sink.write(b'x' * 100)
+            raise ValueError('build failed')
+    assert not target.exists(), 'partial upload not removed'
+
+
+class Response:
+    def __init__(self, status_code=200, content=b'', headers=None):
+        self.status_code = status_code
+        self.ok = status_code < 400
+        self.content = content
+        self.text = content.decode('latin1')
+        self.headers = headers or {}
+
+    def close(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for i in range(0, len(self.content), chunk_size):
+            yield self.content[i:i + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+class Session:
+    """in memory http object store, PUT supports Range writes"""
+
+    def __init__(self, fail_puts=0):
+        self.objects = {}
+        self.puts = []
+        self.gets = []
+        self.bytes_sent = 0
+        self.fail_puts = fail_puts
+
+    def put(self, url, data=None, headers=None, auth=None):
+        if isinstance(data, str):
+            data = data.encode()
+        elif not isinstance(data, (bytes, bytearray)):
+            data = b''.join(data)
+        data = bytes(data)
+        self.puts.append((url, (headers or {}).get('Range'), len(data)))
+        if self.fail_puts:
+            self.fail_puts -= 1
+            return Response(503)
+        rng = (headers or {}).get('Range')
+        if rng:
+            start = int(rng[len('bytes='):].split('-')[0])
+            data = self.objects[url][:start] + data
+        self.objects[url] = data
+        return Response()
+
+    def get(self, url, headers=None, auth=None, stream=False):
+        self.gets.append((url, headers))
+        if url not in self.objects:
+            return Response(404)
+        rng = (headers or {}).get('Range')
+        if rng:
+            start, end = rng[len('bytes='):].split('-')
+            data = self.objects[url][int(start):int(end) + 1]
+            self.bytes_sent += len(data)
+            return Response(206, content=data)
+        etag = '"{}"'.format(hashlib.md5(self.objects[url]).hexdigest())
+        if (headers or {}).get('If-None-Match') == etag:
+            return Response(304)
+        return Response(content=self.objects[url], headers={'ETag': etag})
+
+    def head(self, url, headers=None, auth=None, allow_redirects=False):
+        if url not in self.objects:
+            return Response(404)
+        return Response(headers={'Content-Length': str(len(self.objects[url]))})
+
+
+@pytest.fixture
+def session(monkeypatch):
+    session = Session()
+    monkeypatch.setattr(archive, 'http_session', lambda url: session)
+    return session
+
+
+def test_upload_sink_v3io(session, monkeypatch):
+    monkeypatch.setattr(archive.UploadSink, 'chunk_size', 10)
+    with archive.UploadSink('v3io://webapi/c/f.zip', memory_limit=10) as sink:
+        for _ in range(10):
+            sink.write(b'0123456789')
+    assert session.objects['http://webapi/c/f.zip'] == b'0123456789' * 10
+    assert session.puts[0] == ('http://webapi/c/f.zip', None, 20)
+    assert session.puts[1] == ('http://webapi/c/f.zip', 'bytes=20-29', 10)
+
+
+def test_v3io_chunked_upload(session, tmp_path, monkeypatch):
+    monkeypatch.setenv('NUCLIO_UPLOAD_CHUNK_SIZE', '1k')
+    src = tmp_path / 'f.zip'
+    data = os.urandom(2500)
+    src.write_bytes(data)
+    url = 'http://webapi/c/f.zip'
+    sent = []
+
+    session.fail_puts = 1
+    archive.upload_file(str(src), 'v3io://webapi/c/f.zip', progress=sent.append)
+    assert session.objects[url] == data
+    assert [p[1] for p in session.puts] == [
+        None, None, 'bytes=1024-2047', 'bytes=2048-2499']
+    assert sent == [1024, 1024, 452]
+
+    # an interrupted upload leaves a marker, resume continues from it
+    repo = archive.url2repo('v3io://webapi/c/f.zip')
+
+    def interrupt(size):
+        raise KeyboardInterrupt()
+
+    repo.progress = interrupt
+    with pytest.raises(KeyboardInterrupt):
+        repo.upload(str(src))
+    assert session.objects[url] == data[:1024]
+    marker = json.loads(session.objects[url + '.partial'])
+    assert marker['offset'] == 1024 and marker['size'] == 2500
+
+    repo.progress = None
+    del session.puts[:]
+    repo.upload(str(src), resume=True)
+    assert session.objects[url] == data
+    assert [p[1] for p in session.puts if p[0] == url] == [
+        'bytes=1024-2047', 'bytes=2048-2499']
+    assert json.loads(session.objects[url + '.partial']) == {}
+
+    # the remote size alone is not trusted
+    session.objects[url] = data[:1024]
+    del session.puts[:]
+    repo.upload(str(src), resume=True)
+    assert session.objects[url] == data
+    assert [p[1] for p in session.puts] == [
+        None, 'bytes=1024-2047', 'bytes=2048-2499']
+
+    # a marker of another file (same size)
+    repo.progress = interrupt
+    with pytest.raises(KeyboardInterrupt):
+        repo.upload(str(src))
+    data = os.urandom(2500)
+    src.write_bytes(data)
+    repo.progress = None
+    del session.puts[:]
+    repo.upload(str(src), resume=True)
+    assert session.objects[url] == data
+    assert session.puts[0][1] is None
+
+
+def test_upload_file_resume(session, tmp_path, monkeypatch):
+    monkeypatch.setenv('NUCLIO_UPLOAD_CHUNK_SIZE', '1k')
+    src = tmp_path / 'f.zip'
+    data = os.urandom(2500)
+    src.write_bytes(data)
+    url = 'http://webapi/c/f.zip'
+
+    def interrupt(size):
+        raise KeyboardInterrupt()
+
+    for resume_env, resume in (('', True), ('true', None)):
+        monkeypatch.setenv('NUCLIO_UPLOAD_RESUME', resume_env)
+        session.objects.clear()
+        with pytest.raises(KeyboardInterrupt):
+            archive.upload_file(str(src), 'v3io://webapi/c/f.zip',
+                                progress=interrupt)
+        del session.puts[:]
+        archive.upload_file(str(src), 'v3io://webapi/c/f.zip', resume=resume)
+        assert session.objects[url] == data
+        assert [p[1] for p in session.puts if p[0] == url] == [
+            'bytes=1024-2047', 'bytes=2048-2499']
+
+    # resume is off by default
+    monkeypatch.delenv('NUCLIO_UPLOAD_RESUME')
+    with pytest.raises(KeyboardInterrupt):
+        archive.upload_file(str(src), 'v3io://webapi/c/f.zip',
+                            progress=interrupt)
+    del session.puts[:]
+    archive.upload_file(str(src), 'v3io://webapi/c/f.zip')
+    assert session.puts[0] == (url, None, 1024)
+
+
+def test_http_download(session, tmp_path):
+    data = bytes(range(256)) * 10000
+    session.objects['http://host/nb.ipynb'] = data
+    target = tmp_path / 'nb.ipynb'
+    archive.url2repo('http://host/nb.ipynb').download(str(target))
+    assert target.read_bytes() == data
+    with pytest.raises(OSError):
+        archive.url2repo('v3io://host/missing').download(str(target))
+
+
+def test_repo_cache(session, tmp_path, monkeypatch):
+    monkeypatch.setenv('NUCLIO_CACHE_DIR', str(tmp_path / 'cache'))
+    url = 'http://host/handler.py'
+    session.objects[url] = b'print(1)'
+
+    assert archive.url2repo(url).get() == 'print(1)'
+    assert archive.url2repo(url).get() == 'print(1)'
+    assert session.gets[1][1] == {
+        'If-None-Match': '"{}"'.format(hashlib.md5(b'print(1)').hexdigest())}
+
+    session.objects[url] = b'print(2)'
+    assert archive.url2repo(url).get() == 'print(2)'
+    target = tmp_path / 'handler.py'
+    archive.url2repo('v3io://host/handler.py').download(str(target))
+    assert target.read_bytes() == b'print(2)'
+    # same url and credentials, shared entry
+    assert len(os.listdir(str(tmp_path / 'cache'))) == 2
+
+
+def test_repo_cache_bad_entries(session, tmp_path, monkeypatch):
+    cache = archive.RepoCache(str(tmp_path))
+    url = 'http://host/handler.py'
+    session.objects[url] = b'print(1)'
+    repo = archive.url2repo(url)
+    data_path, meta_path = cache._paths(url)
+
+    cache.fetch(repo, url)
+    with open(meta_path, 'w') as fp:
+        fp.write('{"etag": ')
+    del session.gets[:]
+    assert open(cache.fetch(repo, url)).read() == 'print(1)'
+    assert session.gets == [(url, {})], 'corrupt meta not a cache miss'
+    assert json.load(open(meta_path))['etag']
+
+    # evicted between the conditional get and its use
+    utime, remove = os.utime, os.remove
+
+    def evicted(file_path):
+        remove(file_path)
+        utime(file_path)
+
+    monkeypatch.setattr(os, 'utime', evicted)
+    assert open(cache.fetch(repo, url)).read() == 'print(1)'
+    assert sorted(os.listdir(str(tmp_path))) == sorted(
+        path.basename(name) for name in (data_path, meta_path))
+
+    with pytest.raises(ValueError, match='unimplemented'):
+        archive.ExternalRepo(None).conditional_get()
+
+
+def test_repo_cache_evict(session, tmp_path):
+    cache = archive.RepoCache(str(tmp_path), max_size=250)
+    repos = []
+    for i in range(3):
+        url = 'http://host/{}.ipynb'.format(i)
+        session.objects[url] = b'x' * 100
+        repos.append((archive.url2repo(url), url))
+
+    os.utime(cache.fetch(*repos[0]), (0, 0))
+    os.utime(cache.fetch(*repos[1]), (10, 10))
+    os.utime(cache.fetch(*repos[0]), (20, 20))  # hit, 1 is now the oldest
+    cache.fetch(*repos[2])
+
+    cached = [path.isfile(cache._paths(url)[0]) for _, url in repos]
+    assert cached == [True, False, True]
+
+
+def test_zip_reader(tmp_path, files):
+    zip_path = str(tmp_path / 'f.zip')
+    config = new_config()
+    config['spec']['handler'] = 'my-func-nuclio:handler'
+    archive.build_zip(zip_path, config, code, files, handler='my-func')
+
+    with archive.ZipReader(zip_path) as z:
+        assert z.names() == ['a.py', 'function.yaml', 'model/weights.txt',
+                             'my-func.py']
+        with z.open('model/weights.txt') as fp:
+            assert fp.read(12) == b'0.1 0.2 0.3\n'
+
+    handler, config_text = archive.load_zip_config(zip_path)
+    assert handler == code
+    assert 'my-func-nuclio:handler' in config_text
+    assert archive.get_from_zip(zip_path, ['a.py']) == {'a.py': 'x = 1\n'}
+
+
+def test_zip_reader_remote(session, tmp_path, files):
+    with open('model/big.bin', 'wb') as fp:
+        fp.write(os.urandom(4 * 1024 * 1024))
+    zip_path = str(tmp_path / 'f.zip')
+    archive.build_zip(zip_path, new_config(), code,
+                      files + ['model/big.bin'], compression='stored')
+    url = 'http://host/f.zip'
+    with open(zip_path, 'rb') as fp:
+        session.objects[url] = fp.read()
+
+    handler, config_text = archive.load_zip_config(url)
+    assert handler == code
+    assert 'spec' in config_text
+    assert session.bytes_sent < 200 * 1024, 'read the whole archive'
+
+
+def test_http_session_pool():
+    assert archive.http_session('http://a:80/x') is \
+        archive.http_session('http://a:80/y')
+    assert archive.http_session('http://a:80/x') is not \
+        archive.http_session('http://b:80/x')
+
+
+def test_parse_size():
+    assert archive.parse_size('8MB') == 8 * 1024 * 1024
+    assert archive.parse_size('512k') == 512 * 1024
+    assert archive.parse_size('1.5GiB') == 3 * 1024 ** 3 // 2
+    assert archive.parse_size('100') == archive.parse_size(100) == 100
+    with pytest.raises(ValueError):
+        archive.parse_size('lots')
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    pytest.importorskip('boto3')
+    moto = pytest.importorskip('moto')
+    mock = getattr(moto, 'mock_aws', None) or moto.mock_s3
+    monkeypatch.setenv('AWS_ACCESS_KEY_ID', 'testing')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'testing')
+    monkeypatch.setenv('AWS_DEFAULT_REGION', 'us-east-1')
+    monkeypatch.setenv('NUCLIO_S3_PART_SIZE', '5MB')
+    monkeypatch.setenv('NUCLIO_S3_CONCURRENCY', '4')
+    with mock():
+        import boto3
+        client = boto3.client('s3')
+        client.create_bucket(Bucket='archives')
+        yield client
+
+
+def test_s3_multipart_upload(s3, tmp_path):
+    src = tmp_path / 'big.zip'
+    data = os.urandom(12 * 1024 * 1024)
+    src.write_bytes(data)
+    sent = []
+
+    repo = archive.url2repo('s3://archives/fn/big.zip')
+    assert repo.transfer_config.multipart_chunksize == 5 * 1024 * 1024
+    assert repo.transfer_config.max_concurrency == 4
+    archive.upload_file(str(src), 's3://archives/fn/big.zip', progress=sent.append)
+
+    obj = s3.get_object(Bucket='archives', Key='fn/big.zip')
+    assert obj['Body'].read() == data
+    assert '-3' in obj['ETag'], 'not a 3 part upload'
+    assert sum(sent) == len(data)
+    assert repo.stat() == len(data)
+    assert archive.url2repo('s3://archives/fn/missing.zip').stat() is None
+
+
+def test_s3_stream_upload(s3, files):
+    url = 's3://archives/fn/f.zip'
+    sink = archive.build_and_upload(url, new_config(), code, files,
+                                    skip_unchanged=True)
+    body = s3.get_object(Bucket='archives', Key='fn/f.zip')['Body'].read()
+    assert archive.hashlib.sha256(body).hexdigest() == sink.digest
+    sink = archive.build_and_upload(url, new_config(), code, files,
+                                    skip_unchanged=True)
+    assert not sink.uploaded
+
+
+def test_upload_delta(tmp_path, files):
+    with open('model/big.bin', 'wb') as fp:
+        fp.write(os.urandom(1024 * 1024))
+    files.append('model/big.bin')
+    url = str(tmp_path / 'store.zip')
+
+    def upload(code):
+        return archive.build_and_upload(url, new_config(), code, files,
+                                        compression='stored', delta=True)
+
+    manifest = upload(code)
+    assert manifest['uploaded'] == manifest['size']
+    assert manifest['layout'][-2:] == ['function.yaml', 'handler.py']
+    assert archive.get_manifest(url)['sha256'] == archive.file_digest(url)
+
+    # code only change, only the tail is written
+    manifest = upload(code + '# more\n')
+    assert manifest['uploaded'] < 20 * 1024
+    assert archive.load_zip_config(url)[0] == code + '# more\n'
+    assert archive.file_digest(url) == manifest['sha256']
+
+    # shrinking, padded to the stored size
+    size = manifest['size']
+    manifest = upload('def handler(context, event):\n    return 1\n')
+    assert manifest['size'] == size and manifest['uploaded'] < 20 * 1024
+    with zipfile.ZipFile(url) as z:
+        assert z.testzip() is None
+        assert z.read('model/big.bin') == open('model/big.bin', 'rb').read()
+
+    # asset change moves it after the unchanged members
+    with open('a.py', 'w') as fp:
+        fp.write('x = 2\n')
+    manifest = upload(code)
+    assert manifest['layout'][-3:] == ['a.py', 'function.yaml', 'handler.py']
+    with zipfile.ZipFile(url) as z:
+        assert z.read('a.py') == b'x = 2\n'
+
+    # the stored archive was replaced, full upload
+    archive.build_zip(url, new_config(), code, files)
+    manifest = upload(code)
+    assert manifest['uploaded'] == manifest['size']
+
+
+def test_upload_delta_interrupted(tmp_path, files, monkeypatch):
+    url = str(tmp_path / 'store.zip')
+    archive.upload_delta(url, new_config(), code, files, compression='stored')
+
+    def interrupted(self, src_path, offset):
+        with open(self.path, 'r+b') as fp:
+            fp.seek(offset)
+            fp.write(b'partial')
+        raise OSError('connection reset')
+
+    upload_tail = archive.FileRepo.upload_tail
+    monkeypatch.setattr(archive.FileRepo, 'upload_tail', interrupted)
+    with pytest.raises(OSError):
+        archive.upload_delta(url, new_config(), code + '# more\n', files,
+                             compression='stored')
+    assert not archive.get_manifest(url)
+    assert not archive.is_uploaded(archive.url2repo(url), url,
+                                   archive.file_digest(url),
+                                   path.getsize(url))
+
+    monkeypatch.setattr(archive.FileRepo, 'upload_tail', upload_tail)
+    manifest = archive.upload_delta(url, new_config(), code + '# more\n',
+                                    files, compression='stored')
+    assert manifest['uploaded'] == manifest['size']
+    assert archive.file_digest(url) == manifest['sha256']
+
+
+def test_upload_delta_v3io(session, files):
+    with open('model/big.bin', 'wb') as fp:
+        fp.write(os.urandom(1024 * 1024))
+    files.append('model/big.bin')
+    url = 'v3io://webapi/c/f.zip'
+    archive.upload_delta(url, new_config(), code, files, compression='stored')
+    del session.puts[:]
+
+    manifest = archive.upload_delta(url, new_config(), code + '# more\n',
+                                    files, compression='stored')
+    archive_puts = [put for put in session.puts
+                    if put[0] == 'http://webapi/c/f.zip']
+    assert sum(put[2] for put in archive_puts) == manifest['uploaded'] < 20000
+    assert all(put[1] for put in archive_puts), 'not a ranged write'
+    data = session.objects['http://webapi/c/f.zip']
+    assert archive.hashlib.sha256(data).hexdigest() == manifest['sha256']
@@ -18,9 +18,10 @@ from unittest import mock
 
 import pytest
 
+from nuclio import codec
 from nuclio.build import build_file
 from nuclio.config import ConfigSpec, meta_keys, get_in
-from conftest import here
+from conftest import here, patch
 
 
 @pytest.fixture()
@@ -138,3 +139,18 @@ def test_build_file_zip(project):
     assert os.path.exists(project), '{} dir was not created'.format(project)
     zip_path = os.path.join(project, 'hw_v7.zip')
     assert os.path.exists(zip_path), '{} dir was not created'.format(zip_path)
+
+
+def test_build_file_skips_debug_render():
+    calls = []
+
+    def yaml_dump(obj, default_flow_style=False):
+        calls.append(obj)
+        return ''
+
+    filepath = '{}/handler.py'.format(here)
+    with patch(codec, yaml_dump=yaml_dump):
+        build_file(filepath, name='hw')
+        assert not calls, 'config rendered for a disabled log level'
+        build_file(filepath, name='hw', verbose=True)
+        assert calls, 'config not rendered in verbose mode'
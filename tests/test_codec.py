@@ -0,0 +1,66 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+
+import yaml
+
+from conftest import patch
+from nuclio import codec
+from nuclio.config import new_config, set_env_dict
+
+
+def sample_config():
+    config = new_config()
+    config['spec']['handler'] = 'handler:handler'
+    config['spec']['build']['commands'] = ['pip install requests']
+    config['metadata']['annotations']['nuclio.io/generated_by'] = 'übung'
+    set_env_dict(config, {'ENV_{}'.format(i): i for i in range(50)})
+    return config
+
+
+def test_yaml_matches_pure_python():
+    config = sample_config()
+    text = codec.yaml_dump(config)
+    assert text == yaml.safe_dump(config, default_flow_style=False)
+    assert codec.yaml_load(text) == config
+
+
+def test_json_loads():
+    config = sample_config()
+    data = json.dumps(config)
+    assert codec.json_loads(data) == config
+    assert codec.json_loads(data.encode('utf-8')) == config
+
+
+def test_fallback_without_orjson():
+    config = sample_config()
+    data = json.dumps(config)
+    with patch(codec, orjson=None):
+        assert codec.json_loads(data) == config
+
+
+def test_lazy_yaml():
+    config = sample_config()
+    calls = []
+
+    def yaml_dump(obj):
+        calls.append(obj)
+        return 'rendered'
+
+    with patch(codec, yaml_dump=yaml_dump):
+        lazy = codec.LazyYaml(config)
+        assert not calls, 'rendered before str()'
+        assert str(lazy) == 'rendered'
+        assert calls == [config]
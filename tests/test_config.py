@@ -12,7 +12,12 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import json
+import pickle
+from copy import deepcopy
+
 import pytest
+import yaml
 
 from nuclio import config
 
@@ -72,3 +77,156 @@ def test_set_external_source_env_dict():
     assert get_env_var_from_list_by_key(config_dict['spec']['env'], 'name1')['valueFrom'] == secrets['name1']
     assert get_env_var_from_list_by_key(config_dict['spec']['env'], 'name2')['valueFrom'] == secrets['name2']
     assert get_env_var_from_list_by_key(config_dict['spec']['env'], 'name3')['valueFrom'] == secrets['name3']
+
+
+def test_set_env_dict_many():
+    config_dict = {'spec': {'env': [{'name': 'KEY_3', 'value': 'old'}]}}
+    env = {'KEY_{}'.format(i): i for i in range(1000)}
+    config.set_env_dict(config_dict, env)
+
+    names = [item['name'] for item in config_dict['spec']['env']]
+    assert names == ['KEY_3'] + [key for key in env if key != 'KEY_3']
+    assert config_dict['spec']['env'][0] == {'name': 'KEY_3', 'value': '3'}
+
+
+def test_env_index_updates_first_match():
+    config_dict = {'spec': {}}
+    index = config.EnvIndex(config_dict)
+    value_from = {"secretKeyRef": {"name": "secret1", "key": "secret-key1"}}
+    index.set('a', value='1')
+    index.set('b', value='2')
+    index.set('a', value_from=value_from)
+    assert config_dict['spec']['env'] == [
+        {'name': 'a', 'valueFrom': value_from},
+        {'name': 'b', 'value': '2'},
+    ]
+
+    config_dict['spec']['env'].append({'name': 'a', 'value': 'dup'})
+    config.create_or_update_env_var(config_dict, 'a', value='3')
+    assert config_dict['spec']['env'][0] == {'name': 'a', 'value': '3'}
+    assert config_dict['spec']['env'][2] == {'name': 'a', 'value': 'dup'}
+
+
+def test_new_config_shares_template():
+    template = deepcopy(config._function_config)
+    conf = config.new_config()
+    conf['spec']['build']['commands'].append('pip install x')
+    conf['metadata']['labels']['a'] = 'b'
+    config.create_or_update_env_var(conf, 'key', value='value')
+    conf['spec']['build'].pop('noBaseImagesPull')
+    assert config._function_config == template, 'template was modified'
+    assert config.new_config() == template
+
+    for raw in ({**config.new_config()}, dict(conf.copy())):
+        raw['metadata']['labels']['x'] = 'y'
+        raw['spec']['env'].append({'name': 'x', 'value': 'y'})
+    assert config._function_config == template, 'template was modified'
+
+    shared = dict.__getitem__(config.new_config(), 'metadata')
+    with pytest.raises(TypeError):
+        shared['labels']['x'] = 'y'
+
+
+def test_config_snapshot():
+    conf = config.new_config()
+    config.update_in(conf, 'spec.build.baseImage', 'python:3.11')
+    snap = conf.copy()
+    config.update_in(conf, 'spec.build.baseImage', 'python:3.12')
+    config.update_in(snap, 'spec.build.commands', 'ls', append=True)
+
+    assert snap['spec']['build']['baseImage'] == 'python:3.11'
+    assert conf['spec']['build']['commands'] == []
+    assert deepcopy(snap) == snap
+    assert yaml.safe_load(yaml.safe_dump(snap)) == snap
+    assert json.loads(json.dumps(conf)) == conf
+
+
+def test_config_snapshot_reuse():
+    conf = config.new_config()
+    config.create_or_update_env_var(conf, 'a', value='1')
+    first = conf.copy()
+    second = conf.copy()
+    # unmodified sub trees are frozen once and shared by later snapshots
+    assert dict.__getitem__(first, 'spec') is dict.__getitem__(second, 'spec')
+
+    conf['spec']['env'][0]['value'] = '2'
+    conf['metadata']['labels']['x'] = 'y'
+    third = conf.copy()
+    assert dict.__getitem__(first, 'spec')['build'] is \
+        dict.__getitem__(third, 'spec')['build']
+    assert first['spec']['env'] == [{'name': 'a', 'value': '1'}]
+    assert third['spec']['env'] == [{'name': 'a', 'value': '2'}]
+    assert first['metadata']['labels'] == {}
+    assert conf == third
+
+
+def test_config_serialize():
+    conf = config.new_config()
+    config.update_in(conf, 'spec.build.commands', 'ls', append=True)
+    for obj in (conf, conf.copy(), config.new_config()):
+        loaded = pickle.loads(pickle.dumps(obj))
+        assert type(loaded) is config.ConfigDict and loaded == obj
+        loaded['spec']['env'].append({'name': 'x', 'value': 'y'})
+        assert 'python/' not in yaml.dump(obj)
+        assert yaml.safe_load(yaml.dump(obj)) == obj
+    assert config.new_config()['spec']['env'] == []
+
+
+def layered_specs():
+    base = config.ConfigSpec(env={'A': 1, 'B': 'base'}, cmd=['pip install x'],
+                             config={'spec.build.baseImage': 'python:3.11'},
+                             name='base')
+    base.add_volume('/data', '/container/path', name='data')
+    team = base.extend('team', env={'B': 'team'},
+                       external_source_env={'S': {'secretKeyRef': {'name': 's'}}},
+                       config={'spec.build.commands': 'pip install y',
+                               'spec.minReplicas': 2})
+    func = team.extend('func', config={'spec.minReplicas': 1})
+    return base, team, func
+
+
+def test_layered_spec_merge():
+    base, team, func = layered_specs()
+    expected = config.new_config()
+    for spec in (base, team, func):
+        config.ConfigSpec.merge(
+            config.ConfigSpec(env=spec.env, config=spec.extra_config,
+                              cmd=spec.cmd,
+                              external_source_env=spec.external_source_env),
+            expected)
+        for mount in spec.mounts:
+            mount.render(expected)
+
+    conf = config.new_config()
+    func.merge(conf)
+    assert conf == expected
+    assert get_env_var_from_list_by_key(conf['spec']['env'], 'B')['value'] == 'team'
+    assert conf['spec']['minReplicas'] == 1
+    assert conf['spec']['build']['commands'] == ['pip install x', 'pip install y']
+
+    func.freeze()
+    frozen = config.new_config()
+    func.merge(frozen)
+    assert frozen == expected
+
+
+def test_frozen_spec_uses_cached_patch(monkeypatch):
+    _, team, func = layered_specs()
+    func.freeze()
+    monkeypatch.setattr(config, 'set_commands', None)
+    monkeypatch.setattr(config.Volume, 'render', None)
+    for _ in range(3):
+        conf = config.new_config()
+        func.merge(conf)
+        assert len(conf['spec']['volumes']) == 1
+
+    conf['spec']['volumes'][0]['volume']['name'] = 'changed'
+    conf = config.new_config()
+    func.merge(conf)
+    assert conf['spec']['volumes'][0]['volume']['name'] == 'data'
+
+    team.set_env('C', '3')
+    monkeypatch.undo()
+    conf = config.new_config()
+    func.merge(conf)
+    assert get_env_var_from_list_by_key(conf['spec']['env'], 'C')['value'] == '3'
@@ -61,6 +61,10 @@ class Response:
     def json(self):
         return self.data
 
+    @property
+    def content(self):
+        return json.dumps(self.data).encode('utf-8')
+
     @property
     def text(self):
         return json.dumps(self.data)
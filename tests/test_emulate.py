@@ -0,0 +1,341 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import socket
+import time
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+
+from nuclio import Event
+from nuclio.emulate import (CronEmulator, CronSchedule, HttpEmulator,
+                            PartitionedLog, StreamEmulator, http_response,
+                            parse_duration)
+from nuclio.triggers import (CronTrigger, HttpTrigger, KafkaTrigger,
+                             V3IOStreamTrigger)
+
+code = '''
+import asyncio
+import time
+
+
+def init_context(context):
+    context.user_data.calls = 0
+
+
+def handler(context, event):
+    context.user_data.calls += 1
+    if event.path == '/fail':
+        raise ValueError('bad request')
+    if event.path == '/sleep':
+        time.sleep(0.2)
+    if event.path == '/status':
+        return 201, 'created'
+    if isinstance(event.body, dict):
+        return {'body': event.body, 'fields': event.fields,
+                'worker': context.worker_id, 'trigger': event.trigger.kind,
+                'id': event.get_header('X-ID')}
+    return 'hello ' + event.body.decode('utf-8')
+'''
+
+async_code = '''
+import asyncio
+
+
+async def handler(context, event):
+    await asyncio.sleep(0.2)
+    return {'method': event.method, 'size': event.size}
+'''
+
+
+def test_http_emulator():
+    trigger = HttpTrigger(workers=2, host='h', paths=['/api', '/fail',
+                                                      '/status'])
+    with HttpEmulator(code=code, trigger=trigger, port=0) as server:
+        assert server.workers == 2
+        url = 'http://127.0.0.1:{}'.format(server.port)
+        resp = requests.post(url + '/api?a=1', json={'x': 1},
+                             headers={'x-id': '7'})
+        assert resp.status_code == 200
+        data = resp.json()
+        assert data['body'] == {'x': 1} and data['fields'] == {'a': '1'}
+        assert data['trigger'] == 'http' and data['id'] == '7'
+
+        resp = requests.post(url + '/api', data=b'joe')
+        assert resp.text == 'hello joe'
+        assert resp.headers['Content-Type'] == 'text/plain'
+        resp = requests.get(url + '/status')
+        assert (resp.status_code, resp.text) == (201, 'created')
+        resp = requests.get(url + '/fail')
+        assert resp.status_code == 500
+        assert 'ValueError: bad request' in resp.text
+        assert requests.get(url + '/other').status_code == 404
+        resp = requests.post(url + '/api', data=b'x' * (5 * 1024 * 1024))
+        assert resp.status_code == 413
+
+    assert server.stats.count == 4
+    assert server.stats.errors == {'ValueError: bad request': 1}
+
+
+def test_http_emulator_chunked():
+    with HttpEmulator(code=code, port=0) as server:
+        with socket.create_connection(('127.0.0.1', server.port)) as sock:
+            sock.sendall(b'POST / HTTP/1.1\r\nHost: x\r\n'
+                         b'Transfer-Encoding: chunked\r\n\r\n'
+                         b'3\r\njoe\r\n3\r\nlle\r\n0\r\n\r\n'
+                         b'POST / HTTP/1.0\r\nContent-Length: 1\r\n\r\nx')
+            data = b''
+            while True:
+                chunk = sock.recv(4096)
+                if not chunk:
+                    break
+                data += chunk
+    assert data.count(b'HTTP/1.1 200 OK') == 2
+    assert b'hello joelle' in data and data.endswith(b'hello x')
+
+
+def test_http_emulator_bad_chunk():
+    with HttpEmulator(code=code, port=0) as server:
+        with socket.create_connection(('127.0.0.1', server.port)) as sock:
+            sock.sendall(b'POST / HTTP/1.1\r\nHost: x\r\n'
+                         b'Transfer-Encoding: chunked\r\n\r\n'
+                         b'zz\r\njoe\r\n0\r\n\r\n')
+            data = sock.recv(4096)
+    assert data.startswith(b'HTTP/1.1 400 Bad Request')
+    assert data.endswith(b'bad chunk size')
+    assert server.stats.count == 0
+
+
+def test_http_emulator_rejects():
+    trigger = {'kind': 'http', 'maxWorkers': 1,
+               'workerAvailabilityTimeoutMilliseconds': 50}
+    with HttpEmulator(code=code, trigger=trigger, port=0) as server:
+        url = 'http://127.0.0.1:{}/sleep'.format(server.port)
+        with ThreadPoolExecutor(2) as pool:
+            statuses = sorted(resp.status_code for resp in
+                              pool.map(lambda _: requests.post(url), range(2)))
+    assert statuses == [200, 503]
+    assert server.stats.count == 1 and not server.stats.errors
+    assert server.stats.rejected == 1
+    assert server.stats.percentile(50) >= 0.2
+    assert '1 requests rejected' in server.stats.summary()
+
+
+def test_http_emulator_workers():
+    for handler_code in (code, async_code):
+        with HttpEmulator(code=handler_code, workers=2, port=0) as server:
+            url = 'http://127.0.0.1:{}/sleep'.format(server.port)
+            start = time.monotonic()
+            with ThreadPoolExecutor(4) as pool:
+                statuses = [resp.status_code for resp in
+                            pool.map(lambda _: requests.post(url), range(4))]
+            elapsed = time.monotonic() - start
+        assert statuses == [200] * 4
+        # 4 requests on 2 workers take 2 rounds of 0.2s
+        assert 0.4 <= elapsed < 0.7, elapsed
+
+
+def test_http_response():
+    class Response:
+        body, headers, content_type, status_code = b'x', {'a': 'b'}, None, 202
+
+    assert http_response(None) == (200, None, {}, b'')
+    assert http_response(b'\x00') == (200, 'application/octet-stream', {},
+                                      b'\x00')
+    assert http_response([1]) == (200, 'application/json', {}, b'[1]')
+    assert http_response((400, 'bad')) == (400, 'text/plain', {}, b'bad')
+    assert http_response(Response()) == (202, 'application/octet-stream',
+                                         {'a': 'b'}, b'x')
+
+
+def test_parse_duration():
+    assert parse_duration('1s') == 1.0
+    assert parse_duration('1m30s') == 90.0
+    assert parse_duration('250ms') == 0.25
+    assert parse_duration(2) == 2.0
+    with pytest.raises(ValueError):
+        parse_duration('1 day')
+
+
+def test_partitioned_log(tmp_path):
+    log = PartitionedLog(3)
+    assert [log.append(i)[0] for i in range(4)] == [0, 1, 2, 0]
+    assert log.append('x', key='u1')[0] == log.append('y', key='u1')[0]
+    assert log.read(0, 0, max_records=1) == [0]
+    log = PartitionedLog(['a'])
+    for body in (b'x' * 10, b'y' * 10, b'z' * 10):
+        log.append(Event(body=body))
+    assert len(log.read('a', 0, max_bytes=25)) == 2
+    assert len(log.read('a', 0, max_bytes=5)) == 1
+    assert len(log.read('a', 1)) == 2
+
+    log.save(str(tmp_path))
+    loaded = PartitionedLog.from_dir(str(tmp_path))
+    assert loaded.partitions == ['a'] and loaded.closed
+    assert [record.decode().body for record in loaded.read('a', 0)] == [
+        b'x' * 10, b'y' * 10, b'z' * 10]
+
+
+stream_code = '''
+import time
+
+handled = []
+
+
+def handler(context, event):
+    handled.append((event.body['partition'], context.worker_id))
+    if event.body.get('slow'):
+        time.sleep(0.01)
+    if event.body.get('fail'):
+        raise ValueError('bad event')
+'''
+
+
+def stream_log(partitions=2, count=100, **extra):
+    log = PartitionedLog(partitions)
+    for partition in range(partitions):
+        for i in range(count):
+            log.append(dict(partition=partition, i=i, **extra), partition)
+    log.close()
+    return log
+
+
+@pytest.mark.parametrize('mode', ['pool', 'static'])
+def test_stream_emulator(mode):
+    trigger = V3IOStreamTrigger(container='c', path='/s', access_key='k',
+                                read_batch_size=16, max_workers=2,
+                                worker_allocation_mode=mode)
+    emulator = StreamEmulator(code=stream_code, trigger=trigger,
+                              log=stream_log())
+    stats = emulator.run()
+    assert stats.count == 200 and not stats.errors
+    for partition in (0, 1):
+        part = stats.partitions[partition]
+        assert (part.count, part.batches) == (100, 7)
+        assert (part.committed, part.lag) == (100, 0)
+    assert 'partition 1: 100 events in 7 batches' in stats.summary()
+
+    handled = [worker.handler.__globals__['handled']
+               for worker in emulator.pool]
+    assert sum(len(events) for events in handled) == 200
+    if mode == 'static':
+        assert [set(events) for events in handled] == [{(0, 0)}, {(1, 1)}]
+
+
+ack_code = '''
+from nuclio.emulate import no_ack_header
+
+
+class Response:
+    body, content_type, status_code = '', None, 200
+    headers = {no_ack_header: 'true'}
+
+
+async def handler(context, event):
+    if event.body['i'] < 95:
+        await context.platform.explicit_ack(event)
+    if event.body['i'] % 2:
+        return Response()
+'''
+
+
+@pytest.mark.parametrize('ack_mode,committed', [
+    ('explicitOnly', 95), ('enable', 99), ('disable', 100)])
+def test_stream_explicit_ack(ack_mode, committed):
+    trigger = KafkaTrigger('b', ['t'], partitions=[0, 1], max_workers=3,
+                           explicit_ack_mode=ack_mode)
+    log = stream_log()
+    stats = StreamEmulator(code=ack_code, trigger=trigger, log=log).run()
+    assert stats.count == 200
+    for part in stats.partitions.values():
+        # kafka batches are limited by fetchDefault (1MB) bytes
+        assert part.batches == 1
+        assert (part.committed, part.lag) == (committed, 100 - committed)
+
+
+def test_stream_live_log():
+    trigger = V3IOStreamTrigger(container='c', path='/s', access_key='k',
+                                read_batch_size=8, polling_interval_ms=10,
+                                sequence_num_commit_interval='20ms')
+    log = PartitionedLog(1)
+    emulator = StreamEmulator(code=stream_code, trigger=trigger, log=log)
+
+    def produce():
+        for i in range(50):
+            log.append({'partition': 0, 'i': i, 'slow': True})
+            time.sleep(0.001)
+        log.close()
+
+    with ThreadPoolExecutor(1) as pool:
+        pool.submit(produce)
+        stats = emulator.run(duration=10)
+    part = stats.partitions[0]
+    assert part.count == 50 and part.lag == 0
+    assert part.max_lag > 0 and part.commits > 1
+
+
+@pytest.mark.parametrize('schedule,after,expected', [
+    ('*/15 * * * *', datetime(2024, 1, 1, 10, 7), datetime(2024, 1, 1, 10, 15)),
+    ('0 9 * * mon-fri', datetime(2024, 1, 5, 9, 0),  # friday
+     datetime(2024, 1, 8, 9, 0)),
+    ('30 0 0 1 jan,jul *', datetime(2024, 2, 1), datetime(2024, 7, 1, 0, 0, 30)),
+    ('0 0 29 2 *', datetime(2024, 3, 1), datetime(2028, 2, 29)),
+    ('0 12 13 * 5', datetime(2024, 1, 1), datetime(2024, 1, 5, 12, 0)),
+    ('@hourly', datetime(2024, 1, 1, 10, 0), datetime(2024, 1, 1, 11, 0)),
+    ('@every 90s', datetime(2024, 1, 1), datetime(2024, 1, 1, 0, 1, 30)),
+])
+def test_cron_schedule(schedule, after, expected):
+    assert CronSchedule(schedule=schedule).next_after(after) == expected
+
+
+def test_cron_schedule_errors():
+    for schedule in ('* * *', '61 * * * *', '*/0 * * * *', 'x * * * *'):
+        with pytest.raises(ValueError):
+            CronSchedule(schedule=schedule)
+
+
+cron_code = '''
+import time
+
+bodies = []
+
+
+def handler(context, event):
+    bodies.append(event.body)
+    time.sleep(float(event.body))
+'''
+
+
+def test_cron_emulator():
+    # a 1m interval compressed to 20ms, the handler takes 5ms
+    trigger = CronTrigger(interval='1m', body='0.005')
+    emulator = CronEmulator(code=cron_code, trigger=trigger, speed=3000)
+    stats = emulator.run(count=10)
+    assert stats.count == 10 and stats.keeps_up
+    assert stats.max_backlog == 0
+    assert stats.drift(50) < 0.01
+    assert emulator.pool[0].handler.__globals__['bodies'] == ['0.005'] * 10
+    minutes = [(b - a).total_seconds()
+               for a, b in zip(stats.scheduled, stats.scheduled[1:])]
+    assert minutes == [60.0] * 9
+
+    # the handler takes 3 intervals, fire times pile up
+    trigger = CronTrigger(interval='1m', body='0.06')
+    stats = CronEmulator(code=cron_code, trigger=trigger, speed=3000).run(
+        duration=600)
+    assert stats.count == 10 and not stats.keeps_up
+    assert stats.overlaps >= 8 and stats.max_backlog >= 5
+    assert stats.drifts[-1] > 0.3
+    assert 'does not keep up' in stats.summary()
@@ -228,6 +228,19 @@ def test_expand_env():
     assert environ['HOME'] in cmds[0], '${HOME} not expanded'
 
 
+def test_archive_outputs(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(export, 'archive_settings', {})
+    weights = bytes(range(256)) * 4  # not valid utf-8
+    with open('model.bin', 'wb') as fp:
+        fp.write(weights)
+
+    nb = gen_nb(['%nuclio add -f model.bin', 'def handler(context, event):\n    pass'])
+    resources = {}
+    export.NuclioExporter().from_notebook_node(nb, resources)
+    assert resources['outputs']['model.bin'] == weights
+
+
 def test_multiple_starts():
     cells = [
         'a = 1',
@@ -0,0 +1,157 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import io
+import logging
+import threading
+from os import path
+
+import pytest
+
+from nuclio import Event, local
+from nuclio.local import RunStats, Worker, load_source, run_local
+
+here = path.dirname(path.abspath(__file__))
+
+code = '''
+import threading
+
+inits = []
+
+
+def init_context(context):
+    inits.append(context.worker_id)
+    context.user_data.lock = threading.Lock()
+
+
+def handler(context, event):
+    if event.body == 'fail':
+        context.logger.warn_with('failing', body=event.body)
+        raise ValueError('bad event')
+    return 'hello ' + event.body
+'''
+
+
+@pytest.mark.parametrize('kind', ['thread', 'process'])
+@pytest.mark.parametrize('log_buffered', [False, True])
+def test_run_local(kind, log_buffered, monkeypatch, tmp_path):
+    # a file, so the (forked) process workers write to it as well
+    out = open(str(tmp_path / 'log'), 'w')
+    monkeypatch.setattr(local, 'stderr', out)
+    events = ['a', Event(body='b'), 'fail'] * 20
+    stats = run_local(code=code, events=events, workers=3, kind=kind,
+                      log_buffered=log_buffered)
+    out.close()
+    assert (tmp_path / 'log').read_text().count('failing') == 20
+    if log_buffered:
+        assert 'nuclio-log-writer' not in [
+            thread.name for thread in threading.enumerate()]
+    assert stats.count == 60
+    assert stats.errors == {'ValueError: bad event': 20}
+    assert stats.throughput > 0
+    assert 0 < stats.percentile(50) <= stats.percentile(99)
+    assert '60 events' in stats.summary()
+
+
+def test_worker_logger(monkeypatch):
+    out = io.StringIO()
+    monkeypatch.setattr(local, 'stderr', out)
+    notebook_logger = logging.getLogger('nuclio_jupyter')
+    level, handlers = notebook_logger.level, list(notebook_logger.handlers)
+    run_local(code=code, events=['fail'], log_level=logging.DEBUG)
+    assert out.getvalue().count('failing') == 1
+    assert notebook_logger.level == level
+    assert notebook_logger.handlers == handlers
+
+
+def test_worker_logger_per_run():
+    first, second = Worker(code), Worker(code)
+    loggers = logging.root.manager.loggerDict
+    assert first.context.logger._logger is not second.context.logger._logger
+    for worker in (first, second):
+        name = worker.context.logger._logger.name
+        assert name in loggers
+        worker.close_logs()
+        assert name not in loggers
+
+
+def test_worker_init_context():
+    worker = Worker(code, worker_id=7)
+    assert worker.handler.__globals__['inits'] == [7]
+    latency, error = worker.invoke(Event(body='x'))
+    assert latency > 0 and error is None
+
+
+def test_process_workers_start(tmp_path):
+    # the slow worker inits after the others took the warm-up tasks
+    trace = str(tmp_path / 'trace')
+    slow_init = '''
+import time
+
+
+def init_context(context):
+    if context.worker_id == 2:
+        time.sleep(0.5)
+    with open({trace!r}, 'a') as fp:
+        fp.write('init\\n')
+
+
+def handler(context, event):
+    with open({trace!r}, 'a') as fp:
+        fp.write('event\\n')
+'''.format(trace=trace)
+    stats = run_local(code=slow_init, events=[''] * 6, workers=3,
+                      kind='process')
+    assert stats.count == 6 and not stats.errors
+    with open(trace) as fp:
+        assert fp.read().split() == ['init'] * 3 + ['event'] * 6
+
+
+def test_process_worker_init_error():
+    bad_init = code + '''
+
+def init_context(context):
+    raise ValueError('no model')
+'''
+    with pytest.raises(RuntimeError):
+        run_local(code=bad_init, events=['a'], workers=2, kind='process')
+
+
+def test_load_source():
+    code, handler = load_source(path.join(here, 'handler.py'))
+    assert handler == 'handler'
+    stats = run_local(code=code, handler=handler, events=[''] * 5)
+    assert stats.count == 5 and not stats.errors
+
+
+def test_percentiles():
+    stats = RunStats()
+    for i in range(1, 101):
+        stats.add(i / 1000.0)
+    assert stats.percentile(50) == 0.05
+    assert stats.percentile(95) == 0.095
+    assert stats.percentile(99) == 0.099
+    assert stats.percentile(100) == 0.1
+
+
+def test_bad_kind():
+    with pytest.raises(ValueError):
+        run_local(code=code, events=[], kind='fiber')
+
+
+def test_histogram():
+    stats = RunStats()
+    for latency in (0.5e-5, 1.5e-5, 1.5e-5, 100.0):
+        stats.add(latency)
+    buckets = stats.histogram([1e-5, 2e-5])
+    assert buckets == [(1e-5, 1), (2e-5, 2), (float('inf'), 1)]
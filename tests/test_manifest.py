@@ -0,0 +1,102 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+import zipfile
+
+import pytest
+
+from nuclio import manifest
+from nuclio.archive import build_zip
+from nuclio.config import new_config
+
+
+def write(name, data='x'):
+    os.makedirs(os.path.dirname(name) or '.', exist_ok=True)
+    with open(name, 'w') as fp:
+        fp.write(data)
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    for name in ['models/a.bin', 'models/sub/b.bin', 'models/notes.tmp',
+                 'lib/x.py', 'lib/__pycache__/x.pyc', 'lib/pkg/y.py',
+                 'main.py']:
+        write(name, name)
+
+
+def test_expand_files(tree):
+    assert manifest.expand_files(['models', 'lib/**/*.py', 'main.py']) == [
+        'lib/pkg/y.py', 'lib/x.py', 'main.py', 'models/a.bin',
+        'models/notes.tmp', os.path.join('models', 'sub', 'b.bin')]
+
+    write('.nuclioignore', '# temp files\n*.tmp\nsub/\n')
+    assert manifest.expand_files(['models', 'models/notes.tmp']) == [
+        'models/a.bin', 'models/notes.tmp']
+
+    with pytest.raises(ValueError):
+        manifest.expand_files(['nothing/*.py'])
+    with pytest.raises(ValueError):
+        manifest.expand_files(['missing.py'])
+
+
+def test_manifest_changes(tree):
+    files = manifest.expand_files(['models', 'main.py'])
+    old = manifest.build_manifest(files, {'handler.py': 'code'}, workers=4)
+    entry = old['files']['main.py']
+    assert entry['sha256'] == manifest.file_digest('main.py')
+    assert entry['size'] == len('main.py')
+    assert old['files']['handler.py']['size'] == 4
+    assert manifest.changed_files(old) == []
+
+    write('main.py', 'changed')
+    write('models/c.bin')
+    os.remove('models/a.bin')
+    assert manifest.changed_files(old) == ['main.py', 'models/a.bin']
+
+    new = manifest.build_manifest(manifest.expand_files(['models', 'main.py']),
+                                  {'handler.py': 'code'}, previous=old)
+    assert manifest.diff_manifests(old, new) == (
+        ['models/c.bin'], ['main.py'], ['models/a.bin'])
+
+
+def test_manifest_reuses_digests(tree, monkeypatch):
+    old = manifest.build_manifest(['main.py', 'lib/x.py'])
+    write('lib/x.py', 'new')
+    hashed = []
+    digest = manifest.file_digest
+    monkeypatch.setattr(manifest, 'file_digest',
+                        lambda path: hashed.append(path) or digest(path))
+    new = manifest.build_manifest(['main.py', 'lib/x.py'], previous=old)
+    assert hashed == ['lib/x.py']
+    assert new['files']['main.py'] == old['files']['main.py']
+
+
+def test_build_zip_from_dirs(tree, tmp_path):
+    zip_path = str(tmp_path / 'f.zip')
+    result = build_zip(zip_path, new_config(), 'code', ['models/', 'lib'])
+    with zipfile.ZipFile(zip_path) as z:
+        assert z.namelist() == list(result['files'])
+        assert 'lib/__pycache__/x.pyc' not in z.namelist()
+        assert z.read('models/sub/b.bin') == b'models/sub/b.bin'
+
+
+def test_build_zip_hashes_while_writing(tree, tmp_path, monkeypatch):
+    files = ['main.py', 'lib/x.py']
+    expected = manifest.build_manifest(files)['files']
+    monkeypatch.setattr(manifest, 'file_digest', None)
+    result = build_zip(str(tmp_path / 'f.zip'), new_config(), 'code', files)
+    for name in files:
+        assert result['files'][name]['sha256'] == expected[name]['sha256']
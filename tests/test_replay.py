@@ -0,0 +1,81 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+import pytest
+
+from nuclio import Event
+from nuclio.replay import iter_events, record_events, replay
+
+code = '''
+def handler(context, event):
+    if event.headers.get('fail'):
+        raise RuntimeError('failed')
+    return event.body
+'''
+
+
+def sample_events():
+    return [
+        Event(body=b'\x00\x01binary', headers={'x': '1'}, method='POST',
+              path='/a', _id='1'),
+        Event(body={'a': [1, 2]}, content_type='application/json'),
+        Event(body='text', headers={'fail': 'yes'}),
+    ]
+
+
+@pytest.mark.parametrize('name', ['events.jsonl', 'events.bin'])
+def test_record_roundtrip(tmp_path, name):
+    path = str(tmp_path / name)
+    assert record_events(path, sample_events()) == 3
+    events = list(iter_events(path))
+    assert events[0].body == b'\x00\x01binary'
+    assert events[0].headers == {'x': '1'}
+    assert (events[0].method, events[0].path, events[0].id) == ('POST', '/a', '1')
+    assert events[1].body == {'a': [1, 2]}
+    if name.endswith('.bin'):
+        assert events[2].body == 'text'
+    else:
+        # processor JSON encoding, non JSON bodies are bytes
+        assert events[2].body == b'text'
+
+
+def test_truncated_file(tmp_path):
+    path = str(tmp_path / 'events.bin')
+    record_events(path, sample_events())
+    with open(path, 'rb+') as fp:
+        fp.truncate(fp.seek(0, 2) - 2)
+    with pytest.raises(ValueError):
+        list(iter_events(path))
+
+
+def test_replay_closed_loop(tmp_path):
+    path = str(tmp_path / 'events.bin')
+    record_events(path, sample_events() * 100)
+    stats = replay(path, code=code, workers=2)
+    assert stats.count == 300
+    assert stats.errors == {'RuntimeError: failed': 100}
+    assert sum(count for _, count in stats.histogram()) == 300
+    assert '<=' in stats.summary(histogram=True)
+
+    assert replay(path, code=code, limit=10).count == 10
+
+
+def test_replay_open_loop(tmp_path):
+    path = str(tmp_path / 'events.jsonl')
+    record_events(path, sample_events()[:2] * 10)
+    stats = replay(path, code=code, rate=200, mode='open')
+    assert stats.count == 20 and not stats.errors
+    assert stats.elapsed >= 19 / 200.0
+
+    with pytest.raises(ValueError):
+        replay(path, code=code, mode='open')
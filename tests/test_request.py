@@ -11,12 +11,20 @@
 # WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
 # See the License for the specific language governing permissions and
 # limitations under the License.
+import copy
+import io
+import json
+import logging
+import pickle
+import threading
+from base64 import b64encode
 from unittest import mock
 
 import pytest
 
 from nuclio import Context, Event
-from nuclio.request import inject_context
+from nuclio.request import (BufferedHandler, Headers, JSONFormatter, Logger,
+                            inject_context)
 
 
 def handler(context, event):
@@ -30,6 +38,17 @@ def test_handler():
     assert out == 'Hi Dave. How are you?'
 
 
+def test_context_logger():
+    context = Context()
+    assert 'logger' not in vars(context)
+    logger = context.logger
+    assert vars(context)['logger'] is logger
+    assert context.logger is logger
+    with pytest.raises(AttributeError):
+        context.no_such_attr
+    assert copy.copy(context).logger is logger
+
+
 def test_context_not_injected():
     with pytest.raises(NameError):
         context  # noqa - Make sure it's not there
@@ -40,3 +59,161 @@ def test_inject_context():
         ipy.return_value = True
         inject_context()
         context  # noqa - Make sure it's there
+
+
+def processor_event(i=0, body=b'hello'):
+    return {
+        'body': b64encode(body).decode('ascii'),
+        'content_type': 'text/plain',
+        'trigger': {'class': 'sync', 'kind': 'http'},
+        'fields': {},
+        'headers': {'X-Id': str(i)},
+        'id': 'id-{}'.format(i),
+        'method': 'POST',
+        'path': '/p',
+        'size': 5,
+        'timestamp': 1600000000 + i,
+        'url': 'http://f',
+        'type': None,
+        'type_version': None,
+        'version': None,
+    }
+
+
+def test_event_from_json():
+    event = Event.from_json(json.dumps(processor_event(3)))
+    assert event.body == b'hello'
+    assert (event.trigger.klass, event.trigger.kind) == ('sync', 'http')
+    assert event.headers == {'X-Id': '3'}
+    assert event.id == 'id-3' and event.timestamp.year == 2020
+
+    event = Event(body='x', headers={'a': 'b'}, _id=1)
+    assert not hasattr(event, '__dict__')
+    obj = json.loads(event.to_json())
+    assert obj['body'] == 'x' and obj['id'] == 1
+    assert obj['trigger'] == {'class': '', 'kind': ''}
+
+
+def test_event_from_json_batch():
+    json_body = b64encode(b'{"a": 1}').decode('ascii')
+    items = [processor_event(i) for i in range(3)]
+    items[2].update(body=json_body, content_type='application/json')
+    data = '\n'.join(json.dumps(item) for item in items) + '\n\n'
+    for buf in (data, data.encode('utf-8')):
+        events = Event.from_json_batch(buf)
+        assert [event.id for event in events] == ['id-0', 'id-1', 'id-2']
+        assert events[2].body == {'a': 1}
+    assert Event.from_json_batch('') == []
+
+
+def test_event_headers():
+    event = Event.from_json(json.dumps(processor_event(1)))
+    assert isinstance(event.headers, Headers)
+    assert event.get_header('x-id') == '1'
+    assert event.headers['X-ID'] == '1'
+    assert 'x-Id' in event.headers
+    assert event.get_header('missing') is None
+
+    event.headers['x-id'] = '2'
+    event.headers['Content-Type'] = 'text/plain'
+    assert event.headers == {'X-Id': '2', 'Content-Type': 'text/plain'}
+    assert event.get_header('content-type') == 'text/plain'
+    del event.headers['CONTENT-TYPE']
+    assert 'content-type' not in event.headers
+    data = Event(headers=event.headers).to_json()
+    assert json.loads(data)['headers'] == {'X-Id': '2'}
+
+    event.headers = {'Accept': '*/*'}
+    assert event.get_header('accept') == '*/*'
+    copy = pickle.loads(pickle.dumps(event.headers))
+    assert isinstance(copy, Headers) and copy['ACCEPT'] == '*/*'
+    assert copy.pop('accept') == '*/*'
+    copy['ACCEPT'] = 'text/html'
+    assert copy == {'ACCEPT': 'text/html'}
+
+
+class BlockingStream(io.StringIO):
+    def __init__(self):
+        super().__init__()
+        self.writing = threading.Event()
+        self.release = threading.Event()
+
+    def write(self, data):
+        self.writing.set()
+        self.release.wait(5)
+        return super().write(data)
+
+
+def test_buffered_logger():
+    stream = io.StringIO()
+    logger = Logger(logging.INFO, name='test_buffered')
+    logger.set_handler('test', stream, JSONFormatter(), buffered=True)
+    logger.debug_with('hidden', x=0)
+    for i in range(100):
+        logger.info_with('event %s', i, x=i)
+    logger.flush()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == 100
+    assert lines[7]['message'] == 'event 7'
+    assert lines[7]['level'] == 'info'
+    assert lines[7]['with'] == {'x': 7}
+    assert set(lines[7]) == {'datetime', 'level', 'name', 'message', 'with'}
+
+    handler = logger._logger.handlers[0]
+    logger.set_handler('test', stream, JSONFormatter())
+    assert not handler._thread.is_alive()
+    logger._logger.removeHandler(logger._logger.handlers[0])
+
+
+def test_buffered_handler_overflow():
+    stream = BlockingStream()
+    handler = BufferedHandler(stream, queue_size=1)
+    handler.setFormatter(logging.Formatter('%(message)s'))
+    log = logging.getLogger('test_overflow')
+    log.propagate = False
+    log.addHandler(handler)
+    log.warning('first')
+    assert stream.writing.wait(5)
+    for i in range(4):
+        log.warning('next %d', i)
+    stream.release.set()
+    handler.flush()
+    handler.close()
+    log.removeHandler(handler)
+    assert handler.dropped == 3
+    assert stream.getvalue().splitlines() == [
+        'first', 'log queue full, dropped 3 records', 'next 0']
+
+    with pytest.raises(ValueError):
+        BufferedHandler(overflow='nope')
+
+
+@pytest.mark.filterwarnings(
+    'ignore::pytest.PytestUnhandledThreadExceptionWarning')
+def test_buffered_handler_block_no_writer():
+    class ExitStream(io.StringIO):
+        def write(self, data):
+            raise SystemExit  # ends the flush thread
+
+    handler = BufferedHandler(ExitStream(), queue_size=1, overflow='block',
+                              flush_interval=0.01)
+    record = logging.makeLogRecord({'msg': 'x'})
+    handler.emit(record)
+    handler._thread.join(5)
+    assert not handler._thread.is_alive()
+    for _ in range(3):  # blocked forever once the queue was full
+        handler.emit(record)
+    assert handler.dropped == 3
+
+    handler = BufferedHandler(io.StringIO(), queue_size=1, overflow='block')
+    handler.close()
+    for _ in range(3):
+        handler.emit(record)
+    assert handler.dropped == 3
+
+
+def test_debug_with_disabled():
+    logger = Logger(logging.INFO, name='test_disabled')
+    with mock.patch.object(logger._logger, 'makeRecord') as make_record:
+        logger.debug_with('hidden', x=1)
+    assert not make_record.called
@@ -0,0 +1,119 @@
+# Copyright 2018 Iguazio
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from argparse import ArgumentParser
+
+import pytest
+
+from conftest import patch
+from nuclio import deploy
+from nuclio.archive import get_archive_config
+from nuclio.config import ConfigSpec, new_config, update_in
+from nuclio.schema import config_errors
+from nuclio.triggers import CronTrigger, HttpTrigger, KafkaTrigger
+
+
+def full_config():
+    spec = ConfigSpec(env={'A': 1},
+                      external_source_env={'S': {'secretKeyRef': {'name': 's'}}},
+                      cmd=['pip install x'],
+                      config={'spec.minReplicas': 2})
+    spec.add_volume('/data', '/container/path', kind='v3io')
+    spec.add_volume('/claim', 'my-claim', kind='pvc', name='claim')
+    spec.add_trigger('http', HttpTrigger(4, port=30000, host='h', paths=['/x'], canary=10))
+    spec.add_trigger('cron', CronTrigger(interval='10s', body='{}', headers={'a': 'b'}))
+    spec.add_trigger('kafka', KafkaTrigger(['broker:9092'], ['topic'], partitions=[0, 1]))
+    config = new_config()
+    spec.merge(config)
+    update_in(config, 'spec.handler', 'handler:handler')
+    return config
+
+
+def test_valid_configs():
+    assert config_errors(full_config()) == []
+    assert config_errors(get_archive_config('f', 'v3io://webapi/c/f.zip')) == []
+    assert config_errors(get_archive_config('f', 'git://github.com/org/repo#main:dir')) == []
+
+    config = full_config()
+    update_in(config, 'spec.triggers.cron.attributes.event',
+              {'body': {'workflow': 'main'}, 'headers': {'X-Retries': 3}})
+    assert config_errors(config) == []
+
+
+@pytest.mark.parametrize('key,value,error', [
+    ('spec.triggers', [], 'spec.triggers: expected dict, got list'),
+    ('spec.triggers.http.maxWorkers', '4', 'spec.triggers.http.maxWorkers: expected int, got string'),
+    ('spec.build.commands', {'a': 1}, 'spec.build.commands: expected list, got dict'),
+    ('spec.env', [{'name': 'A', 'value': 1}], 'spec.env[0].value: expected string, got int'),
+    ('spec.env', [{'name': 'A'}], 'spec.env[0]: exactly one of value or valueFrom required'),
+    ('spec.volumes', [{'volume': {'name': 'v'}}], 'spec.volumes[0].volumeMount: missing required field'),
+    ('spec.minReplicas', True, 'spec.minReplicas: expected int, got bool'),
+    ('metadata.labels.tag', 7, 'metadata.labels.tag: expected string, got int'),
+])
+def test_invalid_configs(key, value, error):
+    config = full_config()
+    update_in(config, key, value)
+    assert error in config_errors(config)
+
+
+def test_null_fields():
+    config = full_config()
+    for key in ('spec.build.baseImage', 'spec.minReplicas',
+                'spec.triggers.http.attributes.port', 'metadata.namespace',
+                'spec.build.codeEntryAttributes.headers'):
+        update_in(config, key, None)
+    config['spec']['env'].append({'name': 'N', 'value': None,
+                                  'valueFrom': {'secretKeyRef': {}}})
+    assert config_errors(config) == []
+
+    update_in(config, 'spec.env', [{'name': 'N', 'value': None}])
+    assert config_errors(config) == [
+        'spec.env[0]: exactly one of value or valueFrom required']
+    update_in(config, 'spec.triggers.http.kind', None)
+    assert config_errors(config) == [
+        'spec.triggers.http.kind: expected string, got NoneType']
+
+
+def test_deploy_config_validates():
+    config = full_config()
+    update_in(config, 'spec.triggers', [])
+
+    class no_requests:
+        pass
+
+    with patch(deploy, requests=no_requests):
+        with pytest.raises(deploy.DeployError, match='invalid function config'):
+            deploy.deploy_config(config, project='p')
+
+        # skipping validation reaches the (missing) dashboard api
+        with pytest.raises(AttributeError):
+            deploy.deploy_config(config, project='p', validate=False)
+
+
+def test_deploy_no_validate_flag():
+    parser = ArgumentParser()
+    deploy.populate_parser(parser)
+    assert parser.parse_args(['f.py']).validate is None
+    args = parser.parse_args(['f.py', '--no-validate'])
+    assert args.validate is False
+
+    calls = []
+
+    def deploy_file(source, dashboard_url, **kw):
+        calls.append(kw)
+        return 'address'
+
+    with patch(deploy, deploy_file=deploy_file):
+        deploy.deploy_from_args(args)
+    assert calls[0]['validate'] is False
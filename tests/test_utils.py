@@ -56,3 +56,36 @@ def test_update_in_with_dotted_keys(keys, val):
     for key in keys:
         obj = obj.get(key)
     assert obj == val
+
+
+def test_get_in_with_dotted_keys():
+    obj = {}
+    key = 'metadata.labels.\\nuclio.io/tag\\'
+    config.update_in(obj, key, 'v1')
+    assert config.get_in(obj, key) == 'v1'
+    assert config.key_path(key) == ('metadata', 'labels', 'nuclio.io/tag')
+
+
+def test_apply_updates():
+    updates = {
+        'spec.build.commands': 'pip install x',
+        'spec.build.baseImage': 'python:3.11',
+        'spec.triggers.http': {'kind': 'http', 'maxWorkers': 4},
+        'spec.triggers.http.maxWorkers': 8,
+        'spec.triggers': {'cron': {'kind': 'cron'}},
+        'spec.triggers.cron.attributes.interval': '1m',
+        'metadata.labels.\\nuclio.io/tag\\': 'v2',
+        'spec.volumes': [{'name': 'a'}, {'name': 'b'}],
+    }
+
+    expected = config.new_config()
+    for key, value in updates.items():
+        current = config.get_in(expected, key)
+        config.update_in(expected, key, value, isinstance(current, list))
+
+    obj = config.new_config()
+    config.apply_updates(obj, updates)
+    assert obj == expected
+    assert obj['spec']['triggers'] == {
+        'cron': {'kind': 'cron', 'attributes': {'interval': '1m'}},
+    }